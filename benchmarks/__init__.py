@@ -0,0 +1,3 @@
+"""
+AdsGen 2.0 Benchmarks Package
+"""
@@ -0,0 +1,99 @@
+"""
+AdsGen 2.0 - ComfyUI Batch Render Benchmark
+Renders the same number of images through the single-image path
+(_call_comfyui per image) and the batched path (_call_comfyui_batch) and
+reports images per minute for both.
+
+Usage:
+    python -m benchmarks.bench_comfyui_batch --images 16 --batch-size 4
+    python -m benchmarks.bench_comfyui_batch --url http://comfy-1:8188 --images 16 --batch-size 4
+
+Without --url a local stand-in node is started: every workflow run costs
+--load-seconds (model load and warm-up) plus --image-seconds per image, and
+runs are serialized like on a single GPU.
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from services.imagegen_worker.tasks import _call_comfyui, _call_comfyui_batch
+
+
+def _fake_node(load_seconds: float, image_seconds: float) -> ThreadingHTTPServer:
+    """Start a stand-in /generate endpoint on a free local port."""
+    gpu = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            count = int(payload.get("batch_size", 1))
+            with gpu:
+                time.sleep(load_seconds + image_seconds * count)
+            body = json.dumps({
+                "success": True,
+                "image_url": "https://example.invalid/0.jpg",
+                "image_urls": [f"https://example.invalid/{i}.jpg" for i in range(count)],
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _run(url: str, images: int, batch_size: int) -> tuple[int, float]:
+    """Render `images` images in runs of batch_size; returns (rendered, seconds)."""
+    rendered = 0
+    started = time.monotonic()
+    while rendered < images:
+        count = min(batch_size, images - rendered)
+        if count == 1:
+            produced = 1 if _call_comfyui("Cashier", "woman", 30, url=url) else 0
+        else:
+            produced = len(_call_comfyui_batch("Cashier", "woman", 30, None, count, url=url))
+        if not produced:
+            raise RuntimeError(f"Render on {url} failed")
+        rendered += produced
+    return rendered, time.monotonic() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="", help="ComfyUI node (default: local stand-in)")
+    parser.add_argument("--images", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--load-seconds", type=float, default=2.0)
+    parser.add_argument("--image-seconds", type=float, default=0.5)
+    args = parser.parse_args()
+
+    server = None
+    url = args.url.rstrip("/")
+    if not url:
+        server = _fake_node(args.load_seconds, args.image_seconds)
+        url = f"http://127.0.0.1:{server.server_port}"
+
+    try:
+        results = {}
+        for label, batch_size in (("single", 1), (f"batch={args.batch_size}", args.batch_size)):
+            rendered, seconds = _run(url, args.images, batch_size)
+            results[label] = rendered / seconds * 60
+            print(f"{label:>10}: {rendered} images in {seconds:6.1f}s = {results[label]:6.1f} images/min")
+
+        print(f"   speedup: {results[f'batch={args.batch_size}'] / results['single']:.2f}x")
+    finally:
+        if server:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
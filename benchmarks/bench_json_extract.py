@@ -0,0 +1,53 @@
+"""
+AdsGen 2.0 - JSON Extraction Benchmark
+Times extract_json_object over the regression corpus in
+tests/fixtures/ai_responses.json and over inflated inputs to check that
+parsing time grows linearly with response size.
+
+Usage:
+    python -m benchmarks.bench_json_extract --rounds 2000
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+from services.textgen_worker.json_extract import extract_json_object
+
+CORPUS_PATH = Path(__file__).resolve().parent.parent / "tests" / "fixtures" / "ai_responses.json"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    corpus = json.loads(CORPUS_PATH.read_text(encoding="utf-8"))
+    total_bytes = sum(len(case["raw"]) for case in corpus)
+
+    started = time.perf_counter()
+    for _ in range(args.rounds):
+        for case in corpus:
+            extract_json_object(case["raw"])
+    elapsed = time.perf_counter() - started
+
+    calls = args.rounds * len(corpus)
+    print(f"corpus:     {len(corpus)} responses, {total_bytes} chars")
+    print(f"per call:   {elapsed / calls * 1e6:.1f} us")
+    print(f"throughput: {total_bytes * args.rounds / elapsed / 1e6:.2f} M chars/s")
+    print()
+
+    # Scaling: a long HTML description full of braces
+    print("size (chars)   time (ms)   us/kchar")
+    for repeat in (100, 1000, 10000):
+        description = '<p>Меню {сезонное} и \\"акции\\"</p>' * repeat
+        text = f'Ответ:\n```json\n{{"title": "Повар", "description": "{description}"}}\n```'
+        started = time.perf_counter()
+        extract_json_object(text)
+        elapsed = time.perf_counter() - started
+        print(f"{len(text):>12}   {elapsed * 1000:>9.2f}   {elapsed * 1e6 / (len(text) / 1000):>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+AdsGen 2.0 - Prompt Prefix Cache Benchmark
+Sends a series of generation prompts to the configured DeepSeek endpoint and
+reports prefix-cache hit tokens and latency.
+
+Usage:
+    python -m benchmarks.bench_prompt_cache --requests 20
+    python -m benchmarks.bench_prompt_cache --requests 20 --layout legacy
+
+"legacy" reproduces the old layout (variable fields first, single user
+message) to compare against the current system + variable layout.
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+import httpx
+
+from services.shared.config import get_settings
+from services.shared.mappings import POSITION_TO_PROFESSION
+from services.textgen_worker.prompts import build_generation_messages
+
+
+def _messages(layout: str) -> list[dict]:
+    profession = random.choice(sorted(set(POSITION_TO_PROFESSION.values())))
+    messages = build_generation_messages(
+        profession=profession,
+        address=f"Москва, ул. Тестовая, {random.randint(1, 200)}",
+        salary="от 200 рублей/час",
+        service="",
+        store_type=random.choice(["ГМ", "МФ", ""]),
+    )
+    if layout == "legacy":
+        system, variable = messages[0]["content"], messages[1]["content"]
+        return [{"role": "user", "content": f"{variable}\n\n{system}"}]
+    return messages
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--layout", choices=["current", "legacy"], default="current")
+    parser.add_argument("--max-tokens", type=int, default=50)
+    args = parser.parse_args()
+
+    settings = get_settings()
+    latencies = []
+    prompt_tokens = 0
+    cached_tokens = 0
+
+    with httpx.Client(timeout=120.0) as client:
+        for i in range(args.requests):
+            started = time.monotonic()
+            response = client.post(
+                settings.deepseek_api_url,
+                headers={"Authorization": f"Bearer {settings.deepseek_api_key}"},
+                json={
+                    "model": settings.deepseek_model,
+                    "messages": _messages(args.layout),
+                    "max_tokens": args.max_tokens,
+                },
+            )
+            response.raise_for_status()
+            latencies.append(time.monotonic() - started)
+
+            usage = response.json().get("usage") or {}
+            prompt_tokens += usage.get("prompt_tokens", 0)
+            cached = usage.get("prompt_cache_hit_tokens")
+            if cached is None:
+                cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0)
+            cached_tokens += cached or 0
+            print(f"#{i + 1}: {latencies[-1]:.2f}s prompt={usage.get('prompt_tokens')} cached={cached}")
+
+    latencies.sort()
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    print()
+    print(f"layout:          {args.layout}")
+    print(f"requests:        {args.requests}")
+    print(f"cache hit ratio: {cached_tokens / prompt_tokens:.1%}" if prompt_tokens else "cache hit ratio: n/a")
+    print(f"latency p50:     {statistics.median(latencies):.2f}s")
+    print(f"latency p95:     {p95:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
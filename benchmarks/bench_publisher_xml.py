@@ -0,0 +1,248 @@
+"""
+AdsGen 2.0 - XML Feed Build Benchmark
+Builds the Avito feed for synthetic vacancies two ways: with the original
+per-ad builder (profile read and every fragment rendered per ad, kept here
+verbatim as the baseline) and with _build_xml's single AdTemplate per
+export. Reports ads/second.
+
+Usage:
+    python -m benchmarks.bench_publisher_xml --sizes 10000,100000
+
+The company profile is written to a temporary file so the per-ad reads hit
+the disk like in production.
+"""
+
+import argparse
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+from services.publisher_worker.tasks import _build_xml, _escape_xml
+from services.shared.avito_mappings import PROFESSION_INDUSTRY_MAP
+from services.shared.company_profile import DEFAULT_PROFILE
+from services.shared.models.vacancy import Vacancy
+
+
+def _vacancies(count: int) -> list[Vacancy]:
+    rng = random.Random(42)
+    professions = list(PROFESSION_INDUSTRY_MAP)
+    return [
+        Vacancy(
+            id=f"MSK-{i:06d}", city="Москва", address=f"ул. Тестовая, {i}", position="Кассир",
+            profession=rng.choice(professions), schedule=rng.choice(["2/2", "5/2", None]),
+            level=rng.choice(["1-3 года", None]), title="Кассир в магазин у дома",
+            description="<p>Приглашаем в команду!</p>" * 20, image_url=f"https://disk.yandex.ru/i/{i}.jpg",
+            salary_max=rng.choice([None, 60000]), manager_name=None, manager_phone=None,
+            company_email=None, company_name=None,
+        )
+        for i in range(count)
+    ]
+
+
+def _original_ad_xml(vacancy: Vacancy) -> str:
+    """The builder before AdTemplate: profile read and every fragment rendered per ad."""
+    from services.shared.company_profile import get_profile
+    from services.shared.avito_mappings import get_industry_for_profession, map_experience, map_schedule_to_job_type
+
+    profile = get_profile()
+    ad_xml = ['\t<Ad>']
+
+    # ID
+    ad_xml.append(f'\t\t<Id>{_escape_xml(vacancy.id)}</Id>')
+
+    # Listing fee
+    ad_xml.append(f'\t\t<ListingFee>{profile.get("listing_fee", "Package")}</ListingFee>')
+    ad_xml.append('\t\t<AvitoId></AvitoId>')
+
+    # Manager info (from profile or vacancy)
+    manager_name = vacancy.manager_name or profile.get("manager_name", "")
+    contact_phone = vacancy.manager_phone or profile.get("contact_phone", "")
+    ad_xml.append(f'\t\t<ManagerName>{_escape_xml(manager_name)}</ManagerName>')
+    ad_xml.append(f'\t\t<ContactPhone>{_escape_xml(contact_phone)}</ContactPhone>')
+
+    # Images
+    if vacancy.image_url:
+        ad_xml.append('\t\t<Images>')
+        for url in vacancy.image_url.split(' | '):
+            url = url.strip()
+            if url:
+                ad_xml.append(f'\t\t\t<Image url="{_escape_xml(url)}"/>')
+        ad_xml.append('\t\t</Images>')
+
+    # Address (city + address if available)
+    full_address = vacancy.address or vacancy.city or ""
+    ad_xml.append(f'\t\t<Address>{_escape_xml(full_address)}</Address>')
+
+    # Contact method
+    contact_method = profile.get("contact_method", "По телефону и в сообщениях")
+    ad_xml.append(f'\t\t<ContactMethod>{contact_method}</ContactMethod>')
+
+    # Category (always Вакансии)
+    ad_xml.append('\t\t<Category>Вакансии</Category>')
+
+    # Industry (auto-mapped from profession)
+    industry = get_industry_for_profession(vacancy.profession)
+    ad_xml.append(f'\t\t<Industry>{_escape_xml(industry)}</Industry>')
+
+    # Title
+    title = vacancy.title or vacancy.profession or vacancy.position or ""
+    ad_xml.append(f'\t\t<Title>{_escape_xml(title)}</Title>')
+
+    # Employment type
+    employment_type = profile.get("employment_type", "Полная")
+    ad_xml.append(f'\t\t<EmploymentType>{employment_type}</EmploymentType>')
+
+    # Job type (schedule)
+    job_type = map_schedule_to_job_type(vacancy.schedule) if vacancy.schedule else profile.get("job_type", "Гибкий")
+    ad_xml.append(f'\t\t<JobType>{job_type}</JobType>')
+
+    # Working days per week
+    working_days = profile.get("working_days_per_week", ["3–4 дня", "5 дней", "6–7 дней"])
+    ad_xml.append('\t\t<WorkingDaysPerWeek>')
+    for opt in working_days:
+        ad_xml.append(f'\t\t\t<Option>{opt}</Option>')
+    ad_xml.append('\t\t</WorkingDaysPerWeek>')
+
+    # Working hours per day
+    working_hours = profile.get("working_hours_per_day", ["8 часов", "9–10 часов", "11–12 часов"])
+    ad_xml.append('\t\t<WorkingDaysPerDay>')
+    for opt in working_hours:
+        ad_xml.append(f'\t\t\t<Option>{opt}</Option>')
+    ad_xml.append('\t\t</WorkingDaysPerDay>')
+
+    # Experience
+    experience = map_experience(vacancy.level) if vacancy.level else profile.get("experience", "Без опыта")
+    ad_xml.append(f'\t\t<Experience>{experience}</Experience>')
+
+    # Description (CDATA)
+    if vacancy.description:
+        ad_xml.append(f'\t\t<Description>{_escape_xml(vacancy.description)}</Description>')
+
+    # Salary
+    if vacancy.salary_min or vacancy.salary_max:
+        ad_xml.append('\t\t<SalaryRange>')
+        if vacancy.salary_min:
+            ad_xml.append(f'\t\t\t<From>{vacancy.salary_min}</From>')
+        if vacancy.salary_max:
+            ad_xml.append(f'\t\t\t<To>{vacancy.salary_max}</To>')
+        ad_xml.append('\t\t</SalaryRange>')
+
+    # Pay period and frequency
+    ad_xml.append(f'\t\t<PayPeriod>{profile.get("pay_period", "за смену")}</PayPeriod>')
+    ad_xml.append(f'\t\t<PayoutFrequency>{profile.get("payout_frequency", "Каждый день")}</PayoutFrequency>')
+    ad_xml.append(f'\t\t<Tax>{profile.get("tax", "На руки")}</Tax>')
+
+    # Job bonuses
+    bonuses = profile.get("job_bonuses", ["Униформа", "Обучение"])
+    ad_xml.append('\t\t<JobBonuses>')
+    for bonus in bonuses:
+        ad_xml.append(f'\t\t\t<Option>{bonus}</Option>')
+    ad_xml.append('\t\t</JobBonuses>')
+
+    # Profession
+    ad_xml.append(f'\t\t<Profession>{_escape_xml(vacancy.profession)}</Profession>')
+
+    # Age preferences
+    age_prefs = profile.get("age_preferences", ["Старше 45 лет", "Для пенсионеров"])
+    ad_xml.append('\t\t<AgePreferences>')
+    for pref in age_prefs:
+        ad_xml.append(f'\t\t\t<Option>{pref}</Option>')
+    ad_xml.append('\t\t</AgePreferences>')
+
+    # Part time
+    ad_xml.append(f'\t\t<PartTimeJob>{profile.get("part_time_job", "Да")}</PartTimeJob>')
+
+    # Registration method
+    reg_methods = profile.get("registration_method", ["Трудовой договор"])
+    ad_xml.append('\t\t<RegistrationMethod>')
+    for method in reg_methods:
+        ad_xml.append(f'\t\t\t<Option>{method}</Option>')
+    ad_xml.append('\t\t</RegistrationMethod>')
+
+    # Apply type
+    ad_xml.append(f'\t\t<ApplyType>{profile.get("apply_type", "Любые")}</ApplyType>')
+
+    # Age/Citizenship criteria
+    ad_xml.append(f'\t\t<AgeCriteria>{profile.get("age_criteria", "18|65")}</AgeCriteria>')
+    ad_xml.append(f'\t\t<CitizenshipCriteria>{profile.get("citizenship_criteria", "Россия")}</CitizenshipCriteria>')
+
+    # Optional empty fields (for specific industries)
+    ad_xml.append('\t\t<MedicalBook></MedicalBook>')
+    ad_xml.append('\t\t<FoodProductionShopType></FoodProductionShopType>')
+    ad_xml.append('\t\t<RetailEquipmentType></RetailEquipmentType>')
+    ad_xml.append('\t\t<EateryType></EateryType>')
+    ad_xml.append('\t\t<RetailShopType></RetailShopType>')
+    ad_xml.append('\t\t<Cuisine></Cuisine>')
+    ad_xml.append('\t\t<CleaningJobSiteType></CleaningJobSiteType>')
+
+    # Vacancy code (external reference)
+    vacancy_code = f"{vacancy.city}_{vacancy.profession}_{vacancy.level or 'стандарт'}"
+    ad_xml.append(f'\t\t<VacancyCode>{_escape_xml(vacancy_code)}</VacancyCode>')
+
+    # Salary display
+    ad_xml.append('\t\t<ThereIsSalary>Нет</ThereIsSalary>')
+
+    # Ask questions
+    ad_xml.append(f'\t\t<AskAge>{profile.get("ask_age", "Да")}</AskAge>')
+
+    # Email
+    email = vacancy.company_email or profile.get("email", "")
+    ad_xml.append(f'\t\t<EMail>{_escape_xml(email)}</EMail>')
+
+    # Chat questionnaire
+    ad_xml.append(f'\t\t<ChatQuestionnaire>{profile.get("chat_questionnaire", "Проводить")}</ChatQuestionnaire>')
+
+    # Company name
+    company = vacancy.company_name or profile.get("company_name", "")
+    ad_xml.append(f'\t\t<CompanyName>{_escape_xml(company)}</CompanyName>')
+
+    # Status fields
+    ad_xml.append('\t\t<AvitoDateEnd></AvitoDateEnd>')
+    if vacancy.salary_max:
+        ad_xml.append(f'\t\t<Price>{vacancy.salary_max}</Price>')
+    ad_xml.append(f'\t\t<AskCitizenship>{profile.get("ask_citizenship", "Да")}</AskCitizenship>')
+    ad_xml.append('\t\t<AvitoStatus>Активно</AvitoStatus>')
+    ad_xml.append(f'\t\t<AIRecruter>{profile.get("ai_recruter", "Нет")}</AIRecruter>')
+
+    ad_xml.append('\t</Ad>')
+
+    return '\n'.join(ad_xml)
+
+
+def _per_ad(vacancies: list[Vacancy]) -> str:
+    """Feed built with the original per-ad builder."""
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>', '<Ads formatVersion="3" target="Avito.ru">']
+    parts.extend(_original_ad_xml(vacancy) for vacancy in vacancies)
+    parts.append('</Ads>')
+    return '\n'.join(parts)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000", help="comma-separated feed sizes")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        profile_path = Path(tmp) / "company_profile.json"
+        profile_path.write_text(json.dumps(DEFAULT_PROFILE, ensure_ascii=False), encoding="utf-8")
+
+        with patch('services.shared.company_profile.PROFILE_PATH', profile_path):
+            for size in (int(s) for s in args.sizes.split(",")):
+                vacancies = _vacancies(size)
+                results = {}
+                for label, build in (("per-ad", _per_ad), ("template", _build_xml)):
+                    started = time.perf_counter()
+                    xml = build(vacancies)
+                    seconds = time.perf_counter() - started
+                    results[label] = (xml, seconds)
+                    print(f"{size:>7} ads {label:>9}: {seconds:7.2f}s = {size / seconds:9.0f} ads/s")
+
+                assert results["per-ad"][0] == results["template"][0], "feeds differ"
+                print(f"{size:>7} ads   speedup: {results['per-ad'][1] / results['template'][1]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
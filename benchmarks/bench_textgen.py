@@ -0,0 +1,96 @@
+"""
+AdsGen 2.0 - Text Generation Throughput Benchmark
+Runs the textgen AI path (stream, early title abort, parse) against an
+OpenAI-compatible endpoint at increasing concurrency and reports
+vacancies/s, latency percentiles and how many vacancies fell back to
+templates (no content, or content still breaking the text rules).
+
+Usage:
+    python -m benchmarks.fake_llm_server --port 8090 &
+    python -m benchmarks.bench_textgen --url http://127.0.0.1:8090/v1/chat/completions \\
+        --vacancies 64 --concurrency 1,4,16,32
+
+The vacancies are in-memory objects, so no database is needed; usage rows
+are still recorded when Postgres is reachable. Without --url the endpoint
+from DEEPSEEK_API_URL is used (real credits!).
+"""
+
+import argparse
+import logging
+import os
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+
+def _vacancies(count: int) -> list[SimpleNamespace]:
+    from services.shared.mappings import POSITION_TO_PROFESSION
+
+    professions = sorted(set(POSITION_TO_PROFESSION.values()))
+    return [
+        SimpleNamespace(
+            id=None,
+            import_batch_id=None,
+            profession=random.choice(professions),
+            city="Москва",
+            address=f"ул. Тестовая, {i + 1}",
+            service="",
+            store_type=random.choice(["ГМ", "МФ", ""]),
+        )
+        for i in range(count)
+    ]
+
+
+def _run(vacancies: list[SimpleNamespace], concurrency: int) -> dict:
+    from services.shared.content_rules import validate_text
+    from services.textgen_worker.tasks import _generate_ai_content
+
+    def generate(vacancy) -> tuple[float, bool]:
+        started = time.monotonic()
+        content = _generate_ai_content(vacancy)
+        elapsed = time.monotonic() - started
+        # Text that still breaks the rules ends up as a template in the task
+        usable = content is not None and not validate_text(content.get("title"), content.get("description"))
+        return elapsed, usable
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(generate, vacancies))
+    elapsed = time.monotonic() - started
+
+    latencies = sorted(latency for latency, _ in results)
+    return {
+        "concurrency": concurrency,
+        "throughput": len(vacancies) / elapsed,
+        "p50": statistics.median(latencies),
+        "p95": latencies[max(0, int(len(latencies) * 0.95) - 1)],
+        "fallbacks": sum(1 for _, ok in results if not ok),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Chat completions URL (overrides DEEPSEEK_API_URL)")
+    parser.add_argument("--vacancies", type=int, default=32, help="Vacancies per concurrency level")
+    parser.add_argument("--concurrency", default="1,2,4,8,16")
+    args = parser.parse_args()
+
+    # Settings are read once at import time, so configure them first
+    if args.url:
+        os.environ["DEEPSEEK_API_URL"] = args.url
+        os.environ.setdefault("DEEPSEEK_API_KEY", "fake")
+    logging.basicConfig(level=logging.ERROR)
+
+    print(f"{'conc':>5} {'vac/s':>8} {'p50':>8} {'p95':>8} {'fallback':>9}")
+    for level in (int(c) for c in args.concurrency.split(",")):
+        result = _run(_vacancies(args.vacancies), level)
+        print(
+            f"{result['concurrency']:>5} {result['throughput']:>8.2f} "
+            f"{result['p50']:>7.2f}s {result['p95']:>7.2f}s {result['fallbacks']:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+AdsGen 2.0 - Fake LLM Server
+OpenAI-compatible chat-completions stand-in for load-testing the textgen
+worker without spending DeepSeek credits.
+
+Usage:
+    python -m benchmarks.fake_llm_server --port 8090
+    python -m benchmarks.fake_llm_server --port 8090 --latency-median 2.0 \\
+        --latency-sigma 0.6 --error-rate 0.02 --rate-limit-rate 0.05
+
+Point the worker at it with either
+    DEEPSEEK_API_URL=http://localhost:8090/v1/chat/completions DEEPSEEK_API_KEY=fake
+or the admin panel: ai_provider=local, local_ai_url=<same URL>.
+
+Latency is log-normal (median / sigma of the underlying normal). With
+"stream": true the body is sent as SSE chunks spread over that latency,
+otherwise a single JSON body is returned once it has elapsed. Responses are
+templated from the "Профессия:" line of the prompt, or picked at random from
+--responses-file (a JSON list of strings, or of objects with a "raw" field
+such as tests/fixtures/ai_responses.json).
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+_PROFESSION_RE = re.compile(r"Профессия:\s*(.+)")
+
+
+@dataclass
+class FakeServerConfig:
+    """Behaviour knobs, set from the command line."""
+    latency_median: float = 1.5       # Seconds, median of the log-normal
+    latency_sigma: float = 0.5        # Spread of the log-normal
+    error_rate: float = 0.0           # Share of requests answered with 500
+    rate_limit_rate: float = 0.0      # Share of requests answered with 429
+    bad_title_rate: float = 0.0       # Share of responses with a rule-breaking title
+    chunk_chars: int = 12             # Characters per SSE delta
+    responses: list[str] = field(default_factory=list)
+
+
+config = FakeServerConfig()
+app = FastAPI(title="AdsGen Fake LLM")
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# RESPONSE GENERATION
+# ═══════════════════════════════════════════════════════════════════════════
+
+def _latency() -> float:
+    return random.lognormvariate(math.log(config.latency_median), config.latency_sigma)
+
+
+def _profession(messages: list[dict]) -> str:
+    for message in reversed(messages):
+        match = _PROFESSION_RE.search(message.get("content") or "")
+        if match:
+            return match.group(1).strip()
+    return "Сотрудник"
+
+
+def _content(messages: list[dict]) -> str:
+    if config.responses:
+        return random.choice(config.responses)
+
+    profession = _profession(messages)
+    if random.random() < config.bad_title_rate:
+        title = f"{profession} | от 3000 руб в смену"
+    else:
+        title = f"{profession} — подработка рядом с домом"[:50]
+
+    # Visible text stays above MIN_DESCRIPTION_LENGTH, so valid responses
+    # pass the rules without a fix round
+    description = (
+        f"<p>Ищем сотрудника на позицию «{profession}» в магазин рядом с домом.</p>"
+        "<p><strong>Обязанности:</strong></p>"
+        "<ul><li>Работа по стандартам компании</li><li>Помощь покупателям в торговом зале</li>"
+        "<li>Поддержание порядка на рабочем месте</li></ul>"
+        "<p><strong>Мы предлагаем:</strong></p>"
+        "<ul><li>Гибкий график, смены можно выбирать самостоятельно</li>"
+        "<li>Оформление через приложение за один день</li>"
+        "<li>Обучение на месте и поддержку наставника</li></ul>"
+        "<p>Откликайтесь, расскажем подробности и подберём удобный магазин.</p>"
+    )
+    return json.dumps({"title": title, "description": description}, ensure_ascii=False)
+
+
+def _usage(messages: list[dict], content: str) -> dict:
+    prompt_tokens = sum(len(m.get("content") or "") for m in messages) // 4
+    return {
+        "prompt_tokens": prompt_tokens,
+        "prompt_cache_hit_tokens": int(prompt_tokens * 0.8),
+        "completion_tokens": len(content) // 4,
+        "total_tokens": prompt_tokens + len(content) // 4,
+    }
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# ENDPOINTS
+# ═══════════════════════════════════════════════════════════════════════════
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    messages = body.get("messages") or []
+    model = body.get("model") or "fake"
+    latency = _latency()
+
+    roll = random.random()
+    if roll < config.rate_limit_rate:
+        return JSONResponse({"error": {"message": "Rate limit reached"}}, status_code=429)
+    if roll < config.rate_limit_rate + config.error_rate:
+        await asyncio.sleep(latency)
+        return JSONResponse({"error": {"message": "Internal error"}}, status_code=500)
+
+    content = _content(messages)
+    usage = _usage(messages, content)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+    if not body.get("stream"):
+        await asyncio.sleep(latency)
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage,
+        }
+
+    include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+    return StreamingResponse(
+        _stream(completion_id, model, content, latency, usage if include_usage else None),
+        media_type="text/event-stream",
+    )
+
+
+async def _stream(completion_id: str, model: str, content: str, latency: float, usage: Optional[dict]):
+    chunks = [content[i:i + config.chunk_chars] for i in range(0, len(content), config.chunk_chars)]
+    # A third of the latency is time-to-first-token, the rest is spread over the chunks
+    first_token = latency / 3
+    per_chunk = (latency - first_token) / max(len(chunks), 1)
+
+    def event(delta: dict, finish_reason: Optional[str] = None, extra: Optional[dict] = None) -> str:
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            **(extra or {}),
+        }
+        return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+
+    await asyncio.sleep(first_token)
+    yield event({"role": "assistant", "content": ""})
+    for text in chunks:
+        yield event({"content": text})
+        await asyncio.sleep(per_chunk)
+    yield event({}, finish_reason="stop")
+    if usage:
+        yield f"data: {json.dumps({'id': completion_id, 'choices': [], 'usage': usage})}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# ENTRY POINT
+# ═══════════════════════════════════════════════════════════════════════════
+
+def _load_responses(path: Path) -> list[str]:
+    data = json.loads(path.read_text(encoding="utf-8"))
+    return [item["raw"] if isinstance(item, dict) else item for item in data]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-median", type=float, default=config.latency_median)
+    parser.add_argument("--latency-sigma", type=float, default=config.latency_sigma)
+    parser.add_argument("--error-rate", type=float, default=config.error_rate)
+    parser.add_argument("--rate-limit-rate", type=float, default=config.rate_limit_rate)
+    parser.add_argument("--bad-title-rate", type=float, default=config.bad_title_rate)
+    parser.add_argument("--chunk-chars", type=int, default=config.chunk_chars)
+    parser.add_argument("--responses-file", type=Path)
+    args = parser.parse_args()
+
+    config.latency_median = args.latency_median
+    config.latency_sigma = args.latency_sigma
+    config.error_rate = args.error_rate
+    config.rate_limit_rate = args.rate_limit_rate
+    config.bad_title_rate = args.bad_title_rate
+    config.chunk_chars = args.chunk_chars
+    if args.responses_file:
+        config.responses = _load_responses(args.responses_file)
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -204,10 +204,51 @@ async def generate_batch(status_filter: str = "pending", limit: int = 50):
     )
 
 
+@app.post("/generate/scan-duplicates", response_model=TaskResponse)
+async def scan_duplicates(profession: Optional[str] = None, regenerate: bool = False):
+    """Rebuild the near-duplicate index and report (or regenerate) duplicate descriptions."""
+    from services.shared.celery_app import celery_app
+    task = celery_app.send_task(
+        "services.textgen_worker.tasks.scan_near_duplicates",
+        args=[profession, regenerate]
+    )
+    
+    return TaskResponse(
+        task_id=task.id,
+        status="pending",
+        message="Near-duplicate scan started",
+    )
+
+
 # ═══════════════════════════════════════════════════════════════════════════
 # VALIDATION & PUBLISHING
 # ═══════════════════════════════════════════════════════════════════════════
 
+@app.post("/validate/bulk", response_model=TaskResponse)
+async def validate_bulk(
+    statuses: Optional[list[str]] = None,
+    only_changed: bool = False,
+    since_version: Optional[str] = None,
+):
+    """
+    Revalidate the catalogue (optionally only the given statuses) in one task.
+    `only_changed` skips ads that already passed the current rules unchanged;
+    `since_version` takes only ads last passed under that rules version.
+    """
+    from services.shared.celery_app import celery_app
+    task = celery_app.send_task(
+        "services.validation_worker.tasks.validate_bulk",
+        args=[statuses],
+        kwargs={"only_changed": only_changed, "since_version": since_version},
+    )
+    
+    return TaskResponse(
+        task_id=task.id,
+        status="pending",
+        message="Bulk validation started",
+    )
+
+
 @app.post("/validate/{vacancy_id}", response_model=TaskResponse)
 async def validate_vacancy(vacancy_id: str):
     """Validate vacancy content against Avito rules."""
@@ -425,6 +466,74 @@ async def delete_vacancies(
     return {"deleted": deleted, "count": len(deleted)}
 
 
+@app.get("/usage/summary")
+async def get_usage_summary(
+    group_by: str = "day",
+    kind: Optional[str] = None,
+    days: int = 30,
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Aggregated token and latency usage of generation calls.
+    group_by: day | profession | provider | batch
+    """
+    from datetime import datetime, timedelta, timezone
+    from services.shared.models.usage import GenerationUsage, UsageKind
+    
+    group_columns = {
+        "day": func.date_trunc("day", GenerationUsage.created_at),
+        "profession": Vacancy.profession,
+        "provider": GenerationUsage.provider,
+        "batch": GenerationUsage.import_batch_id,
+    }
+    if group_by not in group_columns:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of {list(group_columns)}")
+    group_col = group_columns[group_by].label("key")
+    
+    query = select(
+        group_col,
+        GenerationUsage.kind,
+        func.count().label("calls"),
+        func.count().filter(GenerationUsage.success.is_(False)).label("failures"),
+        func.sum(GenerationUsage.prompt_tokens).label("prompt_tokens"),
+        func.sum(GenerationUsage.cached_tokens).label("cached_tokens"),
+        func.sum(GenerationUsage.completion_tokens).label("completion_tokens"),
+        func.avg(GenerationUsage.latency_ms).label("avg_latency_ms"),
+        func.percentile_cont(0.95).within_group(GenerationUsage.latency_ms).label("p95_latency_ms"),
+    ).where(
+        GenerationUsage.created_at >= datetime.now(timezone.utc) - timedelta(days=days)
+    )
+    
+    if group_by == "profession":
+        query = query.join(Vacancy, Vacancy.id == GenerationUsage.vacancy_id)
+    
+    if kind:
+        try:
+            query = query.where(GenerationUsage.kind == UsageKind(kind))
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Unknown kind: {kind}")
+    
+    query = query.group_by(group_col, GenerationUsage.kind).order_by(group_col)
+    result = await session.execute(query)
+    
+    items = []
+    for row in result:
+        key = row.key.date().isoformat() if group_by == "day" and row.key else row.key
+        items.append({
+            "key": key,
+            "kind": row.kind.value,
+            "calls": row.calls,
+            "failures": row.failures or 0,
+            "prompt_tokens": row.prompt_tokens or 0,
+            "cached_tokens": row.cached_tokens or 0,
+            "completion_tokens": row.completion_tokens or 0,
+            "avg_latency_ms": round(float(row.avg_latency_ms or 0)),
+            "p95_latency_ms": round(float(row.p95_latency_ms or 0)),
+        })
+    
+    return {"group_by": group_by, "days": days, "items": items}
+
+
 # ═══════════════════════════════════════════════════════════════════════════
 # STEP MODE SETTINGS
 # ═══════════════════════════════════════════════════════════════════════════
@@ -446,6 +555,107 @@ async def set_step_mode_endpoint(enabled: bool = Body(..., embed=True)):
     return {"step_mode": enabled, "updated": True}
 
 
+# ═══════════════════════════════════════════════════════════════════════════
+# CIRCUIT BREAKERS
+# ═══════════════════════════════════════════════════════════════════════════
+
+@app.get("/settings/circuit-breakers")
+async def get_circuit_breakers():
+    """Get current state of the external service circuit breakers."""
+    from services.shared.circuit_breaker import get_all_breaker_states
+    return {"breakers": get_all_breaker_states()}
+
+
+@app.post("/settings/circuit-breakers/{name}/reset")
+async def reset_circuit_breaker(name: str):
+    """Force a circuit breaker back to closed."""
+    from services.shared.circuit_breaker import BREAKER_CONFIGS, get_breaker
+    if name not in BREAKER_CONFIGS:
+        raise HTTPException(status_code=404, detail="Unknown circuit breaker")
+    get_breaker(name).reset()
+    return {"name": name, "state": get_breaker(name).get_state()}
+
+
+@app.get("/settings/comfyui-nodes")
+async def get_comfyui_nodes():
+    """Health, in-flight renders and circuit breaker state of every ComfyUI node."""
+    from services.shared.circuit_breaker import get_breaker
+    from services.shared.comfyui_pool import get_nodes, get_pool_status
+    from services.shared.worker_settings import get_worker_settings
+    nodes = get_pool_status(get_nodes(get_worker_settings("imagegen")))
+    for node in nodes:
+        node["breaker"] = get_breaker(f"comfyui:{node['url']}").get_state()
+    return {"nodes": nodes}
+
+
+@app.get("/settings/image-routing")
+async def get_image_routing(session: AsyncSession = Depends(get_session)):
+    """Workflow imagegen renders with right now, and latency/throughput per provider and workflow."""
+    from datetime import datetime, timezone
+    from services.shared.image_routing import choose_workflow, get_all_profiles, oldest_waiting_query
+    from services.shared.worker_settings import get_worker_settings
+    
+    worker_settings = get_worker_settings("imagegen")
+    provider = worker_settings.get("provider") or "comfyui"
+    threshold = int(worker_settings.get("downgrade_after_minutes", 30))
+    oldest_waiting = (await session.execute(oldest_waiting_query(threshold))).scalar_one_or_none()
+    
+    workflow, downgraded = worker_settings.get("polza_model", ""), False
+    if provider == "comfyui":
+        workflow, downgraded = choose_workflow(worker_settings.get("workflow", ""), oldest_waiting, threshold)
+    
+    return {
+        "provider": provider,
+        "workflow": workflow,
+        "downgraded": downgraded,
+        "backlog_age_seconds": (
+            int((datetime.now(timezone.utc) - oldest_waiting).total_seconds()) if oldest_waiting else 0
+        ),
+        "profiles": get_all_profiles(),
+    }
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# WEBHOOKS
+# ═══════════════════════════════════════════════════════════════════════════
+
+@app.post("/webhooks/comfyui")
+async def comfyui_webhook(request: Request, payload: dict = Body(...)):
+    """
+    Completion callback of an async ComfyUI render.
+    Body: {"job_id": ..., "status": "done" | "failed", "image_url": ...}
+    Disabled until COMFYUI_WEBHOOK_SECRET is set: the worker downloads the
+    image_url it is given.
+    """
+    import hmac
+    from urllib.parse import urlsplit
+    
+    if not settings.comfyui_webhook_secret:
+        raise HTTPException(status_code=404, detail="ComfyUI webhook is disabled")
+    secret = request.headers.get("X-Webhook-Secret", "")
+    if not hmac.compare_digest(secret.encode(), settings.comfyui_webhook_secret.encode()):
+        raise HTTPException(status_code=403, detail="Invalid webhook secret")
+    
+    job_id = payload.get("job_id")
+    if not job_id:
+        raise HTTPException(status_code=400, detail="job_id is required")
+    
+    image_url = payload.get("image_url") if payload.get("status") in ("done", "completed") else None
+    if image_url:
+        parts = urlsplit(str(image_url))
+        allowed_hosts = {host.strip().lower() for host in settings.comfyui_image_hosts.split(",") if host.strip()}
+        if parts.scheme not in ("http", "https") or (allowed_hosts and (parts.hostname or "") not in allowed_hosts):
+            raise HTTPException(status_code=400, detail="image_url is not on an allowed host")
+    
+    from services.shared.celery_app import celery_app
+    task = celery_app.send_task(
+        "services.imagegen_worker.tasks.complete_comfyui_job",
+        args=[str(job_id), image_url]
+    )
+    
+    return {"job_id": job_id, "task_id": task.id}
+
+
 # ═══════════════════════════════════════════════════════════════════════════
 # COMPANY PROFILE SETTINGS
 # ═══════════════════════════════════════════════════════════════════════════
@@ -468,6 +678,48 @@ async def update_company_profile(updates: dict = Body(...)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ═══════════════════════════════════════════════════════════════════════════
+# STOP WORDS
+# ═══════════════════════════════════════════════════════════════════════════
+
+@app.get("/settings/stop-words")
+async def get_stop_words():
+    """Built-in stop phrases and the ones added at runtime."""
+    from services.shared.content_rules import STOP_WORDS
+    from services.shared.stop_words import get_custom_stop_words
+    return {"builtin": STOP_WORDS, "custom": get_custom_stop_words()}
+
+
+@app.put("/settings/stop-words")
+async def update_stop_words(phrases: List[str] = Body(..., embed=True)):
+    """Replace the runtime stop phrases (workers reload them within 30 s)."""
+    from services.shared.stop_words import get_custom_stop_words, set_custom_stop_words
+    if not set_custom_stop_words(phrases):
+        raise HTTPException(status_code=500, detail="Failed to update stop words")
+    return {"custom": get_custom_stop_words(), "updated": True}
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# VALIDATION RULES
+# ═══════════════════════════════════════════════════════════════════════════
+
+@app.get("/settings/validation-rules")
+async def get_validation_rules():
+    """Validation rules with their severity, hit counts and average time."""
+    from services.shared.validation_rules import get_rule_config, get_rule_stats, rules_version
+    config = get_rule_config()
+    return {"version": rules_version(config), "rules": get_rule_stats(config)}
+
+
+@app.post("/settings/validation-rules/reset-stats")
+async def reset_validation_rule_stats():
+    """Zero the per-rule counters."""
+    from services.shared.validation_rules import reset_rule_stats
+    if not reset_rule_stats():
+        raise HTTPException(status_code=500, detail="Failed to reset rule stats")
+    return {"reset": True}
+
+
 # ═══════════════════════════════════════════════════════════════════════════
 # XML EXPORT
 # ═══════════════════════════════════════════════════════════════════════════
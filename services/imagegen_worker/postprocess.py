@@ -0,0 +1,195 @@
+"""
+AdsGen 2.0 - Image Post-Processing
+Downloads a rendered image once, checks it and recompresses it to Avito's
+recommended size, and keeps it in a content-addressed local cache until
+the bulk upload publishes it on Yandex Disk
+"""
+
+import hashlib
+import io
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+import httpx
+from PIL import Image, UnidentifiedImageError
+from sqlalchemy import or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from services.shared.config import get_settings
+from services.shared.content_rules import IMAGE_MAX_SIZE, IMAGE_MIN_SIDE
+from services.shared.models.image_asset import ImageAsset
+from services.shared.models.image_library import ImageLibraryItem
+from services.shared.models.vacancy import Vacancy
+from services.shared.yandex_disk import YandexDiskClient
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+JPEG_QUALITY = 85
+MAX_DOWNLOAD_BYTES = 20 * 1024 * 1024
+
+# Public Yandex Disk pages wrap the file in HTML; these need the download API
+_YANDEX_PUBLIC_HOSTS = ("disk.yandex.ru", "yadi.sk")
+
+
+@dataclass(frozen=True)
+class ProcessedImage:
+    """Recompressed image ready to be cached and uploaded."""
+    data: bytes
+    sha256: str
+    width: int
+    height: int
+    mime: str = "image/jpeg"
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# PROCESSING
+# ═══════════════════════════════════════════════════════════════════════════
+
+def process_image(raw: bytes) -> ProcessedImage:
+    """
+    Decode, check and re-encode an image as a progressive JPEG that fits
+    IMAGE_MAX_SIZE. Raises ValueError for anything that is not a usable
+    image.
+    """
+    try:
+        image = Image.open(io.BytesIO(raw))
+        image.load()
+    except (UnidentifiedImageError, OSError) as e:
+        raise ValueError(f"Not an image: {e}") from e
+
+    if min(image.size) < IMAGE_MIN_SIDE:
+        raise ValueError(f"Image too small: {image.width}x{image.height}")
+
+    image = image.convert("RGB")
+    image.thumbnail(IMAGE_MAX_SIZE, Image.LANCZOS)
+
+    out = io.BytesIO()
+    image.save(out, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    data = out.getvalue()
+
+    return ProcessedImage(
+        data=data,
+        sha256=hashlib.sha256(data).hexdigest(),
+        width=image.width,
+        height=image.height,
+    )
+
+
+def download_image(url: str) -> bytes:
+    """Fetch image bytes, resolving public Yandex Disk pages to the file."""
+    if any(host in url for host in _YANDEX_PUBLIC_HOSTS):
+        with YandexDiskClient(timeout=30.0) as disk:
+            url = disk.public_download_url(url)
+
+    with httpx.Client(timeout=60.0, follow_redirects=True) as client:
+        response = client.get(url)
+        response.raise_for_status()
+        if len(response.content) > MAX_DOWNLOAD_BYTES:
+            raise ValueError(f"Image too large: {len(response.content)} bytes")
+        return response.content
+
+
+def cache_path(sha256: str) -> Path:
+    """Content-addressed location of a processed image."""
+    return Path(settings.image_cache_dir) / sha256[:2] / f"{sha256}.jpg"
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# ASSETS
+# ═══════════════════════════════════════════════════════════════════════════
+
+def register_image(session: Session, image_url: str) -> Optional[ImageAsset]:
+    """
+    Asset for a rendered image URL: an already known one (same URL, or
+    identical bytes after processing), or a freshly processed one written
+    to the local cache and queued for upload. None if the image could not
+    be fetched or is unusable - the caller keeps the raw URL then.
+    """
+    asset = session.scalars(
+        select(ImageAsset).where(or_(ImageAsset.source_url == image_url, ImageAsset.public_url == image_url))
+    ).first()
+    if asset:
+        return asset
+
+    try:
+        processed = process_image(download_image(image_url))
+    except Exception as e:
+        logger.warning(f"Image post-processing failed for {image_url}: {e}")
+        return None
+
+    asset = session.get(ImageAsset, processed.sha256)
+    if asset:
+        logger.info(f"Render {image_url} duplicates image {processed.sha256[:12]}")
+        return asset
+
+    path = cache_path(processed.sha256)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(processed.data)
+
+    asset = ImageAsset(
+        sha256=processed.sha256,
+        source_url=image_url,
+        width=processed.width,
+        height=processed.height,
+        mime=processed.mime,
+        size_bytes=len(processed.data),
+    )
+    try:
+        with session.begin_nested():
+            session.add(asset)
+    except IntegrityError:
+        # Another worker registered the same bytes a moment ago
+        asset = session.get(ImageAsset, processed.sha256)
+    return asset
+
+
+def upload_pending(session: Session, limit: int) -> int:
+    """
+    Publish up to `limit` cached images on Yandex Disk over one connection,
+    then point every vacancy and library variant using them at the
+    published copy. Returns the number uploaded.
+    """
+    assets = session.scalars(
+        select(ImageAsset)
+        .where(ImageAsset.public_url.is_(None))
+        .order_by(ImageAsset.created_at)
+        .limit(limit)
+    ).all()
+    if not assets:
+        return 0
+
+    folder = f"{settings.yandex_disk_folder or 'Картинки_Авито'}/images"
+    uploaded = []
+
+    with YandexDiskClient() as disk:
+        disk.ensure_folder(folder)
+        for asset in assets:
+            path = cache_path(asset.sha256)
+            if not path.exists():
+                logger.warning(f"Image {asset.sha256[:12]} missing from the local cache, skipped")
+                continue
+            try:
+                asset.public_url = disk.upload(f"{folder}/{asset.sha256}.jpg", path.read_bytes(), asset.mime)
+            except Exception as e:
+                logger.error(f"Upload of image {asset.sha256[:12]} failed: {e}")
+                continue
+            asset.uploaded_at = datetime.now(timezone.utc)
+            uploaded.append(asset)
+
+    for asset in uploaded:
+        session.execute(
+            update(Vacancy).where(Vacancy.image_hash == asset.sha256).values(image_url=asset.public_url)
+        )
+        session.execute(
+            update(ImageLibraryItem)
+            .where(ImageLibraryItem.image_url == asset.source_url)
+            .values(image_url=asset.public_url)
+        )
+    session.commit()
+
+    return len(uploaded)
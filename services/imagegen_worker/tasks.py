@@ -4,19 +4,46 @@ Celery tasks for generating profession images via ComfyUI
 Migrated from avito-vacancies-v3.gs (generateImage, getProfessionImage)
 """
 
+import hashlib
 import json
 import logging
+import math
 import random
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timezone
 from typing import Optional
 
 import httpx
+import redis
 from celery import shared_task
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 
 from services.shared.config import get_settings
 from services.shared.database import get_sync_engine
+from services.shared.image_routing import FAST_WORKFLOW, choose_workflow, oldest_waiting_query, record_render
+from services.shared.demand import RatePacer, acquire_run_lock, forecast_demand, in_window, release_run_lock
 from services.shared.models.vacancy import Vacancy, VacancyStatus
+from services.shared.models.image_library import ImageLibraryItem
 from services.shared.celery_app import celery_app
+from services.shared.circuit_breaker import CircuitBreaker, get_breaker, STATE_OPEN
+from services.shared.models.usage import UsageKind
+from services.shared.usage import record_usage
+from services.shared.worker_settings import get_worker_settings
+from services.shared.comfyui_pool import (
+    acquire_node,
+    get_nodes,
+    has_healthy_node,
+    mark_health,
+    release_node,
+    renew_node,
+    report_failure,
+    report_success,
+)
+from services.imagegen_worker.postprocess import register_image, upload_pending
+from services.imagegen_worker.translation import translate, translate_many
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
@@ -27,6 +54,36 @@ sync_engine = get_sync_engine()
 # Default fallback image
 FALLBACK_IMAGE = "https://www.avito.ru/static/images/profile/default_profile_140x140.png"
 
+# OpenAI-compatible image endpoint of Polza.ai
+POLZA_IMAGES_URL = "https://api.polza.ai/api/v1/images/generations"
+
+# Async renders: status check interval and lifetime of the job context
+COMFYUI_JOB_PREFIX = "adsgen:comfyui_job:"
+POLL_INTERVAL = 5
+JOB_CONTEXT_TTL = 24 * 3600
+
+# Pool slot lease beyond the render timeout, and extra render time per
+# additional image of a batch
+LEASE_MARGIN = 60
+BATCH_IMAGE_SECONDS = 60
+
+# A timed-out async job keeps its slot until the node reports it finished,
+# at most this many imagegen timeouts after submission
+LATE_JOB_TIMEOUTS = 3
+
+# Vacancies waiting for a batched render, per library key
+IMAGE_BATCH_PREFIX = "adsgen:image_batch:"
+
+# Length of one off-peak pre-generation run (beat fires every 15 min)
+PREGEN_RUN_MINUTES = 14
+
+# Age bands used as image library keys (inclusive bounds)
+AGE_BUCKETS = {
+    "20-29": (20, 29),
+    "30-39": (30, 39),
+    "40-45": (40, 45),
+}
+
 
 # ═══════════════════════════════════════════════════════════════════════════
 # MAIN TASK
@@ -40,7 +97,10 @@ def generate_vacancy_image(
     age: Optional[int] = None
 ) -> dict:
     """
-    Generate image for a vacancy using ComfyUI.
+    Assign an image to a vacancy.
+    Images are reused from the image library when the vacancy's key
+    (profession, gender, age bucket, style, workflow, service) already has
+    enough variants; ComfyUI is only called to stock an understocked key.
     """
     logger.info(f"Starting image generation for vacancy: {vacancy_id}")
     
@@ -51,6 +111,7 @@ def generate_vacancy_image(
             logger.error(f"Vacancy not found: {vacancy_id}")
             return {"error": "Vacancy not found"}
         
+        node, slot = None, None
         try:
             # Update status
             vacancy.status = VacancyStatus.IMAGE_GENERATING
@@ -59,57 +120,108 @@ def generate_vacancy_image(
             # Generate random gender/age if not provided
             if not gender:
                 gender = random.choice(["man", "woman"])
+            age_bucket = _age_bucket(age) if age else random.choice(list(AGE_BUCKETS))
             if not age:
-                age = random.randint(20, 45)
-            
-            # Build notes from vacancy data
-            notes = ""
-            if vacancy.notes:
-                notes = f"Context from notes: {vacancy.notes}"
-            if vacancy.service:
-                notes += f". Service context: {vacancy.service}"
-            
-            # Translate profession to English for ComfyUI
-            en_profession = _translate_to_english(vacancy.profession)
-            en_notes = _translate_to_english(notes) if notes else None
-            
-            logger.info(f"Generating image: profession={en_profession}, gender={gender}, age={age}")
-            
-            # Call ComfyUI
-            image_url = _call_comfyui(
-                profession=en_profession,
-                gender=gender,
-                age=age,
-                notes=en_notes,
+                age = random.randint(*AGE_BUCKETS[age_bucket])
+            
+            # Prompt context shared by the library key
+            notes = _image_context(vacancy.service)
+            
+            # Route by the imagegen settings (workflow may be downgraded under backlog)
+            worker_settings = get_worker_settings("imagegen")
+            route = _resolve_route(session, worker_settings)
+            
+            # Reuse a library image when the key is fully stocked
+            key = _library_key(vacancy.profession, gender, age_bucket, vacancy.service, route)
+            variants = int(worker_settings.get("library_variants", 5))
+            
+            if _library_stock(session, key) >= variants:
+                image_url = _take_from_library(session, key)
+                if image_url:
+                    logger.info(f"Image library hit for {vacancy_id}: {key}")
+                    return _finish_with_image(session, vacancy, image_url)
+            
+            # The provider is known to be down - skip translation and rendering entirely
+            # (ComfyUI nodes have a breaker each, see _routable_nodes)
+            if route.provider == "polza" and get_breaker(route.breaker).get_state() == STATE_OPEN:
+                logger.warning(f"{route.provider} circuit is open, no render for {vacancy_id}")
+                return _finish_with_image(session, vacancy, _take_from_library(session, key))
+            
+            if route.provider == "comfyui":
+                # Wait for other vacancies of the same key and render them in one workflow run
+                batch_size = int(worker_settings.get("batch_size", 1))
+                if batch_size > 1 and _join_batch(key, vacancy_id, age, batch_size, int(worker_settings.get("batch_wait", 20))):
+                    logger.info(f"Vacancy {vacancy_id} waits for a batched render of {key['profession']}")
+                    return {"vacancy_id": vacancy_id, "status": "batched"}
+                
+                # Reserve a slot on the least busy healthy node
+                nodes = _routable_nodes(worker_settings)
+                node, slot = acquire_node(nodes, int(worker_settings.get("node_max_jobs", 2)), route.timeout + LEASE_MARGIN)
+                if not node:
+                    if has_healthy_node(nodes):
+                        # Every node is at its cap - come back when slots free up
+                        generate_vacancy_image.apply_async(args=[vacancy_id, gender, age], countdown=POLL_INTERVAL)
+                        return {"vacancy_id": vacancy_id, "status": "queued"}
+                    logger.warning(f"No healthy ComfyUI node, no render for {vacancy_id}")
+                    return _finish_with_image(session, vacancy, _take_from_library(session, key))
+            
+            # Translate profession to English for the image model
+            en_profession, en_notes = translate_many([vacancy.profession, notes or None], vacancy=vacancy)
+            
+            logger.info(
+                f"Generating image with {route.provider}/{route.workflow} on {node or 'API'}: "
+                f"profession={en_profession}, gender={gender}, age={age}"
             )
             
-            if image_url:
-                vacancy.image_url = image_url
-                vacancy.status = VacancyStatus.IMAGE_GENERATED
-            else:
-                vacancy.image_url = FALLBACK_IMAGE
-                vacancy.status = VacancyStatus.IMAGE_GENERATED
-                logger.warning(f"Using fallback image for {vacancy_id}")
+            # Submit the render and release this worker slot; the result is
+            # picked up by poll_comfyui_job or the /webhooks/comfyui callback
+            if node and worker_settings.get("render_mode", "async") == "async":
+                job_id, async_supported = _submit_comfyui(
+                    en_profession, gender, age, en_notes, url=node, workflow=route.workflow, style=route.style
+                )
+                if job_id:
+                    vacancy.image_job_id = job_id
+                    session.commit()
+                    _save_job_context(job_id, vacancy_id, key, node, slot)
+                    poll_comfyui_job.apply_async(args=[vacancy_id, job_id], countdown=POLL_INTERVAL)
+                    logger.info(f"ComfyUI job {job_id} submitted for {vacancy_id}")
+                    return {"vacancy_id": vacancy_id, "job_id": job_id, "status": "submitted"}
+                if async_supported:
+                    release_node(node, slot)
+                    return _finish_with_image(session, vacancy, _take_from_library(session, key))
+                logger.warning("ComfyUI server has no async API, rendering synchronously")
             
-            session.commit()
+            # Blocking render
+            started = time.monotonic()
+            try:
+                if route.provider == "polza":
+                    image_url = _call_polza(en_profession, gender, age, en_notes, route)
+                else:
+                    image_url = _call_comfyui(
+                        profession=en_profession,
+                        gender=gender,
+                        age=age,
+                        notes=en_notes,
+                        url=node,
+                        workflow=route.workflow,
+                        style=route.style,
+                        timeout=route.timeout,
+                    )
+            finally:
+                release_node(node, slot)
+            _record_render(route.provider, route.workflow, time.monotonic() - started, vacancy=vacancy, success=bool(image_url))
             
-            # Trigger validation (unless in step mode)
-            from services.shared.config import is_step_mode_enabled
-            if not is_step_mode_enabled():
-                from services.validation_worker.tasks import validate_vacancy_content
-                validate_vacancy_content.delay(vacancy_id)
-                logger.info(f"Image generated, triggering validation for {vacancy_id}")
+            if image_url:
+                _add_to_library(session, key, image_url)
             else:
-                logger.info(f"Image generated for {vacancy_id} (step mode - stopping here)")
+                # A reused variant beats the placeholder
+                image_url = _take_from_library(session, key)
             
-            return {
-                "vacancy_id": vacancy_id,
-                "image_url": vacancy.image_url,
-                "status": "success",
-            }
+            return _finish_with_image(session, vacancy, image_url)
             
         except Exception as e:
             logger.error(f"Image generation failed for {vacancy_id}: {e}")
+            release_node(node, slot)
             vacancy.status = VacancyStatus.ERROR
             vacancy.error_message = f"Image generation failed: {e}"
             vacancy.retry_count += 1
@@ -121,23 +233,643 @@ def generate_vacancy_image(
             return {"error": str(e)}
 
 
+@celery_app.task(ignore_result=True)
+def poll_comfyui_job(vacancy_id: str, job_id: str, attempt: int = 0) -> dict:
+    """
+    Check a submitted render. Re-schedules itself every POLL_INTERVAL
+    seconds until the job finishes or the imagegen timeout runs out; a
+    timed-out job is still polled (up to LATE_JOB_TIMEOUTS timeouts) so its
+    pool slot is held until the node is done with it.
+    """
+    with Session(sync_engine) as session:
+        vacancy = session.get(Vacancy, vacancy_id)
+        waiting = vacancy is not None and vacancy.image_job_id == job_id
+    
+    context = _load_job_context(job_id) or {}
+    late = bool(context.get("late"))
+    if not waiting and not late:
+        # Already completed through the webhook
+        return {"vacancy_id": vacancy_id, "job_id": job_id, "status": "skipped"}
+    
+    state, image_url = _get_comfyui_job(job_id, url=context.get("node"))
+    
+    if state == "pending":
+        timeout = int(get_worker_settings("imagegen").get("timeout", 120))
+        limit = timeout * LATE_JOB_TIMEOUTS if late else timeout
+        if (attempt + 2) * POLL_INTERVAL <= limit:
+            poll_comfyui_job.apply_async(args=[vacancy_id, job_id, attempt + 1], countdown=POLL_INTERVAL)
+            return {"vacancy_id": vacancy_id, "job_id": job_id, "status": "pending"}
+        if not late:
+            logger.error(f"ComfyUI job {job_id} timed out after {timeout}s, vacancy continues without it")
+            return complete_comfyui_job(job_id, timed_out=True, lease=timeout * (LATE_JOB_TIMEOUTS - 1) + LEASE_MARGIN)
+        logger.error(f"ComfyUI job {job_id} never finished, giving its slot back")
+    
+    return complete_comfyui_job(job_id, image_url if state == "done" else None)
+
+
+@celery_app.task
+def complete_comfyui_job(
+    job_id: str,
+    image_url: Optional[str] = None,
+    timed_out: bool = False,
+    lease: int = 0,
+) -> dict:
+    """
+    Finish the vacancy waiting for a ComfyUI job. Called by the poller and
+    by the webhook; whichever comes second finds no vacancy and does nothing.
+    On `timed_out` the vacancy is finished without the render, but the job
+    keeps its pool slot (renewed for `lease` seconds) as it still occupies
+    the node; its late result releases the slot and stocks the library.
+    """
+    with Session(sync_engine) as session:
+        vacancy = session.scalars(
+            select(Vacancy)
+            .where(Vacancy.image_job_id == job_id)
+            .with_for_update(skip_locked=True)
+        ).first()
+        if not vacancy:
+            return _complete_late_job(session, job_id, image_url)
+        
+        if timed_out:
+            context = _load_job_context(job_id) or {}
+            _mark_job_late(job_id, context, lease)
+        else:
+            context = _pop_job_context(job_id) or {}
+            release_node(context.get("node"), context.get("slot"))
+        if not image_url and context.get("node"):
+            _node_breaker(context["node"]).record_failure()
+        _record_render(
+            "comfyui",
+            (context.get("key") or {}).get("workflow", ""),
+            time.time() - context.get("submitted_at", time.time()),
+            vacancy=vacancy,
+            success=bool(image_url),
+        )
+        
+        vacancy.image_job_id = None
+        key = context.get("key")
+        if key and image_url:
+            _add_to_library(session, key, image_url)
+        elif key:
+            image_url = _take_from_library(session, key)
+        
+        return _finish_with_image(session, vacancy, image_url)
+
+
+@celery_app.task(ignore_result=True)
+def flush_image_batch(group: str) -> dict:
+    """
+    Take up to batch_size vacancies waiting under one library key and
+    render them. Fires when the batch fills up or batch_wait seconds after
+    its first vacancy arrived.
+    """
+    batch_size = max(int(get_worker_settings("imagegen").get("batch_size", 1)), 1)
+    prefix = f"{IMAGE_BATCH_PREFIX}{group}"
+    
+    try:
+        client = _get_redis_client()
+        # LRANGE + LTRIM in one MULTI (LPOP with a count needs Redis 6.2)
+        pipe = client.pipeline()
+        pipe.lrange(prefix, 0, batch_size - 1)
+        pipe.ltrim(prefix, batch_size, -1)
+        pipe.get(f"{prefix}:meta")
+        pipe.delete(f"{prefix}:timer")
+        pipe.llen(prefix)
+        raw_ids, _, raw_meta, _, remaining = pipe.execute()
+    except Exception as e:
+        logger.error(f"Image batch {group} unavailable: {e}")
+        return {"group": group, "status": "failed"}
+    
+    if remaining:
+        flush_image_batch.delay(group)
+    if not raw_ids or not raw_meta:
+        return {"group": group, "status": "empty"}
+    
+    meta = json.loads(raw_meta)
+    vacancy_ids = [v.decode() if isinstance(v, bytes) else v for v in raw_ids]
+    return render_image_batch(vacancy_ids, meta["key"], meta["age"])
+
+
+@celery_app.task(ignore_result=True)
+def render_image_batch(vacancy_ids: list[str], key: dict, age: int) -> dict:
+    """
+    Render images for vacancies sharing a library key in one ComfyUI
+    workflow run (at least batch_size images, blocking /generate). Outputs
+    go to the vacancies in order, the surplus to the image library as
+    unused variants; vacancies left without an output get a library
+    variant or the fallback.
+    """
+    worker_settings = get_worker_settings("imagegen")
+    
+    with Session(sync_engine) as session:
+        vacancies = [
+            vacancy for vacancy in (session.get(Vacancy, vacancy_id) for vacancy_id in vacancy_ids)
+            if vacancy and vacancy.status == VacancyStatus.IMAGE_GENERATING
+        ]
+        if not vacancies:
+            return {"status": "skipped", "rendered": 0}
+        
+        image_urls = []
+        count = max(int(worker_settings.get("batch_size", 1)), len(vacancies))
+        timeout = int(worker_settings.get("timeout", 120))
+        lease = timeout + BATCH_IMAGE_SECONDS * (count - 1) + LEASE_MARGIN
+        nodes = _routable_nodes(worker_settings)
+        node, slot = acquire_node(nodes, int(worker_settings.get("node_max_jobs", 2)), lease)
+        if not node and has_healthy_node(nodes):
+            # Every node is at its cap - come back when slots free up
+            render_image_batch.apply_async(args=[[v.id for v in vacancies], key, age], countdown=POLL_INTERVAL)
+            return {"status": "queued", "rendered": 0}
+        
+        if node:
+            first = vacancies[0]
+            notes = _image_context(first.service)
+            en_profession, en_notes = translate_many([first.profession, notes or None], vacancy=first)
+            
+            logger.info(f"Rendering a batch of {count} images on {node} for {len(vacancies)} vacancies: {key}")
+            started = time.monotonic()
+            try:
+                image_urls = _call_comfyui_batch(
+                    en_profession, key["gender"], age, en_notes, count,
+                    url=node, workflow=key.get("workflow"), style=key.get("style"), timeout=timeout,
+                )
+            finally:
+                release_node(node, slot)
+            
+            elapsed = time.monotonic() - started
+            record_render("comfyui", key.get("workflow", ""), elapsed, len(image_urls), bool(image_urls))
+            for i in range(max(len(image_urls), 1)):
+                record_usage(
+                    UsageKind.IMAGE,
+                    provider="comfyui",
+                    model=key.get("workflow"),
+                    latency=elapsed / max(len(image_urls), 1),
+                    vacancy=vacancies[i] if i < len(vacancies) else None,
+                    success=bool(image_urls),
+                )
+        
+        for image_url in image_urls[len(vacancies):]:
+            _add_to_library(session, key, image_url, used=False)
+        
+        for i, vacancy in enumerate(vacancies):
+            if i < len(image_urls):
+                _add_to_library(session, key, image_urls[i])
+                _finish_with_image(session, vacancy, image_urls[i])
+            else:
+                _finish_with_image(session, vacancy, _take_from_library(session, key))
+    
+    return {"status": "done", "rendered": len(image_urls), "vacancies": len(vacancies)}
+
+
+@celery_app.task(ignore_result=True)
+def probe_comfyui_nodes() -> dict:
+    """
+    Health-check every configured ComfyUI node (beat, every 30 s).
+    Failing nodes leave the pool until a probe succeeds again.
+    """
+    results = {node: _check_comfyui_health(node) for node in get_nodes(get_worker_settings("imagegen"))}
+    for node, healthy in results.items():
+        mark_health(node, healthy)
+    return results
+
+
+@celery_app.task(ignore_result=True)
+def pregenerate_images() -> dict:
+    """
+    Stock the image library during the off-peak window (beat, every
+    15 min). Profession/service groups are visited in order of forecast
+    demand and get one variant per expected vacancy, spread over their
+    least stocked gender/age keys (each up to library_variants), so
+    daytime vacancies are served without a render.
+    Renders are paced to pregen_per_minute, use free pool slots only and
+    produce up to batch_size variants per workflow run. ComfyUI only -
+    Polza bills per image whatever the time of day.
+    """
+    worker_settings = get_worker_settings("imagegen")
+    window = worker_settings.get("pregen_window", "")
+    if not worker_settings.get("pregen_enabled") or not in_window(window):
+        return {"status": "skipped"}
+    if (worker_settings.get("provider") or "comfyui") != "comfyui":
+        return {"status": "skipped"}
+    
+    if not acquire_run_lock("imagegen", PREGEN_RUN_MINUTES * 60):
+        return {"status": "running"}
+    
+    per_minute = float(worker_settings.get("pregen_per_minute", 4))
+    budget = int(per_minute * PREGEN_RUN_MINUTES)
+    variants = int(worker_settings.get("library_variants", 5))
+    nodes = _routable_nodes(worker_settings)
+    max_jobs = int(worker_settings.get("node_max_jobs", 2))
+    batch_size = max(int(worker_settings.get("batch_size", 1)), 1)
+    pacer = RatePacer(per_minute)
+    rendered = failures = 0
+    
+    try:
+        with Session(sync_engine) as session:
+            route = _resolve_route(session, worker_settings)
+            demand = _merge_demand(forecast_demand(session, [Vacancy.profession, Vacancy.service]))
+            
+            for (profession, service), expected in demand:
+                notes = _image_context(service)
+                translated = None
+                
+                # Vacancies pick a gender and age band at random: spread one
+                # variant per expected vacancy over the least stocked keys
+                keys = {
+                    (gender, age_bucket): _library_key(profession, gender, age_bucket, service, route)
+                    for age_bucket in AGE_BUCKETS
+                    for gender in ("man", "woman")
+                }
+                stock = {cell: _library_stock(session, key) for cell, key in keys.items()}
+                
+                for (gender, age_bucket), missing in _plan_fill(stock, variants, math.ceil(expected)).items():
+                    key = keys[(gender, age_bucket)]
+                    ages = AGE_BUCKETS[age_bucket]
+                    while missing > 0:
+                        if rendered >= budget or failures >= 3 or not in_window(window):
+                            return {"status": "done", "rendered": rendered}
+                        
+                        count = min(missing, batch_size, budget - rendered)
+                        lease = route.timeout + BATCH_IMAGE_SECONDS * (count - 1) + LEASE_MARGIN
+                        for _ in range(count):
+                            pacer.wait()
+                        node, slot = acquire_node(nodes, max_jobs, lease)
+                        if not node:
+                            # Daytime traffic or a dead pool - leave it for the next run
+                            return {"status": "done", "rendered": rendered}
+                        
+                        translated = translated or translate_many([profession, notes or None])
+                        started = time.monotonic()
+                        try:
+                            image_urls = _call_comfyui_batch(
+                                translated[0], gender, random.randint(*ages), translated[1], count,
+                                url=node, workflow=route.workflow, style=route.style, timeout=route.timeout,
+                            )
+                        finally:
+                            release_node(node, slot)
+                        _record_render(
+                            "comfyui",
+                            route.workflow,
+                            time.monotonic() - started,
+                            success=bool(image_urls),
+                            images=len(image_urls),
+                        )
+                        
+                        if not image_urls:
+                            failures += 1
+                            continue
+                        
+                        failures = 0
+                        for image_url in image_urls:
+                            _add_to_library(session, key, image_url, used=False)
+                        session.commit()
+                        rendered += len(image_urls)
+                        missing -= len(image_urls)
+        
+        return {"status": "done", "rendered": rendered}
+    finally:
+        release_run_lock("imagegen")
+        logger.info(f"Image pre-generation: {rendered} library variants rendered")
+
+
+@celery_app.task(ignore_result=True)
+def upload_processed_images(limit: int = 200) -> dict:
+    """
+    Publish processed images from the local cache on Yandex Disk in bulk
+    (beat, every 10 min) and repoint the vacancies using them.
+    """
+    if not settings.yandex_disk_token:
+        return {"status": "skipped"}
+    
+    with Session(sync_engine) as session:
+        uploaded = upload_pending(session, limit)
+    
+    if uploaded:
+        logger.info(f"Uploaded {uploaded} processed images to Yandex Disk")
+    return {"status": "done", "uploaded": uploaded}
+
+
+def _finish_with_image(session: Session, vacancy: Vacancy, image_url: Optional[str]) -> dict:
+    """Store the image (or the fallback) and hand the vacancy to validation."""
+    vacancy_id = vacancy.id
+    
+    if image_url:
+        # Record size/format/hash once and switch to the published copy if
+        # the same image was uploaded before
+        asset = None
+        if get_worker_settings("imagegen").get("postprocess_images", True):
+            asset = register_image(session, image_url)
+        vacancy.image_url = asset.public_url if asset and asset.public_url else image_url
+        vacancy.image_hash = asset.sha256 if asset else None
+        vacancy.status = VacancyStatus.IMAGE_GENERATED
+    else:
+        vacancy.image_url = FALLBACK_IMAGE
+        vacancy.image_hash = None
+        vacancy.status = VacancyStatus.IMAGE_GENERATED
+        logger.warning(f"Using fallback image for {vacancy_id}")
+    
+    session.commit()
+    
+    # Trigger validation (unless in step mode)
+    from services.shared.config import is_step_mode_enabled
+    if not is_step_mode_enabled():
+        from services.validation_worker.tasks import validate_vacancy_content
+        validate_vacancy_content.delay(vacancy_id)
+        logger.info(f"Image generated, triggering validation for {vacancy_id}")
+    else:
+        logger.info(f"Image generated for {vacancy_id} (step mode - stopping here)")
+    
+    return {
+        "vacancy_id": vacancy_id,
+        "image_url": vacancy.image_url,
+        "status": "success",
+    }
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# IMAGE LIBRARY
+# ═══════════════════════════════════════════════════════════════════════════
+
+def _normalize_service(service: Optional[str]) -> str:
+    """Service as a library key value (case and spacing folded)."""
+    return " ".join((service or "").split()).lower()
+
+
+def _image_context(service: Optional[str]) -> str:
+    """
+    Extra prompt context shared by every vacancy of a library key. Free-text
+    notes are left out: library images are reused across vacancies.
+    """
+    service = _normalize_service(service)
+    return f"Service context: {service}" if service else ""
+
+
+def _merge_demand(demand: list[tuple[tuple, float]]) -> list[tuple[tuple, float]]:
+    """Forecast per (profession, service) folded onto library keys, highest first."""
+    merged: dict[tuple, float] = defaultdict(float)
+    for (profession, service), expected in demand:
+        merged[(profession, _normalize_service(service))] += expected
+    return sorted(merged.items(), key=lambda item: item[1], reverse=True)
+
+
+def _plan_fill(stock: dict, variants: int, wanted: int) -> dict:
+    """Renders per key: `wanted` variants, each to the least stocked key below `variants`."""
+    planned = dict.fromkeys(stock, 0)
+    for _ in range(wanted):
+        open_cells = [cell for cell in stock if stock[cell] + planned[cell] < variants]
+        if not open_cells:
+            break
+        cell = min(open_cells, key=lambda cell: stock[cell] + planned[cell])
+        planned[cell] += 1
+    return {cell: count for cell, count in planned.items() if count}
+
+
+def _age_bucket(age: int) -> str:
+    """Library age band for an explicit age (clamped to the known bands)."""
+    for bucket, (_, high) in AGE_BUCKETS.items():
+        if age <= high:
+            return bucket
+    return list(AGE_BUCKETS)[-1]
+
+
+def _library_key(profession: str, gender: str, age_bucket: str, service: Optional[str], route: "ImageRoute") -> dict:
+    """Column values identifying interchangeable images."""
+    service = _normalize_service(service)
+    return {
+        "profession": profession,
+        "gender": gender,
+        "age_bucket": age_bucket,
+        "style": route.style,
+        "workflow": route.workflow if route.provider == "comfyui" else f"{route.provider}:{route.workflow}",
+        "context_hash": hashlib.md5(service.encode()).hexdigest() if service else "",
+    }
+
+
+def _library_filter(key: dict) -> list:
+    return [getattr(ImageLibraryItem, column) == value for column, value in key.items()]
+
+
+def _library_stock(session: Session, key: dict) -> int:
+    """Number of variants stored for a key."""
+    return session.scalar(select(func.count(ImageLibraryItem.id)).where(*_library_filter(key))) or 0
+
+
+def _take_from_library(session: Session, key: dict) -> Optional[str]:
+    """
+    Hand out the least-used variant for a key (oldest use first on ties)
+    and count the use. Rows locked by a concurrent worker are skipped.
+    """
+    item = session.scalars(
+        select(ImageLibraryItem)
+        .where(*_library_filter(key))
+        .order_by(ImageLibraryItem.use_count, ImageLibraryItem.last_used_at.nulls_first())
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    ).first()
+    
+    if not item:
+        return None
+    
+    item.use_count += 1
+    item.last_used_at = datetime.now(timezone.utc)
+    return item.image_url
+
+
+def _add_to_library(session: Session, key: dict, image_url: str, used: bool = True) -> None:
+    """Store a fresh render as a new variant (already used once unless pre-generated)."""
+    session.add(ImageLibraryItem(
+        **key,
+        image_url=image_url,
+        use_count=1 if used else 0,
+        last_used_at=datetime.now(timezone.utc) if used else None,
+    ))
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# IMAGE PROVIDER
+# ═══════════════════════════════════════════════════════════════════════════
+
+@dataclass(frozen=True)
+class ImageRoute:
+    """Resolved image backend for one render."""
+    provider: str           # comfyui / polza
+    workflow: str           # ComfyUI workflow, or the Polza model
+    style: str
+    timeout: int            # Seconds allowed for one image
+    api_key: str = ""
+    downgraded: bool = False
+    
+    @property
+    def breaker(self) -> str:
+        # Polza text generation has its own breaker
+        return "polza_image" if self.provider == "polza" else self.provider
+
+
+def _resolve_route(session: Session, worker_settings: dict) -> ImageRoute:
+    """
+    Build the route from the imagegen worker settings (admin panel).
+    The ComfyUI workflow drops to turbo_fast while the oldest vacancy
+    waiting for an image has waited longer than downgrade_after_minutes.
+    """
+    provider = worker_settings.get("provider") or "comfyui"
+    style = worker_settings.get("style", "")
+    timeout = int(worker_settings.get("timeout", 120))
+    
+    if provider == "polza":
+        return ImageRoute(
+            provider=provider,
+            workflow=worker_settings.get("polza_model", ""),
+            style=style,
+            timeout=timeout,
+            api_key=worker_settings.get("polza_api_key", ""),
+        )
+    
+    workflow = worker_settings.get("workflow") or FAST_WORKFLOW
+    threshold = int(worker_settings.get("downgrade_after_minutes", 30))
+    downgraded = False
+    if workflow != FAST_WORKFLOW and threshold > 0:
+        workflow, downgraded = choose_workflow(workflow, session.scalar(oldest_waiting_query(threshold)), threshold)
+        if downgraded:
+            logger.info(f"Image backlog older than {threshold} min, rendering with {workflow}")
+    
+    return ImageRoute(provider="comfyui", workflow=workflow, style=style, timeout=timeout, downgraded=downgraded)
+
+
+def _record_render(
+    provider: str,
+    workflow: str,
+    latency: float,
+    vacancy: Optional[Vacancy] = None,
+    success: bool = True,
+    images: int = 1,
+) -> None:
+    """Usage row and routing profile sample of one render."""
+    record_usage(UsageKind.IMAGE, provider=provider, model=workflow, latency=latency, vacancy=vacancy, success=success)
+    record_render(provider, workflow, latency, images, success)
+
+
+def _image_prompt(profession: str, gender: str, age: int, notes: Optional[str], style: str) -> str:
+    """Text-to-image prompt for providers without the ComfyUI server's templates."""
+    prompt = (
+        f"{style or 'realistic'} portrait of a friendly {age} year old {gender} working as a {profession}, "
+        f"in uniform at the workplace, looking at the camera, bright natural light, no text, no logos"
+    )
+    return f"{prompt}. {notes}" if notes else prompt
+
+
+def _call_polza(
+    profession: str,
+    gender: str,
+    age: int,
+    notes: Optional[str],
+    route: ImageRoute,
+) -> Optional[str]:
+    """Render one image with the OpenAI-compatible Polza.ai images API."""
+    if not route.api_key:
+        logger.error("Polza API key not configured")
+        return None
+    
+    breaker = get_breaker(route.breaker)
+    token = breaker.allow_request()
+    if not token:
+        logger.warning("Polza image circuit is open, skipping render")
+        return None
+    
+    started = time.monotonic()
+    try:
+        with httpx.Client(timeout=float(route.timeout)) as client:
+            response = client.post(
+                POLZA_IMAGES_URL,
+                headers={"Authorization": f"Bearer {route.api_key}"},
+                json={
+                    "model": route.workflow,
+                    "prompt": _image_prompt(profession, gender, age, notes, route.style),
+                    "n": 1,
+                },
+            )
+        response.raise_for_status()
+        data = response.json().get("data") or []
+        image_url = data[0].get("url") if data else None
+    except Exception as e:
+        logger.error(f"Polza image request failed: {e}")
+        breaker.record_failure(token)
+        return None
+    
+    if not image_url:
+        logger.error(f"Polza returned no image: {response.text[:200]}")
+        breaker.record_failure(token)
+        return None
+    
+    breaker.record_success(time.monotonic() - started, token)
+    return image_url
+
+
 # ═══════════════════════════════════════════════════════════════════════════
 # COMFYUI INTEGRATION
 # ═══════════════════════════════════════════════════════════════════════════
 
+def _node_breaker(node: str) -> CircuitBreaker:
+    """Breaker of one ComfyUI node, so a failing node does not stop renders on the others."""
+    return get_breaker(f"comfyui:{node}")
+
+
+def _routable_nodes(worker_settings: dict) -> list[str]:
+    """Configured ComfyUI nodes whose breaker is not open."""
+    return [node for node in get_nodes(worker_settings) if _node_breaker(node).get_state() != STATE_OPEN]
+
+
+def _default_node() -> str:
+    """First COMFYUI_URL node, for calls made outside the pool."""
+    return settings.comfyui_url.split(",")[0].strip().rstrip("/")
+
+
 def _call_comfyui(
     profession: str,
     gender: str,
     age: int,
-    notes: Optional[str] = None
+    notes: Optional[str] = None,
+    url: Optional[str] = None,
+    workflow: Optional[str] = None,
+    style: Optional[str] = None,
+    timeout: float = 300.0,
 ) -> Optional[str]:
     """
     Call ComfyUI API to generate an image.
     Migrated from generateImage() in avito-vacancies-v3.gs
     """
-    if not settings.comfyui_url:
+    image_urls = _call_comfyui_batch(
+        profession, gender, age, notes, 1, url=url, workflow=workflow, style=style, timeout=timeout
+    )
+    return image_urls[0] if image_urls else None
+
+
+def _call_comfyui_batch(
+    profession: str,
+    gender: str,
+    age: int,
+    notes: Optional[str] = None,
+    count: int = 1,
+    url: Optional[str] = None,
+    workflow: Optional[str] = None,
+    style: Optional[str] = None,
+    timeout: float = 300.0,
+) -> list[str]:
+    """
+    Render `count` images of one prompt in a single workflow run, so model
+    load and warm-up are paid once per batch. Returns the image URLs (fewer
+    than `count` when the server returns fewer - servers without batch
+    support answer with one image_url), empty on failure. `timeout` is the
+    budget of one image; a batch gets BATCH_IMAGE_SECONDS per extra image.
+    """
+    url = url or _default_node()
+    if not url:
         logger.error("ComfyUI URL not configured")
-        return None
+        return []
+    
+    breaker = _node_breaker(url)
+    token = breaker.allow_request()
+    if not token:
+        logger.warning("ComfyUI circuit is open, skipping render")
+        return []
     
     payload = {
         "profession": profession,
@@ -145,38 +877,158 @@ def _call_comfyui(
         "age": age,
         "notes": notes,
     }
+    _add_route_fields(payload, workflow, style)
+    if count > 1:
+        payload["batch_size"] = count
     
+    started = time.monotonic()
     try:
-        with httpx.Client(timeout=300.0) as client:  # 5 min timeout for generation
+        with httpx.Client(timeout=timeout + BATCH_IMAGE_SECONDS * (count - 1)) as client:
             response = client.post(
-                f"{settings.comfyui_url}/generate",
+                f"{url}/generate",
                 json=payload,
             )
             
             if response.status_code == 200:
                 result = response.json()
-                if result.get("success") and result.get("image_url"):
-                    return result["image_url"]
+                image_urls = result.get("image_urls") or ([result["image_url"]] if result.get("image_url") else [])
+                if result.get("success") and image_urls:
+                    breaker.record_success(time.monotonic() - started, token)
+                    report_success(url)
+                    return image_urls[:count]
                 else:
-                    logger.error(f"ComfyUI error: {result.get('error', 'Unknown error')}")
-                    return None
+                    logger.error(f"ComfyUI error on {url}: {result.get('error', 'Unknown error')}")
+                    breaker.record_failure(token)
+                    report_failure(url)
+                    return []
             else:
-                logger.error(f"ComfyUI HTTP error: {response.status_code} - {response.text}")
-                return None
+                logger.error(f"ComfyUI HTTP error on {url}: {response.status_code} - {response.text}")
+                breaker.record_failure(token)
+                report_failure(url)
+                return []
                 
     except httpx.TimeoutException:
-        logger.error("ComfyUI request timed out")
-        return None
+        logger.error(f"ComfyUI request to {url} timed out")
+        breaker.record_failure(token)
+        report_failure(url)
+        return []
     except Exception as e:
-        logger.error(f"ComfyUI request failed: {e}")
-        return None
+        logger.error(f"ComfyUI request to {url} failed: {e}")
+        breaker.record_failure(token)
+        report_failure(url)
+        return []
 
 
-def _check_comfyui_health() -> bool:
-    """Check if ComfyUI server is available."""
+def _submit_comfyui(
+    profession: str,
+    gender: str,
+    age: int,
+    notes: Optional[str] = None,
+    url: Optional[str] = None,
+    workflow: Optional[str] = None,
+    style: Optional[str] = None,
+) -> tuple[Optional[str], bool]:
+    """
+    Queue a render with POST /generate/async and return right away.
+    Returns (job_id, async_supported); job_id is None when the submission
+    failed, async_supported is False when the server only has /generate.
+    """
+    url = url or _default_node()
+    if not url:
+        logger.error("ComfyUI URL not configured")
+        return None, True
+    
+    breaker = _node_breaker(url)
+    token = breaker.allow_request()
+    if not token:
+        logger.warning("ComfyUI circuit is open, skipping render")
+        return None, True
+    
+    payload = {
+        "profession": profession,
+        "gender": gender,
+        "age": age,
+        "notes": notes,
+    }
+    _add_route_fields(payload, workflow, style)
+    # The webhook only accepts callbacks when a secret is configured
+    if settings.comfyui_callback_url and settings.comfyui_webhook_secret:
+        payload["callback_url"] = settings.comfyui_callback_url
+    
+    started = time.monotonic()
+    try:
+        with httpx.Client(timeout=15.0) as client:
+            response = client.post(f"{url}/generate/async", json=payload)
+    except Exception as e:
+        logger.error(f"ComfyUI submit to {url} failed: {e}")
+        breaker.record_failure(token)
+        report_failure(url)
+        return None, True
+    
+    if response.status_code in (404, 405):
+        breaker.release(token)
+        return None, False
+    
+    if response.status_code in (200, 202):
+        try:
+            job_id = response.json().get("job_id")
+        except ValueError:
+            job_id = None
+        if job_id:
+            breaker.record_success(time.monotonic() - started, token)
+            report_success(url)
+            return str(job_id), True
+    
+    logger.error(f"ComfyUI submit error on {url}: {response.status_code} - {response.text}")
+    breaker.record_failure(token)
+    report_failure(url)
+    return None, True
+
+
+def _add_route_fields(payload: dict, workflow: Optional[str], style: Optional[str]) -> None:
+    """Workflow and style for the ComfyUI server (omitted = server defaults)."""
+    if workflow:
+        payload["workflow"] = workflow
+    if style:
+        payload["style"] = style
+
+
+def _get_comfyui_job(job_id: str, url: Optional[str] = None) -> tuple[str, Optional[str]]:
+    """
+    Status of a submitted render: ("pending", None), ("done", image_url)
+    or ("failed", None). Network errors count as pending.
+    """
+    url = url or _default_node()
     try:
         with httpx.Client(timeout=10.0) as client:
-            response = client.get(f"{settings.comfyui_url}/health")
+            response = client.get(f"{url}/jobs/{job_id}")
+    except Exception as e:
+        logger.warning(f"ComfyUI job {job_id} status check on {url} failed: {e}")
+        report_failure(url)
+        return "pending", None
+    
+    if response.status_code == 404:
+        logger.error(f"ComfyUI job {job_id} is unknown to {url}")
+        return "failed", None
+    if response.status_code != 200:
+        return "pending", None
+    
+    result = response.json()
+    status = result.get("status")
+    if status in ("done", "completed") and result.get("image_url"):
+        return "done", result["image_url"]
+    if status in ("failed", "error", "done", "completed"):
+        logger.error(f"ComfyUI job {job_id} failed: {result.get('error', 'Unknown error')}")
+        return "failed", None
+    return "pending", None
+
+
+def _check_comfyui_health(url: Optional[str] = None) -> bool:
+    """Check if ComfyUI server is available."""
+    url = url or _default_node()
+    try:
+        with httpx.Client(timeout=5.0) as client:
+            response = client.get(f"{url}/health")
             if response.status_code == 200:
                 result = response.json()
                 return result.get("comfyui_available", False)
@@ -186,48 +1038,130 @@ def _check_comfyui_health() -> bool:
 
 
 # ═══════════════════════════════════════════════════════════════════════════
-# TRANSLATION
+# ASYNC JOB CONTEXT
 # ═══════════════════════════════════════════════════════════════════════════
 
-def _translate_to_english(text: str) -> str:
-    """
-    Translate Russian text to English using DeepSeek.
-    Migrated from translateToEnglish() in avito-vacancies-v3.gs
-    """
-    if not text or not settings.deepseek_api_key:
-        return text
+def _get_redis_client() -> redis.Redis:
+    """Get Redis client."""
+    return redis.from_url(settings.redis_url, socket_timeout=1.0, socket_connect_timeout=1.0)
+
+
+def _save_job_context(
+    job_id: str,
+    vacancy_id: str,
+    key: dict,
+    node: Optional[str] = None,
+    slot: Optional[str] = None,
+) -> None:
+    """Remember what a job renders and where, for polling, the pool and the image library."""
+    try:
+        _get_redis_client().setex(
+            f"{COMFYUI_JOB_PREFIX}{job_id}",
+            JOB_CONTEXT_TTL,
+            json.dumps({
+                "vacancy_id": vacancy_id,
+                "key": key,
+                "node": node,
+                "slot": slot,
+                "submitted_at": time.time(),
+            }),
+        )
+    except Exception as e:
+        logger.warning(f"Failed to store context of ComfyUI job {job_id}: {e}")
+
+
+def _load_job_context(job_id: str) -> Optional[dict]:
+    try:
+        raw = _get_redis_client().get(f"{COMFYUI_JOB_PREFIX}{job_id}")
+        return json.loads(raw) if raw else None
+    except Exception as e:
+        logger.warning(f"Failed to read context of ComfyUI job {job_id}: {e}")
+        return None
+
+
+def _pop_job_context(job_id: str) -> Optional[dict]:
+    try:
+        raw = _get_redis_client().getdel(f"{COMFYUI_JOB_PREFIX}{job_id}")
+        return json.loads(raw) if raw else None
+    except Exception as e:
+        logger.warning(f"Failed to read context of ComfyUI job {job_id}: {e}")
+        return None
+
+
+def _mark_job_late(job_id: str, context: dict, lease: int) -> None:
+    """Keep the context (and the pool slot) of a timed-out job for its late result."""
+    renew_node(context.get("node"), context.get("slot"), lease)
+    try:
+        _get_redis_client().setex(
+            f"{COMFYUI_JOB_PREFIX}{job_id}", JOB_CONTEXT_TTL, json.dumps({**context, "late": True})
+        )
+    except Exception as e:
+        logger.warning(f"Failed to store context of ComfyUI job {job_id}: {e}")
+
+
+def _complete_late_job(session: Session, job_id: str, image_url: Optional[str]) -> dict:
+    """Release the slot of a job that outlived its vacancy; a render is kept as library stock."""
+    context = _load_job_context(job_id) or {}
+    if not context.get("late"):
+        return {"job_id": job_id, "status": "skipped"}
     
-    prompt = f"""Translate the following text strictly to English. The text describes a job position or visual details for an image generation prompt.
-Respond ONLY with the translation, no explanations, no quotes.
+    # The webhook and the poller may both report it - only one gets the context
+    context = _pop_job_context(job_id)
+    if not context:
+        return {"job_id": job_id, "status": "skipped"}
+    
+    release_node(context.get("node"), context.get("slot"))
+    key = context.get("key")
+    if not (key and image_url):
+        return {"job_id": job_id, "status": "released"}
+    
+    _add_to_library(session, key, image_url, used=False)
+    session.commit()
+    logger.info(f"Late result of ComfyUI job {job_id} added to the image library")
+    return {"job_id": job_id, "status": "stocked", "image_url": image_url}
 
-Text to translate:
-{text}"""
 
+# ═══════════════════════════════════════════════════════════════════════════
+# BATCHED RENDERS
+# ═══════════════════════════════════════════════════════════════════════════
+
+def _join_batch(key: dict, vacancy_id: str, age: int, batch_size: int, wait: int) -> bool:
+    """
+    Park a vacancy until its library key and age band have batch_size
+    vacancies waiting or `wait` seconds have passed, then flush_image_batch
+    renders them together (with one age, so a batch never mixes bands).
+    False if Redis is unavailable (render the vacancy alone).
+    """
+    group_key = {**key, "age_bucket": _age_bucket(age)}
+    group = hashlib.md5(json.dumps(group_key, sort_keys=True).encode()).hexdigest()
+    prefix = f"{IMAGE_BATCH_PREFIX}{group}"
+    
     try:
-        with httpx.Client(timeout=30.0) as client:
-            response = client.post(
-                settings.deepseek_api_url,
-                headers={
-                    "Authorization": f"Bearer {settings.deepseek_api_key}",
-                    "Content-Type": "application/json",
-                },
-                json={
-                    "model": settings.deepseek_model,
-                    "messages": [{"role": "user", "content": prompt}],
-                    "max_tokens": 500,
-                    "temperature": 0.3,
-                },
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                translated = result["choices"][0]["message"]["content"].strip()
-                # Clean up artifacts
-                return translated.strip('"\'')
-            else:
-                logger.warning(f"Translation failed: {response.status_code}")
-                return text
-                
+        client = _get_redis_client()
+        pipe = client.pipeline()
+        pipe.rpush(prefix, vacancy_id)
+        pipe.expire(prefix, JOB_CONTEXT_TTL)
+        pipe.setex(f"{prefix}:meta", JOB_CONTEXT_TTL, json.dumps({"key": key, "age": age}))
+        waiting = pipe.execute()[0]
+        first = waiting < batch_size and client.set(f"{prefix}:timer", "1", nx=True, ex=wait)
     except Exception as e:
-        logger.warning(f"Translation error: {e}")
-        return text
+        logger.warning(f"Image batching unavailable ({e}), rendering {vacancy_id} alone")
+        return False
+    
+    if waiting >= batch_size:
+        flush_image_batch.delay(group)
+    elif first:
+        flush_image_batch.apply_async(args=[group], countdown=wait)
+    return True
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# TRANSLATION
+# ═══════════════════════════════════════════════════════════════════════════
+
+def _translate_to_english(text: str, vacancy: Optional[Vacancy] = None) -> str:
+    """
+    Translate Russian text to English (cached, see translation.py).
+    Migrated from translateToEnglish() in avito-vacancies-v3.gs
+    """
+    return translate(text, vacancy=vacancy)
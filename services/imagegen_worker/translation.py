@@ -0,0 +1,236 @@
+"""
+AdsGen 2.0 - Prompt Translation
+Russian to English translation for image prompts: static profession
+dictionary, in-process LRU and Redis cache in front of a single batched
+DeepSeek call
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import httpx
+import redis
+
+from services.shared.config import get_settings
+from services.shared.circuit_breaker import get_breaker
+from services.shared.mappings import PROFESSION_TO_ENGLISH
+from services.shared.models.usage import UsageKind
+from services.shared.usage import record_usage
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Redis key prefix and lifetime for cached translations
+TRANSLATION_PREFIX = "adsgen:translation:"
+TRANSLATION_TTL = 30 * 24 * 3600
+
+MEMORY_CACHE_SIZE = 2048
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# CACHES
+# ═══════════════════════════════════════════════════════════════════════════
+
+class _LRUCache:
+    """Small thread-safe LRU for translations made by this process."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key: str, value: str) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+_memory_cache = _LRUCache(MEMORY_CACHE_SIZE)
+
+
+def _get_redis_client() -> redis.Redis:
+    """Get Redis client."""
+    return redis.from_url(settings.redis_url, socket_timeout=1.0, socket_connect_timeout=1.0)
+
+
+def _redis_key(text: str) -> str:
+    return f"{TRANSLATION_PREFIX}{hashlib.md5(text.encode()).hexdigest()}"
+
+
+def _redis_get_many(texts: list[str]) -> list[Optional[str]]:
+    try:
+        values = _get_redis_client().mget([_redis_key(text) for text in texts])
+        return [value.decode() if value is not None else None for value in values]
+    except Exception as e:
+        logger.debug(f"Translation cache unavailable ({e})")
+        return [None] * len(texts)
+
+
+def _redis_set_many(translations: dict[str, str]) -> None:
+    try:
+        pipe = _get_redis_client().pipeline(transaction=False)
+        for text, translated in translations.items():
+            pipe.setex(_redis_key(text), TRANSLATION_TTL, translated)
+        pipe.execute()
+    except Exception as e:
+        logger.debug(f"Failed to cache translations ({e})")
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# PUBLIC API
+# ═══════════════════════════════════════════════════════════════════════════
+
+def translate(text: str, vacancy=None) -> str:
+    """Translate one string (see translate_many)."""
+    return translate_many([text], vacancy=vacancy)[0]
+
+
+def translate_many(texts: list[Optional[str]], vacancy=None) -> list[Optional[str]]:
+    """
+    Translate strings to English, in order. Empty strings and None are
+    returned unchanged. Lookups go dictionary -> process LRU -> Redis, and
+    whatever is left is translated with one LLM request. On any failure
+    the original text is returned (and not cached).
+    """
+    result: list[Optional[str]] = list(texts)
+    pending: dict[str, list[int]] = {}
+
+    for i, text in enumerate(texts):
+        if not text:
+            continue
+        known = PROFESSION_TO_ENGLISH.get(text.strip()) or _memory_cache.get(text)
+        if known:
+            result[i] = known
+        else:
+            pending.setdefault(text, []).append(i)
+
+    if pending:
+        missing = list(pending)
+        for text, cached in zip(missing, _redis_get_many(missing)):
+            if cached is not None:
+                _memory_cache.put(text, cached)
+                for i in pending.pop(text):
+                    result[i] = cached
+
+    if pending:
+        translated = _translate_with_llm(list(pending), vacancy=vacancy)
+        if translated:
+            _redis_set_many(translated)
+            for text, value in translated.items():
+                _memory_cache.put(text, value)
+                for i in pending[text]:
+                    result[i] = value
+
+    return result
+
+
+def clear_memory_cache() -> None:
+    """Forget translations cached by this process."""
+    _memory_cache.clear()
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# LLM CALL
+# ═══════════════════════════════════════════════════════════════════════════
+
+def _translate_with_llm(texts: list[str], vacancy=None) -> dict[str, str]:
+    """
+    Translate all texts in a single DeepSeek request.
+    Returns {original: translation}, empty on failure.
+    """
+    if not settings.deepseek_api_key:
+        return {}
+
+    breaker = get_breaker("deepseek")
+    token = breaker.allow_request()
+    if not token:
+        return {}
+
+    if len(texts) == 1:
+        prompt = f"""Translate the following text strictly to English. The text describes a job position or visual details for an image generation prompt.
+Respond ONLY with the translation, no explanations, no quotes.
+
+Text to translate:
+{texts[0]}"""
+    else:
+        prompt = f"""Translate each string of the following JSON array strictly to English. The strings describe job positions or visual details for an image generation prompt.
+Respond ONLY with a JSON array of the translations, in the same order, no explanations.
+
+{json.dumps(texts, ensure_ascii=False)}"""
+
+    started = time.monotonic()
+    try:
+        with httpx.Client(timeout=30.0) as client:
+            response = client.post(
+                settings.deepseek_api_url,
+                headers={
+                    "Authorization": f"Bearer {settings.deepseek_api_key}",
+                    "Content-Type": "application/json",
+                },
+                json={
+                    "model": settings.deepseek_model,
+                    "messages": [{"role": "user", "content": prompt}],
+                    "max_tokens": 500 * len(texts),
+                    "temperature": 0.3,
+                },
+            )
+
+            if response.status_code != 200:
+                logger.warning(f"Translation failed: {response.status_code}")
+                if response.status_code == 429 or response.status_code >= 500:
+                    breaker.record_failure(token)
+                return {}
+
+            breaker.record_success(time.monotonic() - started, token)
+            result = response.json()
+            record_usage(
+                UsageKind.TRANSLATION,
+                provider="deepseek",
+                latency=time.monotonic() - started,
+                vacancy=vacancy,
+                model=settings.deepseek_model,
+                usage=result.get("usage"),
+            )
+            content = result["choices"][0]["message"]["content"].strip()
+
+    except Exception as e:
+        logger.warning(f"Translation error: {e}")
+        breaker.record_failure(token)
+        return {}
+    finally:
+        # A probe answered with a 4xx recorded no outcome
+        breaker.release(token)
+
+    if len(texts) == 1:
+        # Clean up artifacts
+        return {texts[0]: content.strip('"\'')}
+
+    try:
+        translations = json.loads(content[content.index("["):content.rindex("]") + 1])
+    except ValueError:
+        logger.warning(f"Batch translation is not a JSON array: {content[:200]}")
+        return {}
+
+    if len(translations) != len(texts):
+        logger.warning(f"Batch translation returned {len(translations)} items for {len(texts)}")
+        return {}
+
+    return {text: str(value).strip() for text, value in zip(texts, translations)}
@@ -309,6 +309,7 @@ def _process_dataframe(
                     status=VacancyStatus.PENDING,
                     source_id=source_id,
                     source_row_hash=row_hash,
+                    import_batch_id=batch.id,
                 )
                 
                 session.add(vacancy)
@@ -0,0 +1,182 @@
+"""
+AdsGen 2.0 - Ad Template
+One company profile snapshot per export, with every profile-derived part of
+an <Ad> rendered once; per ad only the vacancy fields are interpolated.
+Output is identical to building each ad from the profile.
+"""
+
+import hashlib
+import html
+import json
+from typing import Optional
+
+from services.shared.avito_mappings import get_industry_for_profession, map_experience, map_schedule_to_job_type
+from services.shared.company_profile import get_profile
+from services.shared.models.vacancy import Vacancy
+
+# Bump when the rendered layout changes (profile edits change the version already)
+TEMPLATE_REVISION = 1
+
+
+def _escape_xml(text: str) -> str:
+    """Escape special XML characters."""
+    if not text:
+        return ""
+    return html.escape(str(text))
+
+
+def _options(tag: str, values: list) -> str:
+    lines = [f'\t\t<{tag}>', *(f'\t\t\t<Option>{value}</Option>' for value in values), f'\t\t</{tag}>']
+    return '\n'.join(lines)
+
+
+class AdTemplate:
+    """Prerendered <Ad> fragments for one profile snapshot."""
+
+    def __init__(self, profile: Optional[dict] = None):
+        p = dict(profile) if profile is not None else get_profile()
+        self.profile = p
+        self.version = hashlib.md5(
+            json.dumps([TEMPLATE_REVISION, p], sort_keys=True, ensure_ascii=False, default=str).encode()
+        ).hexdigest()[:16]
+
+        # Per-vacancy fallbacks
+        self.manager_name = p.get("manager_name", "")
+        self.contact_phone = p.get("contact_phone", "")
+        self.email = p.get("email", "")
+        self.company_name = p.get("company_name", "")
+        self.job_type = p.get("job_type", "Гибкий")
+        self.experience = p.get("experience", "Без опыта")
+
+        # Mapped values per distinct input (professions repeat across ads)
+        self._industries: dict[str, str] = {}
+        self._job_types: dict[str, str] = {}
+        self._experiences: dict[str, str] = {}
+
+        # Constant fragments, in feed order
+        self.head = '\n'.join([
+            f'\t\t<ListingFee>{p.get("listing_fee", "Package")}</ListingFee>',
+            '\t\t<AvitoId></AvitoId>',
+        ])
+        self.contact = '\n'.join([
+            f'\t\t<ContactMethod>{p.get("contact_method", "По телефону и в сообщениях")}</ContactMethod>',
+            '\t\t<Category>Вакансии</Category>',
+        ])
+        self.employment = f'\t\t<EmploymentType>{p.get("employment_type", "Полная")}</EmploymentType>'
+        self.working_time = '\n'.join([
+            _options("WorkingDaysPerWeek", p.get("working_days_per_week", ["3–4 дня", "5 дней", "6–7 дней"])),
+            _options("WorkingDaysPerDay", p.get("working_hours_per_day", ["8 часов", "9–10 часов", "11–12 часов"])),
+        ])
+        self.pay = '\n'.join([
+            f'\t\t<PayPeriod>{p.get("pay_period", "за смену")}</PayPeriod>',
+            f'\t\t<PayoutFrequency>{p.get("payout_frequency", "Каждый день")}</PayoutFrequency>',
+            f'\t\t<Tax>{p.get("tax", "На руки")}</Tax>',
+            _options("JobBonuses", p.get("job_bonuses", ["Униформа", "Обучение"])),
+        ])
+        self.conditions = '\n'.join([
+            _options("AgePreferences", p.get("age_preferences", ["Старше 45 лет", "Для пенсионеров"])),
+            f'\t\t<PartTimeJob>{p.get("part_time_job", "Да")}</PartTimeJob>',
+            _options("RegistrationMethod", p.get("registration_method", ["Трудовой договор"])),
+            f'\t\t<ApplyType>{p.get("apply_type", "Любые")}</ApplyType>',
+            f'\t\t<AgeCriteria>{p.get("age_criteria", "18|65")}</AgeCriteria>',
+            f'\t\t<CitizenshipCriteria>{p.get("citizenship_criteria", "Россия")}</CitizenshipCriteria>',
+            '\t\t<MedicalBook></MedicalBook>',
+            '\t\t<FoodProductionShopType></FoodProductionShopType>',
+            '\t\t<RetailEquipmentType></RetailEquipmentType>',
+            '\t\t<EateryType></EateryType>',
+            '\t\t<RetailShopType></RetailShopType>',
+            '\t\t<Cuisine></Cuisine>',
+            '\t\t<CleaningJobSiteType></CleaningJobSiteType>',
+        ])
+        self.questions = '\n'.join([
+            '\t\t<ThereIsSalary>Нет</ThereIsSalary>',
+            f'\t\t<AskAge>{p.get("ask_age", "Да")}</AskAge>',
+        ])
+        self.chat = f'\t\t<ChatQuestionnaire>{p.get("chat_questionnaire", "Проводить")}</ChatQuestionnaire>'
+        self.tail = '\n'.join([
+            f'\t\t<AskCitizenship>{p.get("ask_citizenship", "Да")}</AskCitizenship>',
+            '\t\t<AvitoStatus>Активно</AvitoStatus>',
+            f'\t\t<AIRecruter>{p.get("ai_recruter", "Нет")}</AIRecruter>',
+            '\t</Ad>',
+        ])
+
+    def _industry(self, profession: str) -> str:
+        if profession not in self._industries:
+            self._industries[profession] = _escape_xml(get_industry_for_profession(profession))
+        return self._industries[profession]
+
+    def _job_type(self, schedule: Optional[str]) -> str:
+        if not schedule:
+            return self.job_type
+        if schedule not in self._job_types:
+            self._job_types[schedule] = map_schedule_to_job_type(schedule)
+        return self._job_types[schedule]
+
+    def _experience(self, level: Optional[str]) -> str:
+        if not level:
+            return self.experience
+        if level not in self._experiences:
+            self._experiences[level] = map_experience(level)
+        return self._experiences[level]
+
+    def render(self, vacancy: Vacancy) -> str:
+        """XML of one ad."""
+        ad_xml = ['\t<Ad>', f'\t\t<Id>{_escape_xml(vacancy.id)}</Id>', self.head]
+
+        manager_name = vacancy.manager_name or self.manager_name
+        contact_phone = vacancy.manager_phone or self.contact_phone
+        ad_xml.append(f'\t\t<ManagerName>{_escape_xml(manager_name)}</ManagerName>')
+        ad_xml.append(f'\t\t<ContactPhone>{_escape_xml(contact_phone)}</ContactPhone>')
+
+        if vacancy.image_url:
+            ad_xml.append('\t\t<Images>')
+            for url in vacancy.image_url.split(' | '):
+                url = url.strip()
+                if url:
+                    ad_xml.append(f'\t\t\t<Image url="{_escape_xml(url)}"/>')
+            ad_xml.append('\t\t</Images>')
+
+        full_address = vacancy.address or vacancy.city or ""
+        ad_xml.append(f'\t\t<Address>{_escape_xml(full_address)}</Address>')
+        ad_xml.append(self.contact)
+        ad_xml.append(f'\t\t<Industry>{self._industry(vacancy.profession)}</Industry>')
+
+        title = vacancy.title or vacancy.profession or vacancy.position or ""
+        ad_xml.append(f'\t\t<Title>{_escape_xml(title)}</Title>')
+        ad_xml.append(self.employment)
+        ad_xml.append(f'\t\t<JobType>{self._job_type(vacancy.schedule)}</JobType>')
+        ad_xml.append(self.working_time)
+        ad_xml.append(f'\t\t<Experience>{self._experience(vacancy.level)}</Experience>')
+
+        if vacancy.description:
+            ad_xml.append(f'\t\t<Description>{_escape_xml(vacancy.description)}</Description>')
+
+        if vacancy.salary_min or vacancy.salary_max:
+            ad_xml.append('\t\t<SalaryRange>')
+            if vacancy.salary_min:
+                ad_xml.append(f'\t\t\t<From>{vacancy.salary_min}</From>')
+            if vacancy.salary_max:
+                ad_xml.append(f'\t\t\t<To>{vacancy.salary_max}</To>')
+            ad_xml.append('\t\t</SalaryRange>')
+
+        ad_xml.append(self.pay)
+        ad_xml.append(f'\t\t<Profession>{_escape_xml(vacancy.profession)}</Profession>')
+        ad_xml.append(self.conditions)
+
+        vacancy_code = f"{vacancy.city}_{vacancy.profession}_{vacancy.level or 'стандарт'}"
+        ad_xml.append(f'\t\t<VacancyCode>{_escape_xml(vacancy_code)}</VacancyCode>')
+        ad_xml.append(self.questions)
+
+        email = vacancy.company_email or self.email
+        ad_xml.append(f'\t\t<EMail>{_escape_xml(email)}</EMail>')
+        ad_xml.append(self.chat)
+
+        company = vacancy.company_name or self.company_name
+        ad_xml.append(f'\t\t<CompanyName>{_escape_xml(company)}</CompanyName>')
+
+        ad_xml.append('\t\t<AvitoDateEnd></AvitoDateEnd>')
+        if vacancy.salary_max:
+            ad_xml.append(f'\t\t<Price>{vacancy.salary_max}</Price>')
+        ad_xml.append(self.tail)
+
+        return '\n'.join(ad_xml)
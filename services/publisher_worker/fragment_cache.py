@@ -0,0 +1,97 @@
+"""
+AdsGen 2.0 - Ad Fragment Cache
+Rendered <Ad> XML of every vacancy kept in Redis under the template version,
+valid while the vacancy's updated_at is unchanged. An export renders only
+the ads edited since the previous one and reuses the stored XML for the rest.
+"""
+
+import logging
+from datetime import datetime
+from typing import Optional
+
+import redis
+
+from services.shared.config import get_settings
+from services.shared.models.vacancy import Vacancy
+from .ad_template import AdTemplate
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Key: prefix + template version + vacancy id; value: "<updated_at>\n<xml>"
+FRAGMENT_PREFIX = "adsgen:ad_xml:"
+
+# Fragments of ads gone from the feed or of an old template expire on their own
+FRAGMENT_TTL = 7 * 24 * 3600
+
+
+def _get_redis_client() -> redis.Redis:
+    """Get Redis client."""
+    return redis.from_url(settings.redis_url, socket_timeout=1.0, socket_connect_timeout=1.0)
+
+
+def _stamp(updated_at: Optional[datetime]) -> Optional[str]:
+    return updated_at.isoformat() if updated_at is not None else None
+
+
+class FragmentCache:
+    """
+    Cache view of one export. Without Redis every ad is rendered, as
+    without the cache.
+    """
+
+    def __init__(self, template: AdTemplate):
+        self.template = template
+        self.reused = 0
+        self.rendered = 0
+        self._client: Optional[redis.Redis] = _get_redis_client()
+
+    def _key(self, vacancy_id: str) -> str:
+        return f"{FRAGMENT_PREFIX}{self.template.version}:{vacancy_id}"
+
+    def _disable(self, error: Exception) -> None:
+        logger.warning(f"Ad fragment cache unavailable, rendering every ad ({error})")
+        self._client = None
+
+    def _fetch(self, vacancies: list[Vacancy]) -> list[Optional[bytes]]:
+        if self._client is None:
+            return [None] * len(vacancies)
+        try:
+            return self._client.mget([self._key(vacancy.id) for vacancy in vacancies])
+        except Exception as e:
+            self._disable(e)
+            return [None] * len(vacancies)
+
+    def _store(self, fragments: dict[str, str]) -> None:
+        if self._client is None or not fragments:
+            return
+        try:
+            pipe = self._client.pipeline(transaction=False)
+            for key, value in fragments.items():
+                pipe.set(key, value, ex=FRAGMENT_TTL)
+            pipe.execute()
+        except Exception as e:
+            self._disable(e)
+
+    def render_many(self, vacancies: list[Vacancy]) -> list[str]:
+        """XML of each ad, in order; one MGET and one pipelined write per call."""
+        result = []
+        fresh = {}
+        for vacancy, raw in zip(vacancies, self._fetch(vacancies)):
+            stamp = _stamp(vacancy.updated_at)
+            if raw is not None and stamp is not None:
+                cached_stamp, _, fragment = raw.decode("utf-8").partition("\n")
+                if cached_stamp == stamp:
+                    self.reused += 1
+                    result.append(fragment)
+                    continue
+
+            fragment = self.template.render(vacancy)
+            self.rendered += 1
+            if stamp is not None:
+                fresh[self._key(vacancy.id)] = f"{stamp}\n{fragment}"
+            result.append(fragment)
+
+        self._store(fresh)
+        return result
+
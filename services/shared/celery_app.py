@@ -57,6 +57,22 @@ celery_app.conf.update(
             "task": "services.publisher_worker.tasks.export_to_xml",
             "schedule": 1800.0,  # Every 30 minutes
         },
+        "comfyui-node-probe": {
+            "task": "services.imagegen_worker.tasks.probe_comfyui_nodes",
+            "schedule": 30.0,  # Every 30 seconds
+        },
+        "textgen-offpeak-pregeneration": {
+            "task": "services.textgen_worker.tasks.pregenerate_texts",
+            "schedule": 900.0,  # Every 15 minutes (no-op outside the window)
+        },
+        "imagegen-offpeak-pregeneration": {
+            "task": "services.imagegen_worker.tasks.pregenerate_images",
+            "schedule": 900.0,  # Every 15 minutes (no-op outside the window)
+        },
+        "imagegen-upload-processed": {
+            "task": "services.imagegen_worker.tasks.upload_processed_images",
+            "schedule": 600.0,  # Every 10 minutes
+        },
     },
 )
 
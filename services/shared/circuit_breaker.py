@@ -0,0 +1,279 @@
+"""
+AdsGen 2.0 - Circuit Breaker
+Per-upstream circuit breakers with shared state in Redis, so that every worker
+process stops calling a failing AI service at the same time
+"""
+
+import logging
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import redis
+
+from services.shared.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Redis key prefix for breaker state
+CIRCUIT_BREAKER_PREFIX = "adsgen:circuit:"
+
+# Breaker states
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+# allow_request() token of a call that is not the half-open probe
+ALLOWED = "allowed"
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# CONFIGURATION
+# ═══════════════════════════════════════════════════════════════════════════
+
+@dataclass(frozen=True)
+class BreakerConfig:
+    """Thresholds for a single upstream."""
+    window_seconds: int = 60          # Size of the rolling statistics window
+    min_calls: int = 5                # Calls required before the error rate is trusted
+    failure_rate: float = 0.5         # Open when failures / calls reaches this
+    slow_call_seconds: float = 30.0   # Calls slower than this count as failures
+    open_seconds: int = 30            # How long to stay open before probing
+    probe_timeout: int = 120          # Max time a half-open probe may hold the slot
+
+
+# Per-upstream overrides (anything not listed uses BreakerConfig defaults);
+# "<upstream>:<instance>" breakers, e.g. one per ComfyUI node, share the
+# thresholds of their upstream
+BREAKER_CONFIGS: Dict[str, BreakerConfig] = {
+    "deepseek": BreakerConfig(slow_call_seconds=45.0),
+    "polza": BreakerConfig(slow_call_seconds=45.0),
+    "local": BreakerConfig(slow_call_seconds=45.0),
+    "polza_image": BreakerConfig(
+        window_seconds=300,
+        min_calls=3,
+        slow_call_seconds=120.0,
+        open_seconds=120,
+    ),
+    "comfyui": BreakerConfig(
+        window_seconds=300,
+        min_calls=3,
+        slow_call_seconds=240.0,
+        open_seconds=120,
+        probe_timeout=600,
+    ),
+}
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# REDIS HELPERS
+# ═══════════════════════════════════════════════════════════════════════════
+
+def _get_redis_client() -> redis.Redis:
+    """Get Redis client."""
+    return redis.from_url(settings.redis_url, socket_timeout=1.0, socket_connect_timeout=1.0)
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# CIRCUIT BREAKER
+# ═══════════════════════════════════════════════════════════════════════════
+
+class CircuitBreaker:
+    """
+    Error-rate / latency circuit breaker backed by Redis.
+
+    Usage:
+        breaker = get_breaker("deepseek")
+        token = breaker.allow_request()
+        if not token:
+            return fallback()
+        started = time.monotonic()
+        try:
+            ...
+        except Exception:
+            breaker.record_failure(token)
+            raise
+        finally:
+            breaker.release(token)
+        breaker.record_success(time.monotonic() - started, token)
+
+    Only the caller holding the probe token ends the half-open probe; one
+    that records no outcome (e.g. a 4xx response) must release() it.
+    Outcomes are counted over a sliding window of window_seconds.
+
+    If Redis is unavailable the breaker fails open (requests are allowed),
+    matching how the rest of the shared Redis helpers degrade.
+    """
+
+    def __init__(self, name: str, config: Optional[BreakerConfig] = None):
+        self.name = name
+        self.config = config or BREAKER_CONFIGS.get(name) or BREAKER_CONFIGS.get(name.split(":", 1)[0], BreakerConfig())
+        self._state_key = f"{CIRCUIT_BREAKER_PREFIX}{name}:state"
+        self._probe_key = f"{CIRCUIT_BREAKER_PREFIX}{name}:probe"
+        # Sorted sets of call ids scored by time
+        self._calls_key = f"{CIRCUIT_BREAKER_PREFIX}{name}:stats:calls"
+        self._failures_key = f"{CIRCUIT_BREAKER_PREFIX}{name}:stats:failures"
+
+    # ─── State ────────────────────────────────────────────────────────────
+
+    def get_state(self) -> str:
+        """Return the current state (closed/open/half_open)."""
+        try:
+            r = _get_redis_client()
+            raw = r.hgetall(self._state_key)
+        except Exception as e:
+            logger.debug(f"Circuit breaker {self.name}: Redis unavailable ({e})")
+            return STATE_CLOSED
+
+        state = raw.get(b"state", b"closed").decode()
+        if state == STATE_OPEN:
+            opened_at = float(raw.get(b"opened_at", b"0"))
+            if time.time() - opened_at >= self.config.open_seconds:
+                return STATE_HALF_OPEN
+        return state
+
+    def allow_request(self) -> Optional[str]:
+        """
+        Decide whether a call to the upstream may be made right now.
+        Returns None when it may not, else the token to pass to record_*:
+        in half-open state exactly one caller wins the probe slot and gets
+        its own token, every other allowed call gets ALLOWED.
+        """
+        try:
+            r = _get_redis_client()
+            raw = r.hgetall(self._state_key)
+            state = raw.get(b"state", b"closed").decode()
+
+            if state == STATE_CLOSED:
+                return ALLOWED
+
+            opened_at = float(raw.get(b"opened_at", b"0"))
+            if time.time() - opened_at < self.config.open_seconds:
+                return None
+
+            # Open period elapsed - let a single probe through
+            token = uuid.uuid4().hex
+            if r.set(self._probe_key, token, nx=True, ex=self.config.probe_timeout):
+                r.hset(self._state_key, "state", STATE_HALF_OPEN)
+                logger.info(f"Circuit breaker {self.name}: half-open, sending probe")
+                return token
+            return None
+        except Exception as e:
+            logger.debug(f"Circuit breaker {self.name}: Redis unavailable ({e})")
+            return ALLOWED
+
+    def record_success(self, latency: float = 0.0, token: Optional[str] = None) -> None:
+        """Record a successful call. Slow calls count as failures."""
+        if latency >= self.config.slow_call_seconds:
+            logger.warning(f"Circuit breaker {self.name}: slow call ({latency:.1f}s)")
+            self.record_failure(token)
+            return
+
+        try:
+            r = _get_redis_client()
+            if self._end_probe(r, token):
+                # Probe succeeded - close the circuit and start fresh
+                pipe = r.pipeline()
+                pipe.hset(self._state_key, mapping={"state": STATE_CLOSED, "opened_at": 0})
+                pipe.delete(self._calls_key, self._failures_key)
+                pipe.execute()
+                logger.info(f"Circuit breaker {self.name}: closed")
+            self._count(r, failed=False)
+        except Exception as e:
+            logger.debug(f"Circuit breaker {self.name}: failed to record success ({e})")
+
+    def record_failure(self, token: Optional[str] = None) -> None:
+        """Record a failed call and open the circuit if thresholds are crossed."""
+        try:
+            r = _get_redis_client()
+            if self._end_probe(r, token):
+                # Probe failed - stay open for another period
+                self._open(r)
+                return
+
+            calls, failures = self._count(r, failed=True)
+            if calls >= self.config.min_calls and failures / calls >= self.config.failure_rate:
+                self._open(r)
+        except Exception as e:
+            logger.debug(f"Circuit breaker {self.name}: failed to record failure ({e})")
+
+    def release(self, token: Optional[str]) -> None:
+        """Free the probe slot of a call that recorded no outcome (no-op otherwise)."""
+        try:
+            if self._end_probe(_get_redis_client(), token):
+                logger.info(f"Circuit breaker {self.name}: probe inconclusive, next call probes")
+        except Exception as e:
+            logger.debug(f"Circuit breaker {self.name}: failed to release probe ({e})")
+
+    def reset(self) -> None:
+        """Force the breaker back to closed."""
+        try:
+            r = _get_redis_client()
+            keys = [self._state_key, self._probe_key]
+            keys.extend(r.scan_iter(f"{CIRCUIT_BREAKER_PREFIX}{self.name}:stats:*"))
+            r.delete(*keys)
+        except Exception as e:
+            logger.error(f"Circuit breaker {self.name}: reset failed ({e})")
+
+    # ─── Internals ────────────────────────────────────────────────────────
+
+    def _end_probe(self, r: redis.Redis, token: Optional[str]) -> bool:
+        """Delete the probe slot if `token` holds it; True when it did."""
+        if not token or token == ALLOWED:
+            return False
+        with r.pipeline() as pipe:
+            try:
+                pipe.watch(self._probe_key)
+                if pipe.get(self._probe_key) != token.encode():
+                    return False
+                pipe.multi()
+                pipe.delete(self._probe_key)
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                return False  # expired and taken by the next probe meanwhile
+
+    def _count(self, r: redis.Redis, failed: bool) -> tuple[int, int]:
+        """Add one outcome, returns (calls, failures) in the last window_seconds."""
+        now = time.time()
+        call_id = f"{now}:{uuid.uuid4().hex}"
+        window = self.config.window_seconds
+        pipe = r.pipeline()
+        pipe.zadd(self._calls_key, {call_id: now})
+        if failed:
+            pipe.zadd(self._failures_key, {call_id: now})
+        for key in (self._calls_key, self._failures_key):
+            pipe.zremrangebyscore(key, "-inf", now - window)
+            pipe.expire(key, window)
+        pipe.zcard(self._calls_key)
+        pipe.zcard(self._failures_key)
+        *_, calls, failures = pipe.execute()
+        return int(calls), int(failures)
+
+    def _open(self, r: redis.Redis) -> None:
+        pipe = r.pipeline()
+        pipe.hset(self._state_key, mapping={"state": STATE_OPEN, "opened_at": time.time()})
+        pipe.delete(self._probe_key)
+        pipe.delete(self._calls_key, self._failures_key)
+        pipe.execute()
+        logger.warning(
+            f"Circuit breaker {self.name}: OPEN for {self.config.open_seconds}s, "
+            f"requests will short-circuit to fallback"
+        )
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Get (or create) the process-wide breaker for an upstream."""
+    if name not in _breakers:
+        _breakers[name] = CircuitBreaker(name)
+    return _breakers[name]
+
+
+def get_all_breaker_states() -> Dict[str, str]:
+    """Current state of every configured breaker (for the admin panel)."""
+    return {name: get_breaker(name).get_state() for name in BREAKER_CONFIGS}
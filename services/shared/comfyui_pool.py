@@ -0,0 +1,188 @@
+"""
+AdsGen 2.0 - ComfyUI Node Pool
+Spreads renders across several ComfyUI servers: least outstanding jobs
+first, a per-node concurrency cap, and nodes ejected while they fail.
+State lives in Redis so every imagegen worker sees the same pool
+"""
+
+import logging
+import random
+import time
+import uuid
+from typing import Optional
+
+import redis
+
+from services.shared.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Redis key prefix for pool state
+POOL_PREFIX = "adsgen:comfyui_pool:"
+
+# Consecutive request failures before a node is taken out of rotation
+# (it comes back after the next successful health probe)
+EJECT_AFTER_FAILURES = 3
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# REDIS HELPERS
+# ═══════════════════════════════════════════════════════════════════════════
+
+def _get_redis_client() -> redis.Redis:
+    """Get Redis client."""
+    return redis.from_url(settings.redis_url, socket_timeout=1.0, socket_connect_timeout=1.0)
+
+
+def _jobs_key(node: str) -> str:
+    """Sorted set of in-flight slots of a node, scored by lease expiry."""
+    return f"{POOL_PREFIX}jobs:{node}"
+
+
+_DOWN_KEY = f"{POOL_PREFIX}down"          # node -> time it was ejected
+_FAILURES_KEY = f"{POOL_PREFIX}failures"  # node -> consecutive failures
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# PUBLIC API
+# ═══════════════════════════════════════════════════════════════════════════
+
+def get_nodes(worker_settings: Optional[dict] = None) -> list[str]:
+    """
+    Configured ComfyUI base URLs. The imagegen `comfyui_url` setting wins
+    over COMFYUI_URL; both take a comma-separated list.
+    """
+    raw = (worker_settings or {}).get("comfyui_url") or settings.comfyui_url
+    return [url.strip().rstrip("/") for url in raw.split(",") if url.strip()]
+
+
+def acquire_node(nodes: list[str], max_jobs: int, lease: int) -> tuple[Optional[str], Optional[str]]:
+    """
+    Reserve a render slot on the healthy node with the fewest jobs in
+    flight. Returns (node, slot); (None, None) when every healthy node is
+    at max_jobs. Slots expire after `lease` seconds so a crashed worker
+    cannot pin a node. Without Redis a random node is returned unmetered.
+    """
+    if not nodes:
+        return None, None
+
+    slot = uuid.uuid4().hex
+    try:
+        r = _get_redis_client()
+        now = time.time()
+
+        down = {node.decode() for node in r.hkeys(_DOWN_KEY)}
+        candidates = [node for node in nodes if node not in down]
+        random.shuffle(candidates)  # spread ties
+
+        pipe = r.pipeline(transaction=False)
+        for node in candidates:
+            pipe.zremrangebyscore(_jobs_key(node), "-inf", now)
+            pipe.zcard(_jobs_key(node))
+        loads = pipe.execute()[1::2]
+
+        for load, node in sorted(zip(loads, candidates), key=lambda item: item[0]):
+            if load >= max_jobs:
+                break
+            # Optimistic reserve: back off if another worker got there first
+            r.zadd(_jobs_key(node), {slot: now + lease})
+            if r.zcard(_jobs_key(node)) <= max_jobs:
+                return node, slot
+            r.zrem(_jobs_key(node), slot)
+        return None, None
+    except Exception as e:
+        logger.warning(f"ComfyUI pool unavailable, picking a node at random ({e})")
+        return random.choice(nodes), None
+
+
+def release_node(node: Optional[str], slot: Optional[str]) -> None:
+    """Give a slot back."""
+    if not node or not slot:
+        return
+    try:
+        _get_redis_client().zrem(_jobs_key(node), slot)
+    except Exception as e:
+        logger.warning(f"Failed to release ComfyUI slot on {node}: {e}")
+
+
+def renew_node(node: Optional[str], slot: Optional[str], lease: int) -> None:
+    """Keep a slot reserved for `lease` more seconds (a job still running on the node)."""
+    if not node or not slot:
+        return
+    try:
+        _get_redis_client().zadd(_jobs_key(node), {slot: time.time() + lease}, xx=True)
+    except Exception as e:
+        logger.warning(f"Failed to renew ComfyUI slot on {node}: {e}")
+
+
+def has_healthy_node(nodes: list[str]) -> bool:
+    """Whether any node is in rotation (False means rendering is pointless)."""
+    try:
+        down = {node.decode() for node in _get_redis_client().hkeys(_DOWN_KEY)}
+    except Exception:
+        return bool(nodes)
+    return any(node not in down for node in nodes)
+
+
+def report_success(node: str) -> None:
+    """A request to the node worked - reset its failure streak."""
+    try:
+        _get_redis_client().hdel(_FAILURES_KEY, node)
+    except Exception as e:
+        logger.debug(f"Failed to record ComfyUI success for {node} ({e})")
+
+
+def report_failure(node: str) -> None:
+    """A request to the node failed - eject it after EJECT_AFTER_FAILURES in a row."""
+    try:
+        r = _get_redis_client()
+        failures = r.hincrby(_FAILURES_KEY, node, 1)
+        if failures >= EJECT_AFTER_FAILURES and r.hsetnx(_DOWN_KEY, node, time.time()):
+            logger.warning(f"ComfyUI node {node} ejected after {failures} failures")
+    except Exception as e:
+        logger.debug(f"Failed to record ComfyUI failure for {node} ({e})")
+
+
+def mark_health(node: str, healthy: bool) -> None:
+    """Apply a health probe result: eject a dead node, readmit a recovered one."""
+    try:
+        r = _get_redis_client()
+        if healthy:
+            pipe = r.pipeline()
+            pipe.hdel(_DOWN_KEY, node)
+            pipe.hdel(_FAILURES_KEY, node)
+            readmitted, _ = pipe.execute()
+            if readmitted:
+                logger.info(f"ComfyUI node {node} back in rotation")
+        elif r.hsetnx(_DOWN_KEY, node, time.time()):
+            logger.warning(f"ComfyUI node {node} failed its health probe, ejected")
+    except Exception as e:
+        logger.warning(f"Failed to store ComfyUI health for {node}: {e}")
+
+
+def get_pool_status(nodes: list[str]) -> list[dict]:
+    """Per-node health and load (for the admin panel)."""
+    try:
+        r = _get_redis_client()
+        now = time.time()
+        down = {k.decode(): float(v) for k, v in r.hgetall(_DOWN_KEY).items()}
+        failures = {k.decode(): int(v) for k, v in r.hgetall(_FAILURES_KEY).items()}
+        pipe = r.pipeline(transaction=False)
+        for node in nodes:
+            pipe.zcount(_jobs_key(node), now, "+inf")
+        in_flight = pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to read ComfyUI pool state: {e}")
+        return [{"url": node, "healthy": None, "in_flight": None, "failures": None} for node in nodes]
+
+    return [
+        {
+            "url": node,
+            "healthy": node not in down,
+            "down_since": down.get(node),
+            "in_flight": jobs,
+            "failures": failures.get(node, 0),
+        }
+        for node, jobs in zip(nodes, in_flight)
+    ]
@@ -23,11 +23,17 @@ class Settings(BaseSettings):
     
     # ComfyUI (Image Generation)
     comfyui_url: str = "http://localhost:8188"
+    comfyui_callback_url: str = ""  # e.g. http://api:8000/webhooks/comfyui, empty = polling only
+    comfyui_webhook_secret: str = ""  # empty = /webhooks/comfyui disabled
+    comfyui_image_hosts: str = ""  # hosts a webhook image_url may point at (comma-separated), empty = any
     
     # Yandex Disk
     yandex_disk_token: str = ""
     yandex_disk_folder: str = "Картинки_Авито"
     
+    # Processed images waiting for (and kept after) the bulk upload
+    image_cache_dir: str = "data/images"
+    
     # Google Sheets
     google_credentials_json: str = ""
     
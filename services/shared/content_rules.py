@@ -0,0 +1,190 @@
+"""
+AdsGen 2.0 - Content Rules
+Avito content rules (title, description, stop words, image size) shared
+by the generation workers, which check their output inline, and the
+validation worker
+"""
+
+import re
+from typing import Optional
+
+from services.shared.html_validator import HtmlCheck, check_html
+from services.shared.stop_words import get_matcher
+
+# ═══════════════════════════════════════════════════════════════════════════
+# AVITO RULES & STOP WORDS
+# ═══════════════════════════════════════════════════════════════════════════
+
+# Phrases that are prohibited in Avito ads (matched on whole words in any
+# inflected form, quoted ones in that exact form; more can be added at
+# runtime, see shared.stop_words)
+STOP_WORDS = [
+    # Discrimination
+    "только мужчины",
+    "только женщины",
+    "славянская внешность",
+    "без вредных привычек",
+    '"молодых"',
+    "до 35 лет",
+    "граждане рф",
+
+    # Health discrimination (must not require health certificates in ads)
+    "медицинская справка",
+    "хорошее здоровье",
+    "крепкое здоровье",
+    "физически здоровым",
+    "отсутствие инвалидности",
+
+    # Prohibited content
+    "гарантированный заработок",
+    "пассивный доход",
+    "без вложений",
+    "легкие деньги",
+    "высокий доход без опыта",
+
+    # Contact info in title (should be in dedicated fields)
+    "телефон",
+    "звоните",
+    "пишите в",
+    "whatsapp",
+    "telegram",
+    "viber",
+]
+
+# Maximum lengths
+MAX_TITLE_LENGTH = 50
+MIN_TITLE_LENGTH = 10
+MIN_DESCRIPTION_LENGTH = 300
+MAX_DESCRIPTION_LENGTH = 10000
+
+# Images: Avito's recommended size (larger renders are scaled down to fit)
+# and the smallest side it accepts
+IMAGE_MAX_SIZE = (1280, 960)
+IMAGE_MIN_SIDE = 400
+IMAGE_MIME_TYPES = ("image/jpeg", "image/png")
+
+# Salary information is not allowed in titles
+SALARY_PATTERNS = [
+    r'\d+\s*(?:руб|₽|р\.)',
+    r'от\s+\d+',
+    r'до\s+\d+\s*(?:руб|₽)',
+    r'зарплата',
+    r'оклад',
+    r'выплат',
+]
+
+# One precompiled alternation: a single scan of the title for all patterns
+SALARY_RE = re.compile("|".join(SALARY_PATTERNS), re.IGNORECASE)
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# RULE CHECKS
+# ═══════════════════════════════════════════════════════════════════════════
+
+def title_length_errors(title: Optional[str]) -> list[str]:
+    """Title presence and length."""
+    if not title:
+        return ["Title is missing"]
+
+    errors = []
+    if len(title) > MAX_TITLE_LENGTH:
+        errors.append(f"Title too long: {len(title)} chars (max {MAX_TITLE_LENGTH})")
+
+    if len(title) < MIN_TITLE_LENGTH:
+        errors.append(f"Title too short (min {MIN_TITLE_LENGTH} characters)")
+
+    return errors
+
+
+def title_salary_errors(title: Optional[str]) -> list[str]:
+    if title and SALARY_RE.search(title):
+        return ["Title should not contain salary information"]
+    return []
+
+
+def title_pipe_errors(title: Optional[str]) -> list[str]:
+    if title and "|" in title:
+        return ["Title contains prohibited character '|'"]
+    return []
+
+
+def validate_title(title: Optional[str]) -> list[str]:
+    """Validate ad title."""
+    if not title:
+        return ["Title is missing"]
+
+    return [*title_length_errors(title), *title_salary_errors(title), *title_pipe_errors(title)]
+
+
+def description_length_errors(description: Optional[str], markup: HtmlCheck) -> list[str]:
+    """Description presence and length of its text without markup."""
+    if not description:
+        return ["Description is missing"]
+
+    errors = []
+    if markup.text_length < MIN_DESCRIPTION_LENGTH:
+        errors.append(f"Description too short: {markup.text_length} chars (min {MIN_DESCRIPTION_LENGTH})")
+
+    if markup.text_length > MAX_DESCRIPTION_LENGTH:
+        errors.append(f"Description too long: {markup.text_length} chars (max {MAX_DESCRIPTION_LENGTH})")
+
+    return errors
+
+
+def description_pipe_warnings(description: Optional[str]) -> list[str]:
+    if description and "|" in description:
+        return ["Description contains '|' character - may cause issues"]
+    return []
+
+
+def validate_description(description: Optional[str]) -> tuple[list[str], list[str]]:
+    """Validate ad description. Returns (errors, warnings)."""
+    if not description:
+        return ["Description is missing"], []
+
+    # Markup and visible text in one pass; only the tags Avito renders,
+    # properly nested (see repair_html)
+    markup = check_html(description)
+    errors = [*description_length_errors(description, markup), *markup.errors]
+
+    return errors, description_pipe_warnings(description)
+
+
+def find_stop_words(text: Optional[str]) -> list[str]:
+    """
+    Stop phrases contained in a single text, matched on whole words in any
+    inflected form (see shared.stop_words; includes the phrases added in Redis).
+    """
+    return get_matcher().find(text)
+
+
+def check_stop_words(title: Optional[str], description: Optional[str]) -> list[str]:
+    """Check title and description for prohibited stop words."""
+    found = dict.fromkeys([*find_stop_words(title), *find_stop_words(description)])
+    return [f"Contains prohibited phrase: '{word}'" for word in found]
+
+
+def validate_text(
+    title: Optional[str],
+    description: Optional[str],
+    config: Optional[dict[str, str]] = None,
+) -> dict[str, list[str]]:
+    """
+    Run the text rules and group the errors by the field that has to change.
+    Returns {"title": [...], "description": [...]} with only failing fields,
+    so a caller can regenerate just the offending part. Rule severities come
+    from the validation settings (see shared.validation_rules): rules set to
+    "warning" or "off" do not fail the text.
+    """
+    from services.shared.validation_rules import text_errors
+    return text_errors(title, description, config)
+
+
+def validate_image_metadata(width: int, height: int, mime: str) -> list[str]:
+    """Validate recorded image properties (no download needed)."""
+    errors = []
+    if mime not in IMAGE_MIME_TYPES:
+        errors.append(f"Unsupported image format: {mime}")
+    if min(width, height) < IMAGE_MIN_SIDE:
+        errors.append(f"Image too small: {width}x{height} (min side {IMAGE_MIN_SIDE}px)")
+    return errors
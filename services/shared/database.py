@@ -73,6 +73,9 @@ async def init_db():
     # items are imported locally to avoid circular imports
     from .models.vacancy import Vacancy
     from .models.import_batch import ImportBatch
+    from .models.usage import GenerationUsage
+    from .models.image_library import ImageLibraryItem
+    from .models.image_asset import ImageAsset
 
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
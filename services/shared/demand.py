@@ -0,0 +1,125 @@
+"""
+AdsGen 2.0 - Demand Forecast
+Expected near-term generation demand per key (pending backlog plus the
+recent daily import rate) and the off-peak window / pacing helpers used by
+the pre-generation jobs
+"""
+
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+import redis
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from services.shared.config import get_settings
+from services.shared.models.vacancy import Vacancy, VacancyStatus
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Redis key prefix for pre-generation run locks
+PREGEN_LOCK_PREFIX = "adsgen:pregen_lock:"
+
+# Days of import history behind the daily import rate
+FORECAST_DAYS = 7
+
+# Schedules are written in business time (same as the Celery timezone)
+LOCAL_TZ = ZoneInfo("Europe/Moscow")
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# FORECAST
+# ═══════════════════════════════════════════════════════════════════════════
+
+def forecast_demand(session: Session, columns: list, days: int = FORECAST_DAYS) -> list[tuple[tuple, float]]:
+    """
+    Vacancies expected to need generation over the next day, grouped by
+    `columns` (Vacancy attributes): everything still PENDING plus the
+    average number imported per day over the last `days` days (recent
+    imports still PENDING are counted once, as backlog).
+    Returns [(key values, expected count)], highest demand first.
+    """
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    demand: dict[tuple, float] = defaultdict(float)
+
+    pending = session.execute(
+        select(*columns, func.count())
+        .where(Vacancy.status == VacancyStatus.PENDING)
+        .group_by(*columns)
+    )
+    for *key, count in pending:
+        demand[tuple(key)] += count
+
+    recent = session.execute(
+        select(*columns, func.count())
+        .where(Vacancy.created_at >= since, Vacancy.status != VacancyStatus.PENDING)
+        .group_by(*columns)
+    )
+    for *key, count in recent:
+        demand[tuple(key)] += count / days
+
+    return sorted(demand.items(), key=lambda item: item[1], reverse=True)
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# SCHEDULING
+# ═══════════════════════════════════════════════════════════════════════════
+
+def in_window(window: str, now: Optional[datetime] = None) -> bool:
+    """
+    Whether `now` falls into an "HH:MM-HH:MM" window (local time).
+    Windows may wrap midnight ("22:00-06:00"); an empty or malformed
+    window never matches.
+    """
+    try:
+        start, end = (
+            datetime.strptime(part.strip(), "%H:%M").time()
+            for part in window.split("-")
+        )
+    except (AttributeError, ValueError):
+        return False
+
+    current = (now or datetime.now(timezone.utc)).astimezone(LOCAL_TZ).time()
+    if start <= end:
+        return start <= current < end
+    return current >= start or current < end
+
+
+class RatePacer:
+    """Spaces calls to at most `per_minute` per minute (blocking)."""
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next = 0.0
+
+    def wait(self) -> None:
+        now = time.monotonic()
+        if now < self._next:
+            time.sleep(self._next - now)
+        self._next = max(now, self._next) + self.interval
+
+
+def _get_redis_client() -> redis.Redis:
+    """Get Redis client."""
+    return redis.from_url(settings.redis_url, socket_timeout=1.0, socket_connect_timeout=1.0)
+
+
+def acquire_run_lock(name: str, ttl: int) -> bool:
+    """Keep overlapping beat runs of one job apart (expires after ttl)."""
+    try:
+        return bool(_get_redis_client().set(f"{PREGEN_LOCK_PREFIX}{name}", "1", nx=True, ex=ttl))
+    except Exception as e:
+        logger.warning(f"Pre-generation lock unavailable ({e}), running anyway")
+        return True
+
+
+def release_run_lock(name: str) -> None:
+    try:
+        _get_redis_client().delete(f"{PREGEN_LOCK_PREFIX}{name}")
+    except Exception as e:
+        logger.debug(f"Failed to release pre-generation lock {name} ({e})")
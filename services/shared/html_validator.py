@@ -0,0 +1,202 @@
+"""
+AdsGen 2.0 - HTML Validator
+Single-pass check of description markup against the subset Avito renders
+(allowed tags, no attributes, proper nesting), measuring the visible text
+on the way, plus a repair mode that rewrites the usual LLM slips (headings,
+<b>/<i>, unclosed or stray tags, markdown bold) without a new generation
+"""
+
+import html
+import re
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from typing import Optional
+
+# Tags Avito accepts in a description
+ALLOWED_TAGS = frozenset({"p", "br", "strong", "em", "ul", "ol", "li"})
+VOID_TAGS = frozenset({"br"})
+LIST_TAGS = frozenset({"ul", "ol"})
+BLOCK_TAGS = frozenset({"p", "ul", "ol", "li"})
+INLINE_TAGS = frozenset({"strong", "em"})
+
+# Repair: what a disallowed tag becomes (missing = dropped, text kept)
+TAG_REPLACEMENTS = {
+    "b": ("strong",),
+    "i": ("em",),
+    "div": ("p",),
+    "h1": ("p", "strong"),
+    "h2": ("p", "strong"),
+    "h3": ("p", "strong"),
+    "h4": ("p", "strong"),
+    "h5": ("p", "strong"),
+    "h6": ("p", "strong"),
+}
+
+_MARKDOWN_BOLD_RE = re.compile(r"\*\*(.+?)\*\*")
+
+
+@dataclass
+class HtmlCheck:
+    """Outcome of one pass over a description."""
+    errors: list[str] = field(default_factory=list)
+    text_length: int = 0
+    html: Optional[str] = None  # repaired markup (repair mode only)
+
+
+@dataclass
+class _Open:
+    source: Optional[str]      # tag as written (None = opened by repair)
+    emitted: tuple[str, ...]   # allowed tags it stands for
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# SCANNER
+# ═══════════════════════════════════════════════════════════════════════════
+
+class _Scanner(HTMLParser):
+    """Streaming tokenizer keeping a stack of open elements."""
+
+    def __init__(self, repair: bool):
+        super().__init__(convert_charrefs=True)
+        self.repair = repair
+        self.errors: dict[str, None] = {}
+        self.stack: list[_Open] = []
+        self.text: list[str] = []
+        self.out: list[str] = []
+
+    # ── helpers ──────────────────────────────────────────────────────────
+
+    def _error(self, message: str) -> None:
+        self.errors.setdefault(message)
+
+    def _top_index(self) -> int:
+        """Position of the innermost element that produced markup (-1 if none)."""
+        for index in range(len(self.stack) - 1, -1, -1):
+            if self.stack[index].emitted:
+                return index
+        return -1
+
+    def _top(self) -> Optional[str]:
+        index = self._top_index()
+        return self.stack[index].emitted[-1] if index >= 0 else None
+
+    def _in_implicit_list(self) -> bool:
+        index = self._top_index()
+        return index >= 0 and self.stack[index].source is None
+
+    def _close(self, entry: _Open) -> None:
+        self.out.extend(f"</{tag}>" for tag in reversed(entry.emitted))
+
+    def _pop_until(self, index: int, report: bool = True) -> None:
+        """Close every element above `index` (implicitly closed in the source)."""
+        while len(self.stack) > index:
+            entry = self.stack.pop()
+            if report and entry.source:
+                self._error(f"Tag <{entry.source}> is not closed")
+            self._close(entry)
+
+    def _open_block(self, tag: str) -> None:
+        """Close what may not contain a block, as browsers would."""
+        while self.stack:
+            top = self._top()
+            if top in INLINE_TAGS or top == "p" or (top == "li" and tag == "li"):
+                self._pop_until(self._top_index())
+            elif tag != "li" and self._in_implicit_list():
+                self._pop_until(self._top_index(), report=False)
+            else:
+                break
+
+        if tag == "li" and self._top() not in LIST_TAGS:
+            self._error("<li> outside of a list")
+            self.stack.append(_Open(None, ("ul",)))
+            self.out.append("<ul>")
+
+    # ── tokenizer callbacks ──────────────────────────────────────────────
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        self.text.append(" ")
+        if tag in ALLOWED_TAGS:
+            emitted = (tag,)
+            for name, _ in attrs:
+                self._error(f"Attribute '{name}' is not allowed on <{tag}>")
+        else:
+            self._error(f"Tag <{tag}> is not allowed")
+            emitted = TAG_REPLACEMENTS.get(tag, ())
+
+        if emitted and emitted[0] in BLOCK_TAGS:
+            self._open_block(emitted[0])
+        elif emitted and self._in_implicit_list():
+            self._pop_until(self._top_index(), report=False)
+
+        self.out.extend(f"<{t}>" for t in emitted)
+        if tag not in VOID_TAGS:
+            self.stack.append(_Open(tag, emitted))
+
+    def handle_startendtag(self, tag: str, attrs: list) -> None:
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and self.stack and self.stack[-1].source == tag:
+            self._close(self.stack.pop())
+
+    def handle_endtag(self, tag: str) -> None:
+        self.text.append(" ")
+        for index in range(len(self.stack) - 1, -1, -1):
+            if self.stack[index].source == tag:
+                self._pop_until(index + 1)
+                self._close(self.stack.pop())
+                return
+        self._error(f"Unexpected closing tag </{tag}>")
+
+    def handle_data(self, data: str) -> None:
+        if data.strip() and self._in_implicit_list():
+            self._pop_until(self._top_index(), report=False)
+
+        escaped = html.escape(data, quote=False)
+        if "**" in data and _MARKDOWN_BOLD_RE.search(data):
+            self._error("Markdown bold ('**') is not rendered, use <strong>")
+            self.text.append(data.replace("**", ""))
+            escaped = _MARKDOWN_BOLD_RE.sub(r"<strong>\1</strong>", escaped)
+        else:
+            self.text.append(data)
+        self.out.append(escaped)
+
+    def handle_comment(self, data: str) -> None:
+        self._error("HTML comments are not allowed")
+
+    def handle_decl(self, decl: str) -> None:
+        self._error("Markup declarations are not allowed")
+
+    def finish(self) -> HtmlCheck:
+        self.close()
+        self._pop_until(0)
+        return HtmlCheck(
+            errors=list(self.errors),
+            text_length=len(" ".join("".join(self.text).split())),
+            html="".join(self.out) if self.repair else None,
+        )
+
+
+def _scan(markup: str, repair: bool) -> HtmlCheck:
+    scanner = _Scanner(repair)
+    scanner.feed(markup)
+    return scanner.finish()
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# PUBLIC API
+# ═══════════════════════════════════════════════════════════════════════════
+
+def check_html(markup: Optional[str]) -> HtmlCheck:
+    """Markup errors and visible text length of a description."""
+    return _scan(markup or "", repair=False)
+
+
+def repair_html(markup: Optional[str]) -> Optional[str]:
+    """
+    Description rewritten into allowed, well-nested markup. Valid input is
+    returned unchanged; text is never dropped, only tags are mapped,
+    closed or removed.
+    """
+    if not markup:
+        return markup
+    result = _scan(markup, repair=True)
+    return result.html if result.errors else markup
@@ -0,0 +1,159 @@
+"""
+AdsGen 2.0 - Image Routing
+Rolling latency/throughput profiles per image provider and workflow, and the
+backlog rule that trades quality for throughput (downgrade to turbo_fast)
+"""
+
+import json
+import logging
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import redis
+from sqlalchemy import Select, func, select
+
+from services.shared.config import get_settings
+from services.shared.models.vacancy import Vacancy, VacancyStatus
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Redis key prefix for the per provider/workflow sample lists
+PROFILE_PREFIX = "adsgen:render_profile:"
+
+# Renders kept per profile (rolling window) and idle lifetime of a profile
+PROFILE_SAMPLES = 200
+PROFILE_TTL = 7 * 24 * 3600
+
+# Cheapest ComfyUI workflow, used while the backlog is too old
+FAST_WORKFLOW = "turbo_fast"
+
+# Vacancies waiting for an image
+IMAGE_BACKLOG_STATUSES = (VacancyStatus.TEXT_GENERATED, VacancyStatus.IMAGE_GENERATING)
+
+# Rows unchanged this long are stuck (crashed worker, lost webhook, parked in
+# step mode) rather than waiting; never less than twice the downgrade threshold
+STALE_BACKLOG_MINUTES = 180
+
+
+def _get_redis_client() -> redis.Redis:
+    """Get Redis client."""
+    return redis.from_url(settings.redis_url, socket_timeout=1.0, socket_connect_timeout=1.0)
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# PROFILES
+# ═══════════════════════════════════════════════════════════════════════════
+
+def record_render(provider: str, workflow: str, latency: float, images: int = 1, success: bool = True) -> None:
+    """Add one render (a whole batch counts once) to its provider/workflow profile."""
+    key = f"{PROFILE_PREFIX}{provider}:{workflow}"
+    sample = json.dumps([round(time.time()), round(latency, 3), images if success else 0, success])
+    try:
+        pipe = _get_redis_client().pipeline()
+        pipe.lpush(key, sample)
+        pipe.ltrim(key, 0, PROFILE_SAMPLES - 1)
+        pipe.expire(key, PROFILE_TTL)
+        pipe.execute()
+    except Exception as e:
+        logger.debug(f"Failed to record render profile for {provider}/{workflow}: {e}")
+
+
+def _summarize(provider: str, workflow: str, raw_samples: list) -> dict:
+    samples = [json.loads(raw) for raw in raw_samples]
+    latencies = sorted(latency for _, latency, _, success in samples if success)
+    busy = sum(latency for _, latency, _, _ in samples)
+    images = sum(count for _, _, count, _ in samples)
+
+    return {
+        "provider": provider,
+        "workflow": workflow,
+        "renders": len(samples),
+        "success_rate": round(sum(1 for *_, success in samples if success) / len(samples), 3) if samples else None,
+        "p50_seconds": round(statistics.median(latencies), 1) if latencies else None,
+        "p95_seconds": round(latencies[int(0.95 * (len(latencies) - 1))], 1) if latencies else None,
+        # Per node slot: images produced per minute of render time
+        "images_per_minute": round(images / busy * 60, 2) if busy else None,
+        "last_render_at": datetime.fromtimestamp(samples[0][0], timezone.utc).isoformat() if samples else None,
+    }
+
+
+def get_profile(provider: str, workflow: str) -> dict:
+    """Rolling statistics of the last PROFILE_SAMPLES renders of a provider/workflow."""
+    try:
+        raw_samples = _get_redis_client().lrange(f"{PROFILE_PREFIX}{provider}:{workflow}", 0, -1)
+    except Exception as e:
+        logger.warning(f"Render profiles unavailable: {e}")
+        raw_samples = []
+    return _summarize(provider, workflow, raw_samples)
+
+
+def get_all_profiles() -> list[dict]:
+    """Profiles of every provider/workflow rendered within PROFILE_TTL."""
+    try:
+        client = _get_redis_client()
+        keys = sorted(key.decode() for key in client.scan_iter(f"{PROFILE_PREFIX}*"))
+        pipe = client.pipeline()
+        for key in keys:
+            pipe.lrange(key, 0, -1)
+        samples = pipe.execute()
+    except Exception as e:
+        logger.warning(f"Render profiles unavailable: {e}")
+        return []
+
+    profiles = []
+    for key, raw_samples in zip(keys, samples):
+        provider, workflow = key[len(PROFILE_PREFIX):].split(":", 1)
+        profiles.append(_summarize(provider, workflow, raw_samples))
+    return profiles
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# DOWNGRADE
+# ═══════════════════════════════════════════════════════════════════════════
+
+def oldest_waiting_query(
+    downgrade_after_minutes: int,
+    step_mode: Optional[bool] = None,
+    now: Optional[datetime] = None,
+) -> Select:
+    """
+    Last status change of the longest-waiting vacancy with a render queued or
+    in flight (sync or async session). TEXT_GENERATED rows count only outside
+    step mode, where text generation queues their render; rows untouched for
+    STALE_BACKLOG_MINUTES (or twice the threshold) are left out.
+    """
+    if step_mode is None:
+        from services.shared.config import is_step_mode_enabled
+        step_mode = is_step_mode_enabled()
+    statuses = (VacancyStatus.IMAGE_GENERATING,) if step_mode else IMAGE_BACKLOG_STATUSES
+    stale_minutes = max(STALE_BACKLOG_MINUTES, 2 * downgrade_after_minutes)
+    cutoff = (now or datetime.now(timezone.utc)) - timedelta(minutes=stale_minutes)
+    return select(func.min(Vacancy.updated_at)).where(
+        Vacancy.status.in_(statuses),
+        Vacancy.updated_at >= cutoff,
+    )
+
+
+def choose_workflow(
+    workflow: str,
+    oldest_waiting: Optional[datetime],
+    downgrade_after_minutes: int,
+    now: Optional[datetime] = None,
+) -> tuple[str, bool]:
+    """
+    Workflow to render with: the configured one, or FAST_WORKFLOW while the
+    oldest vacancy has waited for its image longer than
+    downgrade_after_minutes (0 disables). Returns (workflow, downgraded).
+    """
+    if workflow == FAST_WORKFLOW or downgrade_after_minutes <= 0 or oldest_waiting is None:
+        return workflow, False
+
+    if oldest_waiting.tzinfo is None:
+        oldest_waiting = oldest_waiting.replace(tzinfo=timezone.utc)
+    waited = (now or datetime.now(timezone.utc)) - oldest_waiting
+    if waited.total_seconds() > downgrade_after_minutes * 60:
+        return FAST_WORKFLOW, True
+    return workflow, False
@@ -30,6 +30,22 @@ POSITION_TO_PROFESSION = {
     "Прессовщик": "Прессовщик",
 }
 
+# Английские названия профессий для промптов генерации картинок
+PROFESSION_TO_ENGLISH = {
+    "Работник торгового зала": "Sales floor worker",
+    "Повар": "Cook",
+    "Кассир": "Cashier",
+    "Пекарь": "Baker",
+    "Подсобный рабочий": "General laborer",
+    "Грузчик": "Loader",
+    "Посудомойщик": "Dishwasher",
+    "Мясник": "Butcher",
+    "Уборщик": "Cleaner",
+    "Продавец": "Shop assistant",
+    "Фасовщик": "Packer",
+    "Прессовщик": "Press operator",
+}
+
 # Допустимые города
 ALLOWED_CITIES = [
     "Москва",
@@ -0,0 +1,43 @@
+"""
+AdsGen 2.0 - Image Asset Model
+Post-processed images, content-addressed by SHA-256
+"""
+
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import String, Integer, DateTime, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from ..database import Base
+
+
+class ImageAsset(Base):
+    """
+    One processed (resized, recompressed) image. Renders that come out
+    byte-identical after processing share a row. Vacancies point here via
+    image_hash, so later stages read size and format without fetching the
+    image.
+    """
+    __tablename__ = "image_assets"
+
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+
+    # Where the original came from (ComfyUI output) and where the processed
+    # copy is published (None until the bulk upload picked it up)
+    source_url: Mapped[str] = mapped_column(String(500), index=True)
+    public_url: Mapped[Optional[str]] = mapped_column(String(500), nullable=True, index=True)
+
+    width: Mapped[int] = mapped_column(Integer)
+    height: Mapped[int] = mapped_column(Integer)
+    mime: Mapped[str] = mapped_column(String(50))
+    size_bytes: Mapped[int] = mapped_column(Integer)
+
+    uploaded_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now()
+    )
+
+    def __repr__(self) -> str:
+        return f"<ImageAsset {self.sha256[:12]} {self.width}x{self.height} {self.size_bytes}B>"
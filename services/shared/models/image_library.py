@@ -0,0 +1,51 @@
+"""
+AdsGen 2.0 - Image Library Model
+Rendered profession images kept for reuse across vacancies
+"""
+
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import String, Integer, DateTime, Index, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from ..database import Base
+
+
+class ImageLibraryItem(Base):
+    """
+    One rendered image variant. Vacancies with the same key (profession,
+    gender, age bucket, style, workflow, service) share the variants
+    instead of triggering a new ComfyUI render each.
+    """
+    __tablename__ = "image_library"
+    __table_args__ = (
+        Index(
+            "ix_image_library_key",
+            "profession", "gender", "age_bucket", "style", "workflow", "context_hash",
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+
+    # Library key
+    profession: Mapped[str] = mapped_column(String(200))
+    gender: Mapped[str] = mapped_column(String(10))
+    age_bucket: Mapped[str] = mapped_column(String(10))
+    style: Mapped[str] = mapped_column(String(50))
+    workflow: Mapped[str] = mapped_column(String(50))
+    context_hash: Mapped[str] = mapped_column(String(32), default="")  # MD5 of the normalized service, "" if none
+
+    image_url: Mapped[str] = mapped_column(String(500))
+
+    # Assignment bookkeeping (least-used variant is handed out next)
+    use_count: Mapped[int] = mapped_column(Integer, default=0)
+    last_used_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now()
+    )
+
+    def __repr__(self) -> str:
+        return f"<ImageLibraryItem {self.id}: {self.profession} {self.gender} {self.age_bucket} x{self.use_count}>"
@@ -0,0 +1,54 @@
+"""
+AdsGen 2.0 - Generation Usage Model
+Token and latency accounting for every LLM and image generation call
+"""
+
+import enum
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import String, Integer, Boolean, DateTime, Enum, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from ..database import Base
+
+
+class UsageKind(str, enum.Enum):
+    """Type of generation call."""
+    TEXT = "text"
+    TRANSLATION = "translation"
+    IMAGE = "image"
+
+
+class GenerationUsage(Base):
+    """
+    One row per external generation call (successful or not).
+    """
+    __tablename__ = "generation_usage"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    
+    # What the call was for
+    vacancy_id: Mapped[Optional[str]] = mapped_column(String(20), nullable=True, index=True)
+    import_batch_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True, index=True)
+    kind: Mapped[UsageKind] = mapped_column(Enum(UsageKind), index=True)
+    
+    # Who served it
+    provider: Mapped[str] = mapped_column(String(30), index=True)
+    model: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
+    
+    # Cost
+    prompt_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    cached_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    completion_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    latency_ms: Mapped[int] = mapped_column(Integer, default=0)
+    success: Mapped[bool] = mapped_column(Boolean, default=True)
+    
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        index=True
+    )
+    
+    def __repr__(self) -> str:
+        return f"<GenerationUsage {self.id}: {self.kind} {self.provider} {self.latency_ms}ms>"
@@ -52,6 +52,7 @@ class Vacancy(Base):
     # Deduplication fields
     source_id: Mapped[Optional[str]] = mapped_column(String(50), nullable=True, index=True)  # ImportSource.id
     source_row_hash: Mapped[Optional[str]] = mapped_column(String(32), nullable=True, index=True)  # MD5 hash
+    import_batch_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True, index=True)  # ImportBatch.id
     
     # Salary
     salary_min: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
@@ -61,6 +62,9 @@ class Vacancy(Base):
     title: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
     description: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     image_url: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+    image_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True, index=True)  # ImageAsset.sha256
+    image_job_id: Mapped[Optional[str]] = mapped_column(String(100), nullable=True, index=True)  # ComfyUI job in flight
+    description_minhash: Mapped[Optional[str]] = mapped_column(Text, nullable=True)  # MinHash signature, hex
     
     # Avito-specific fields
     manager_name: Mapped[str] = mapped_column(String(100), default="Анастасия")
@@ -77,6 +81,10 @@ class Vacancy(Base):
     error_message: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     retry_count: Mapped[int] = mapped_column(Integer, default=0)
     
+    # Last passed validation: content hash and rule set it passed under
+    validated_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    validated_rules_version: Mapped[Optional[str]] = mapped_column(String(16), nullable=True, index=True)
+    
     # Publishing
     avito_ad_id: Mapped[Optional[str]] = mapped_column(String(50), nullable=True)
     xml_exported: Mapped[bool] = mapped_column(default=False)
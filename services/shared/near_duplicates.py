@@ -0,0 +1,222 @@
+"""
+AdsGen 2.0 - Near-Duplicate Detection
+MinHash signatures of descriptions with a banded LSH index in Redis, so a
+new description is checked against every ad of the same profession with a
+handful of set lookups instead of a full scan
+"""
+
+import hashlib
+import logging
+import random
+import re
+from typing import Optional
+
+import redis
+
+from services.shared.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Redis key prefix for the index
+MINHASH_PREFIX = "adsgen:minhash:"
+
+# 20 bands x 3 rows: pairs with Jaccard 0.6 become candidates ~99% of the
+# time, unrelated texts (Jaccard < 0.1) ~2% of the time
+NUM_PERM = 60
+BANDS = 20
+ROWS = NUM_PERM // BANDS
+
+# Estimated Jaccard similarity of word 3-gram sets at which two
+# descriptions count as near-duplicates
+SIMILARITY_THRESHOLD = 0.6
+
+SHINGLE_SIZE = 3
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# Fixed seed - signatures must be comparable across processes and restarts
+_rng = random.Random(0xAD5)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERM)
+]
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# SIGNATURES
+# ═══════════════════════════════════════════════════════════════════════════
+
+def _shingles(text: str) -> set[int]:
+    """32-bit hashes of word n-grams of the visible text (markup and case ignored)."""
+    words = _WORD_RE.findall(_TAG_RE.sub(" ", text).lower())
+    if not words:
+        return set()
+    grams = (
+        [" ".join(words)] if len(words) < SHINGLE_SIZE
+        else [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+    )
+    return {int.from_bytes(hashlib.blake2b(gram.encode(), digest_size=4).digest(), "big") for gram in grams}
+
+
+def minhash(text: Optional[str]) -> Optional[tuple[int, ...]]:
+    """MinHash signature of a description, or None for empty text."""
+    shingles = _shingles(text or "")
+    if not shingles:
+        return None
+    return tuple(
+        min(((a * x + b) % _MERSENNE_PRIME) & _MAX_HASH for x in shingles)
+        for a, b in _PERMUTATIONS
+    )
+
+
+def similarity(a: tuple[int, ...], b: tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_PERM
+
+
+def to_hex(signature: tuple[int, ...]) -> str:
+    """Compact form stored in vacancies.description_minhash and Redis."""
+    return "".join(f"{value:08x}" for value in signature)
+
+
+def from_hex(raw: str) -> tuple[int, ...]:
+    return tuple(int(raw[i:i + 8], 16) for i in range(0, len(raw), 8))
+
+
+def _band_hashes(signature: tuple[int, ...]) -> list[str]:
+    return [
+        hashlib.blake2b(repr(signature[band * ROWS:(band + 1) * ROWS]).encode(), digest_size=6).hexdigest()
+        for band in range(BANDS)
+    ]
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# REDIS INDEX
+# ═══════════════════════════════════════════════════════════════════════════
+
+def _get_redis_client() -> redis.Redis:
+    """Get Redis client."""
+    return redis.from_url(settings.redis_url, socket_timeout=1.0, socket_connect_timeout=1.0)
+
+
+def _band_key(profession: str, band: int, bucket: str) -> str:
+    return f"{MINHASH_PREFIX}{profession}:band:{band}:{bucket}"
+
+
+def _signatures_key(profession: str) -> str:
+    return f"{MINHASH_PREFIX}{profession}:sig"
+
+
+def find_near_duplicate(
+    profession: str,
+    signature: tuple[int, ...],
+    exclude_id: Optional[str] = None,
+) -> Optional[tuple[str, float]]:
+    """
+    Most similar indexed vacancy of the same profession above
+    SIMILARITY_THRESHOLD. Returns (vacancy_id, similarity) or None.
+    Fails open (None) without Redis.
+    """
+    try:
+        r = _get_redis_client()
+
+        pipe = r.pipeline(transaction=False)
+        for band, bucket in enumerate(_band_hashes(signature)):
+            pipe.smembers(_band_key(profession, band, bucket))
+        candidates = set().union(*pipe.execute())
+        candidates.discard((exclude_id or "").encode())
+        if not candidates:
+            return None
+
+        candidates = list(candidates)
+        stored = r.hmget(_signatures_key(profession), candidates)
+    except Exception as e:
+        logger.debug(f"Near-duplicate lookup skipped, Redis unavailable ({e})")
+        return None
+
+    best = None
+    for vacancy_id, raw in zip(candidates, stored):
+        if raw is None:
+            continue
+        # Band sets may still list a vacancy whose text changed since, so
+        # always compare against its current signature
+        score = similarity(signature, from_hex(raw.decode()))
+        if score >= SIMILARITY_THRESHOLD and (best is None or score > best[1]):
+            best = (vacancy_id.decode(), score)
+    return best
+
+
+def add_to_index(profession: str, vacancy_id: str, signature: tuple[int, ...]) -> None:
+    """Register (or move) a vacancy in the index."""
+    index_many(profession, [(vacancy_id, signature)])
+
+
+def index_many(profession: str, items: list[tuple[str, tuple[int, ...]]]) -> None:
+    """Register many (vacancy_id, signature) pairs in one round trip."""
+    if not items:
+        return
+    try:
+        r = _get_redis_client()
+        pipe = r.pipeline(transaction=False)
+        for vacancy_id, signature in items:
+            for band, bucket in enumerate(_band_hashes(signature)):
+                pipe.sadd(_band_key(profession, band, bucket), vacancy_id)
+        pipe.hset(_signatures_key(profession), mapping={vid: to_hex(sig) for vid, sig in items})
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to index {len(items)} descriptions for {profession}: {e}")
+
+
+def clear_index(profession: Optional[str] = None) -> None:
+    """Drop the index for one profession (or all of them) before a rebuild."""
+    try:
+        r = _get_redis_client()
+        pattern = f"{MINHASH_PREFIX}{profession}:*" if profession else f"{MINHASH_PREFIX}*"
+        keys = list(r.scan_iter(pattern, count=1000))
+        for i in range(0, len(keys), 1000):
+            r.delete(*keys[i:i + 1000])
+    except Exception as e:
+        logger.error(f"Failed to clear near-duplicate index: {e}")
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# IN-PROCESS INDEX
+# ═══════════════════════════════════════════════════════════════════════════
+
+class MinHashIndex:
+    """
+    In-process LSH index with the same banding as the Redis one, used by
+    the bulk scan so the corpus is compared without a round trip per row.
+    """
+
+    def __init__(self):
+        self._bands: list[dict[str, list[str]]] = [{} for _ in range(BANDS)]
+        self._signatures: dict[str, tuple[int, ...]] = {}
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def add(self, vacancy_id: str, signature: tuple[int, ...]) -> None:
+        self._signatures[vacancy_id] = signature
+        for band, bucket in enumerate(_band_hashes(signature)):
+            self._bands[band].setdefault(bucket, []).append(vacancy_id)
+
+    def find(self, signature: tuple[int, ...]) -> Optional[tuple[str, float]]:
+        candidates = set()
+        for band, bucket in enumerate(_band_hashes(signature)):
+            candidates.update(self._bands[band].get(bucket, ()))
+
+        best = None
+        for vacancy_id in candidates:
+            score = similarity(signature, self._signatures[vacancy_id])
+            if score >= SIMILARITY_THRESHOLD and (best is None or score > best[1]):
+                best = (vacancy_id, score)
+        return best
+
+    def items(self) -> list[tuple[str, tuple[int, ...]]]:
+        return list(self._signatures.items())
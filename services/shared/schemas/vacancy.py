@@ -89,6 +89,7 @@ class VacancyResponse(BaseModel):
     status: VacancyStatus
     error_message: Optional[str]
     avito_ad_id: Optional[str]
+    import_batch_id: Optional[int] = None
     created_at: datetime
     updated_at: datetime
 
@@ -0,0 +1,238 @@
+"""
+AdsGen 2.0 - Stop Word Matcher
+Word-level Aho-Corasick automaton over stemmed tokens: every stop phrase is
+found in one linear pass over the text, only on word boundaries and in any
+inflected form ("медицинской справки" matches "медицинская справка").
+A phrase in double quotes matches its exact word forms only ('"молодых"'
+does not flag "молодой коллектив").
+The phrase list is the built-in STOP_WORDS plus the phrases stored in Redis,
+reloaded when their version changes.
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import deque
+from typing import Iterable, Optional
+
+import redis
+
+from services.shared.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Redis keys of the editable phrase list and its change counter
+STOP_WORDS_KEY = "adsgen:stop_words"
+STOP_WORDS_VERSION_KEY = "adsgen:stop_words:version"
+
+# How often a process checks whether the Redis list changed
+RELOAD_CHECK_SECONDS = 30
+
+_TOKEN_RE = re.compile(r"[0-9a-zа-яё]+")
+
+# Russian inflection endings, longest first (a light suffix stripper, not a
+# full stemmer: fleeting vowels like "привычек/привычки" stay apart)
+_ENDINGS = sorted({
+    # adjectives and participles
+    "ими", "ыми", "его", "ого", "ему", "ому", "ее", "ие", "ые", "ое", "ей", "ий", "ый", "ой",
+    "ем", "им", "ым", "ом", "их", "ых", "ую", "юю", "ая", "яя", "ою", "ею",
+    # verbs
+    "ете", "ите", "йте", "ешь", "ишь", "ует", "уют", "ила", "ыла", "ена", "ило", "ыло", "ено",
+    "ить", "ыть", "ать", "ять", "ет", "ит", "ют", "ят", "ат", "ла", "ли", "ло", "ть",
+    # nouns
+    "иями", "ями", "ами", "иях", "ях", "ах", "ией", "ием", "ьем", "иям", "ям", "ам", "ев", "ов",
+    "ье", "еи", "ии", "ию", "ью", "ия", "ья", "ьи",
+    "а", "е", "и", "о", "у", "ы", "ь", "ю", "я", "й",
+}, key=len, reverse=True)
+
+# Shortest stem left after stripping an ending
+_MIN_STEM = 3
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# TOKENS
+# ═══════════════════════════════════════════════════════════════════════════
+
+def _stem(word: str) -> str:
+    """Strip one inflection ending, keeping at least _MIN_STEM letters."""
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= _MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+
+def _words(text: str) -> list[str]:
+    return _TOKEN_RE.findall(text.lower().replace("ё", "е"))
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# AUTOMATON
+# ═══════════════════════════════════════════════════════════════════════════
+
+class _Automaton:
+    """Aho-Corasick automaton over word symbols (stems or exact words)."""
+
+    def __init__(self):
+        self.goto: list[dict[str, int]] = [{}]
+        self.fail: list[int] = [0]
+        self.out: list[list[int]] = [[]]
+
+    def add(self, symbols: list[str], index: int) -> None:
+        state = 0
+        for symbol in symbols:
+            if symbol not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+                self.goto[state][symbol] = len(self.goto) - 1
+            state = self.goto[state][symbol]
+        self.out[state].append(index)
+
+    def link(self) -> None:
+        """Breadth-first failure links; a state also reports its fallback's phrases."""
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for symbol, child in self.goto[state].items():
+                queue.append(child)
+                if state:
+                    self.fail[child] = self.next(self.fail[state], symbol)
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    def next(self, state: int, symbol: str) -> int:
+        while symbol not in self.goto[state]:
+            if not state:
+                return 0
+            state = self.fail[state]
+        return self.goto[state][symbol]
+
+
+class StopWordMatcher:
+    """
+    Aho-Corasick automata whose alphabets are word stems (and exact words
+    for quoted phrases), so one pass over the text finds every phrase
+    regardless of how many there are.
+    """
+
+    def __init__(self, phrases: Iterable[str]):
+        self.phrases: list[str] = []
+        self._inflected = _Automaton()
+        self._exact = _Automaton()
+
+        for phrase in dict.fromkeys(p.strip() for p in phrases if p and p.strip()):
+            self._add(phrase)
+        self._inflected.link()
+        self._exact.link()
+
+    def _add(self, phrase: str) -> None:
+        words = _words(phrase)
+        if not words:
+            return
+
+        if len(phrase) > 1 and phrase[0] == phrase[-1] == '"':
+            self._exact.add(words, len(self.phrases))
+        else:
+            self._inflected.add([_stem(word) for word in words], len(self.phrases))
+        self.phrases.append(phrase)
+
+    def find(self, text: Optional[str]) -> list[str]:
+        """Distinct phrases found in the text, in order of first occurrence."""
+        found: dict[int, None] = {}
+        inflected = exact = 0
+        for word in _words(text or ""):
+            inflected = self._inflected.next(inflected, _stem(word))
+            exact = self._exact.next(exact, word)
+            for index in (*self._inflected.out[inflected], *self._exact.out[exact]):
+                found.setdefault(index)
+        return [self.phrases[index] for index in found]
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# HOT RELOAD
+# ═══════════════════════════════════════════════════════════════════════════
+
+def _get_redis_client() -> redis.Redis:
+    """Get Redis client."""
+    return redis.from_url(settings.redis_url, socket_timeout=1.0, socket_connect_timeout=1.0)
+
+
+_lock = threading.Lock()
+_matcher: Optional[StopWordMatcher] = None
+_version: Optional[str] = None
+_checked_at = 0.0
+
+
+def get_matcher() -> StopWordMatcher:
+    """
+    Process-wide matcher for the built-in STOP_WORDS plus the Redis list.
+    Rebuilt only when the Redis version changes (checked every
+    RELOAD_CHECK_SECONDS); without Redis the last build keeps being used.
+    """
+    global _matcher, _version, _checked_at
+
+    if _matcher is not None and time.monotonic() - _checked_at < RELOAD_CHECK_SECONDS:
+        return _matcher
+
+    with _lock:
+        if _matcher is not None and time.monotonic() - _checked_at < RELOAD_CHECK_SECONDS:
+            return _matcher
+
+        extra: list[str] = []
+        version = _version
+        try:
+            client = _get_redis_client()
+            raw_version = client.get(STOP_WORDS_VERSION_KEY)
+            version = raw_version.decode() if raw_version else "0"
+            if _matcher is None or version != _version:
+                extra = [p.decode() for p in client.smembers(STOP_WORDS_KEY)]
+        except Exception as e:
+            logger.debug(f"Stop word list unavailable in Redis ({e}), using the built-in list")
+
+        if _matcher is None or version != _version:
+            from services.shared.content_rules import STOP_WORDS
+            _matcher = StopWordMatcher([*STOP_WORDS, *sorted(extra)])
+            _version = version
+            logger.info(f"Stop word matcher built: {len(_matcher.phrases)} phrases (version {version})")
+
+        _checked_at = time.monotonic()
+        return _matcher
+
+
+def get_version() -> str:
+    """Version of the phrase list the current matcher was built from."""
+    get_matcher()
+    return _version or "0"
+
+
+def get_custom_stop_words() -> list[str]:
+    """Phrases added on top of the built-in list."""
+    try:
+        return sorted(p.decode() for p in _get_redis_client().smembers(STOP_WORDS_KEY))
+    except Exception as e:
+        logger.warning(f"Failed to read stop words: {e}")
+        return []
+
+
+def set_custom_stop_words(phrases: Iterable[str]) -> bool:
+    """Replace the Redis phrase list; every process picks it up within RELOAD_CHECK_SECONDS."""
+    phrases = sorted({p.strip() for p in phrases if p and p.strip()})
+    try:
+        pipe = _get_redis_client().pipeline()
+        pipe.delete(STOP_WORDS_KEY)
+        if phrases:
+            pipe.sadd(STOP_WORDS_KEY, *phrases)
+        pipe.incr(STOP_WORDS_VERSION_KEY)
+        pipe.execute()
+        return True
+    except Exception as e:
+        logger.error(f"Failed to store stop words: {e}")
+        return False
+
+
+def reset_matcher() -> None:
+    """Drop the cached automaton (next call rebuilds it)."""
+    global _matcher, _version, _checked_at
+    with _lock:
+        _matcher, _version, _checked_at = None, None, 0.0
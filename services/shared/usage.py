@@ -0,0 +1,61 @@
+"""
+AdsGen 2.0 - Usage Accounting
+Records token counts and latency of generation calls into generation_usage
+"""
+
+import logging
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from services.shared.database import get_sync_engine
+from services.shared.models.usage import GenerationUsage, UsageKind
+
+logger = logging.getLogger(__name__)
+
+
+def cache_hit_tokens(usage: dict) -> int:
+    """Prompt tokens served from the provider prefix cache."""
+    # DeepSeek reports prompt_cache_hit_tokens, OpenAI-compatible servers
+    # report prompt_tokens_details.cached_tokens
+    if usage.get("prompt_cache_hit_tokens") is not None:
+        return usage["prompt_cache_hit_tokens"]
+    details = usage.get("prompt_tokens_details") or {}
+    return details.get("cached_tokens") or 0
+
+
+def record_usage(
+    kind: UsageKind,
+    provider: str,
+    latency: float,
+    vacancy=None,
+    model: Optional[str] = None,
+    usage: Optional[dict] = None,
+    success: bool = True,
+) -> None:
+    """
+    Store one usage row. `usage` is the OpenAI-style usage object returned by
+    the provider (may be None, e.g. for image calls or aborted streams).
+    Never raises - accounting must not break generation.
+    """
+    usage = usage or {}
+    
+    row = GenerationUsage(
+        vacancy_id=getattr(vacancy, "id", None),
+        import_batch_id=getattr(vacancy, "import_batch_id", None),
+        kind=kind,
+        provider=provider,
+        model=model,
+        prompt_tokens=usage.get("prompt_tokens") or 0,
+        cached_tokens=cache_hit_tokens(usage),
+        completion_tokens=usage.get("completion_tokens") or 0,
+        latency_ms=int(latency * 1000),
+        success=success,
+    )
+    
+    try:
+        with Session(get_sync_engine()) as session:
+            session.add(row)
+            session.commit()
+    except Exception as e:
+        logger.warning(f"Failed to record {kind.value} usage: {e}")
@@ -0,0 +1,273 @@
+"""
+AdsGen 2.0 - Validation Rules
+Registry of the checks an ad goes through before publishing. Every rule
+has a default severity that the admin can override (or switch off) in the
+"validation" worker settings; each run records per-rule time and hit
+counts in Redis, so costly and never-firing rules are visible.
+A passed validation is remembered as a content hash plus the version of
+the rule set, so unchanged ads are not checked again.
+"""
+
+import hashlib
+import json
+import logging
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Callable, Iterable, Optional
+
+import redis
+
+from services.shared import stop_words
+from services.shared.config import get_settings
+from services.shared.content_rules import (
+    MAX_DESCRIPTION_LENGTH,
+    MAX_TITLE_LENGTH,
+    MIN_DESCRIPTION_LENGTH,
+    MIN_TITLE_LENGTH,
+    SALARY_PATTERNS,
+    STOP_WORDS,
+    check_stop_words,
+    description_length_errors,
+    description_pipe_warnings,
+    title_length_errors,
+    title_pipe_errors,
+    title_salary_errors,
+)
+from services.shared.html_validator import ALLOWED_TAGS, HtmlCheck, check_html
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Redis hash of cumulative per-rule counters ("<rule>:calls" etc.)
+RULE_STATS_KEY = "adsgen:rule_stats"
+
+SEVERITIES = ("error", "warning", "off")
+
+# Bump when the logic of a rule changes (limits, patterns, stop words and
+# severities are part of the version already)
+RULES_REVISION = 1
+
+
+@dataclass
+class AdContent:
+    """What the rules look at; the image check runs only if its rule does."""
+    title: Optional[str]
+    description: Optional[str]
+    image: Callable[[], list[str]] = field(default=lambda: [])
+
+    @cached_property
+    def markup(self) -> HtmlCheck:
+        """One HTML pass shared by the description rules."""
+        return check_html(self.description)
+
+
+@dataclass(frozen=True)
+class Rule:
+    name: str
+    label: str
+    check: Callable[[AdContent], list[str]]
+    severity: str = "error"
+
+
+# Report order: title, description, image, stop words
+RULES: list[Rule] = [
+    Rule("title_length", "Длина заголовка", lambda ad: title_length_errors(ad.title)),
+    Rule("title_salary", "Зарплата в заголовке", lambda ad: title_salary_errors(ad.title)),
+    Rule("title_pipe", "Символ '|' в заголовке", lambda ad: title_pipe_errors(ad.title)),
+    Rule("description_length", "Длина описания", lambda ad: description_length_errors(ad.description, ad.markup)),
+    Rule("description_markup", "HTML-разметка описания", lambda ad: ad.markup.errors if ad.description else []),
+    Rule("description_pipe", "Символ '|' в описании", lambda ad: description_pipe_warnings(ad.description), "warning"),
+    Rule("image", "Доступность изображения", lambda ad: ad.image()),
+    Rule("stop_words", "Стоп-слова", lambda ad: check_stop_words(ad.title, ad.description)),
+]
+
+RULES_BY_NAME = {rule.name: rule for rule in RULES}
+
+# Rules a generated text field is checked against (field -> rule names)
+TEXT_RULES = {
+    "title": ("title_length", "title_salary", "title_pipe", "stop_words"),
+    "description": ("description_length", "description_markup", "description_pipe", "stop_words"),
+}
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# CONFIGURATION
+# ═══════════════════════════════════════════════════════════════════════════
+
+def get_rule_config(worker_settings: Optional[dict] = None) -> dict[str, str]:
+    """Effective severity of every rule ("off" = disabled) from the worker settings."""
+    if worker_settings is None:
+        from services.shared.worker_settings import get_worker_settings
+        worker_settings = get_worker_settings("validation")
+
+    config = {}
+    for rule in RULES:
+        severity = worker_settings.get(f"rule_{rule.name}", rule.severity)
+        config[rule.name] = severity if severity in SEVERITIES else rule.severity
+    return config
+
+
+def rules_version(config: Optional[dict[str, str]] = None) -> str:
+    """Fingerprint of everything that decides a validation outcome."""
+    if config is None:
+        config = get_rule_config()
+
+    payload = json.dumps({
+        "revision": RULES_REVISION,
+        "config": config,
+        "limits": [MIN_TITLE_LENGTH, MAX_TITLE_LENGTH, MIN_DESCRIPTION_LENGTH, MAX_DESCRIPTION_LENGTH],
+        "salary": SALARY_PATTERNS,
+        "tags": sorted(ALLOWED_TAGS),
+        "stop_words": [STOP_WORDS, stop_words.get_version()],
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.md5(payload.encode()).hexdigest()[:16]
+
+
+def content_hash(
+    title: Optional[str],
+    description: Optional[str],
+    image_url: Optional[str],
+    image_hash: Optional[str],
+) -> str:
+    """Hash of the fields the rules read."""
+    payload = "\x00".join(part or "" for part in (title, description, image_url, image_hash))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# ENGINE
+# ═══════════════════════════════════════════════════════════════════════════
+
+class RuleStats:
+    """Per-rule counters of one process, added to Redis on flush()."""
+
+    def __init__(self):
+        self.calls: dict[str, int] = defaultdict(int)
+        self.hits: dict[str, int] = defaultdict(int)
+        self.seconds: dict[str, float] = defaultdict(float)
+
+    def record(self, name: str, seconds: float, hit: bool) -> None:
+        self.calls[name] += 1
+        self.hits[name] += int(hit)
+        self.seconds[name] += seconds
+
+    def flush(self) -> None:
+        if not self.calls:
+            return
+        try:
+            pipe = _get_redis_client().pipeline()
+            for name, calls in self.calls.items():
+                pipe.hincrby(RULE_STATS_KEY, f"{name}:calls", calls)
+                pipe.hincrby(RULE_STATS_KEY, f"{name}:hits", self.hits[name])
+                pipe.hincrbyfloat(RULE_STATS_KEY, f"{name}:seconds", self.seconds[name])
+            pipe.execute()
+        except Exception as e:
+            logger.debug(f"Failed to store rule stats: {e}")
+        self.calls.clear()
+        self.hits.clear()
+        self.seconds.clear()
+
+
+def run_rules(
+    ad: AdContent,
+    config: Optional[dict[str, str]] = None,
+    stats: Optional[RuleStats] = None,
+    names: Optional[Iterable[str]] = None,
+) -> tuple[list[str], list[str]]:
+    """
+    Run every enabled rule (or only those in `names`).
+    Returns (errors, warnings) by configured severity.
+    """
+    if config is None:
+        config = get_rule_config()
+
+    errors = []
+    warnings = []
+    selected = set(names) if names is not None else None
+    for rule in RULES:
+        if selected is not None and rule.name not in selected:
+            continue
+        severity = config.get(rule.name, rule.severity)
+        if severity == "off":
+            continue
+
+        started = time.perf_counter()
+        found = rule.check(ad)
+        if stats is not None:
+            stats.record(rule.name, time.perf_counter() - started, bool(found))
+
+        (errors if severity == "error" else warnings).extend(found)
+
+    return errors, warnings
+
+
+def text_errors(
+    title: Optional[str],
+    description: Optional[str],
+    config: Optional[dict[str, str]] = None,
+) -> dict[str, list[str]]:
+    """
+    Errors of the text rules per field ({"title": [...], "description": [...]},
+    failing fields only). Only rules configured as "error" count, so
+    generation does not retry what validation would pass.
+    """
+    if config is None:
+        config = get_rule_config()
+
+    errors = {}
+    for field, names in TEXT_RULES.items():
+        ad = AdContent(title, None) if field == "title" else AdContent(None, description)
+        field_errors, _ = run_rules(ad, config, names=names)
+        if field_errors:
+            errors[field] = field_errors
+    return errors
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# STATS
+# ═══════════════════════════════════════════════════════════════════════════
+
+def _get_redis_client() -> redis.Redis:
+    """Get Redis client."""
+    return redis.from_url(settings.redis_url, socket_timeout=1.0, socket_connect_timeout=1.0)
+
+
+def get_rule_stats(config: Optional[dict[str, str]] = None) -> list[dict]:
+    """Every rule with its severity, call/hit counts and average time."""
+    if config is None:
+        config = get_rule_config()
+
+    raw = {}
+    try:
+        raw = {k.decode(): float(v) for k, v in _get_redis_client().hgetall(RULE_STATS_KEY).items()}
+    except Exception as e:
+        logger.warning(f"Failed to read rule stats: {e}")
+
+    result = []
+    for rule in RULES:
+        calls = int(raw.get(f"{rule.name}:calls", 0))
+        hits = int(raw.get(f"{rule.name}:hits", 0))
+        seconds = raw.get(f"{rule.name}:seconds", 0.0)
+        result.append({
+            "name": rule.name,
+            "label": rule.label,
+            "severity": config.get(rule.name, rule.severity),
+            "default_severity": rule.severity,
+            "calls": calls,
+            "hits": hits,
+            "hit_rate": round(hits / calls, 4) if calls else 0.0,
+            "total_seconds": round(seconds, 3),
+            "avg_ms": round(seconds / calls * 1000, 3) if calls else 0.0,
+        })
+    return result
+
+
+def reset_rule_stats() -> bool:
+    try:
+        _get_redis_client().delete(RULE_STATS_KEY)
+        return True
+    except Exception as e:
+        logger.error(f"Failed to reset rule stats: {e}")
+        return False
@@ -80,6 +80,32 @@ DEFAULT_SETTINGS = {
                 "min": -1,
                 "max": 8000,
             },
+            "max_fix_attempts": {
+                "label": "Попыток исправить поле",
+                "type": "number",
+                "default": 2,
+                "min": 0,
+                "max": 5,
+            },
+            "pregen_enabled": {
+                "label": "Предгенерация в непиковые часы",
+                "type": "toggle",
+                "default": False,
+            },
+            "pregen_window": {
+                "label": "Непиковое окно (МСК)",
+                "type": "text",
+                "default": "01:00-06:00",
+                "show_when": {"pregen_enabled": True},
+            },
+            "pregen_per_minute": {
+                "label": "Текстов в минуту при предгенерации",
+                "type": "number",
+                "default": 10,
+                "min": 1,
+                "max": 120,
+                "show_when": {"pregen_enabled": True},
+            },
         },
     },
     "imagegen": {
@@ -88,9 +114,18 @@ DEFAULT_SETTINGS = {
         "description": "Генерация изображений через ComfyUI",
         "settings": {
             "comfyui_url": {
-                "label": "ComfyUI API URL",
+                "label": "ComfyUI API URL (несколько — через запятую)",
                 "type": "text",
-                "default": "http://localhost:5000",
+                "default": "",
+                "placeholder": "пусто = COMFYUI_URL",
+                "show_when": {"provider": "comfyui"},
+            },
+            "node_max_jobs": {
+                "label": "Параллельных рендеров на ноду",
+                "type": "number",
+                "default": 2,
+                "min": 1,
+                "max": 32,
                 "show_when": {"provider": "comfyui"},
             },
             "provider": {
@@ -118,12 +153,43 @@ DEFAULT_SETTINGS = {
                 "options": ["turbo_fast", "sdxl_quality", "flux_realism"],
                 "default": "turbo_fast",
             },
+            "downgrade_after_minutes": {
+                "label": "Переход на turbo_fast при очереди старше (мин, 0 = никогда)",
+                "type": "number",
+                "default": 30,
+                "min": 0,
+                "max": 1440,
+                "show_when": {"provider": "comfyui"},
+            },
             "style": {
                 "label": "Стиль изображений",
                 "type": "select",
                 "options": ["stylized", "realistic", "cartoon"],
                 "default": "stylized",
             },
+            "render_mode": {
+                "label": "Режим рендера",
+                "type": "select",
+                "options": ["async", "sync"],
+                "default": "async",
+                "show_when": {"provider": "comfyui"},
+            },
+            "batch_size": {
+                "label": "Картинок за один прогон workflow (1 = без пакетов)",
+                "type": "number",
+                "default": 1,
+                "min": 1,
+                "max": 16,
+                "show_when": {"provider": "comfyui"},
+            },
+            "batch_wait": {
+                "label": "Ожидание пакета (сек)",
+                "type": "number",
+                "default": 20,
+                "min": 1,
+                "max": 300,
+                "show_when": {"provider": "comfyui"},
+            },
             "timeout": {
                 "label": "Timeout (сек)",
                 "type": "number",
@@ -131,6 +197,37 @@ DEFAULT_SETTINGS = {
                 "min": 30,
                 "max": 600,
             },
+            "library_variants": {
+                "label": "Вариантов картинки на ключ",
+                "type": "number",
+                "default": 5,
+                "min": 1,
+                "max": 50,
+            },
+            "postprocess_images": {
+                "label": "Пережимать картинки под Авито",
+                "type": "toggle",
+                "default": True,
+            },
+            "pregen_enabled": {
+                "label": "Предгенерация в непиковые часы",
+                "type": "toggle",
+                "default": False,
+            },
+            "pregen_window": {
+                "label": "Непиковое окно (МСК)",
+                "type": "text",
+                "default": "01:00-06:00",
+                "show_when": {"pregen_enabled": True},
+            },
+            "pregen_per_minute": {
+                "label": "Картинок в минуту при предгенерации",
+                "type": "number",
+                "default": 4,
+                "min": 1,
+                "max": 120,
+                "show_when": {"pregen_enabled": True},
+            },
         },
     },
     "import": {
@@ -176,6 +273,61 @@ DEFAULT_SETTINGS = {
             },
         },
     },
+    "validation": {
+        "name": "Validation Worker",
+        "icon": "✅",
+        "description": "Проверка объявлений по правилам Avito (ошибка / предупреждение / выключено)",
+        "settings": {
+            "rule_title_length": {
+                "label": "Правило: Длина заголовка",
+                "type": "select",
+                "options": ["error", "warning", "off"],
+                "default": "error",
+            },
+            "rule_title_salary": {
+                "label": "Правило: Зарплата в заголовке",
+                "type": "select",
+                "options": ["error", "warning", "off"],
+                "default": "error",
+            },
+            "rule_title_pipe": {
+                "label": "Правило: Символ '|' в заголовке",
+                "type": "select",
+                "options": ["error", "warning", "off"],
+                "default": "error",
+            },
+            "rule_description_length": {
+                "label": "Правило: Длина описания",
+                "type": "select",
+                "options": ["error", "warning", "off"],
+                "default": "error",
+            },
+            "rule_description_markup": {
+                "label": "Правило: HTML-разметка описания",
+                "type": "select",
+                "options": ["error", "warning", "off"],
+                "default": "error",
+            },
+            "rule_description_pipe": {
+                "label": "Правило: Символ '|' в описании",
+                "type": "select",
+                "options": ["error", "warning", "off"],
+                "default": "warning",
+            },
+            "rule_image": {
+                "label": "Правило: Доступность изображения",
+                "type": "select",
+                "options": ["error", "warning", "off"],
+                "default": "error",
+            },
+            "rule_stop_words": {
+                "label": "Правило: Стоп-слова",
+                "type": "select",
+                "options": ["error", "warning", "off"],
+                "default": "error",
+            },
+        },
+    },
     "publisher": {
         "name": "Publisher Worker",
         "icon": "📤",
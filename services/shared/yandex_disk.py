@@ -0,0 +1,67 @@
+"""
+AdsGen 2.0 - Yandex Disk Client
+Upload and publish files on Yandex Disk over one HTTP connection
+"""
+
+import logging
+from typing import BinaryIO, Optional, Union
+
+import httpx
+
+from services.shared.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+API_URL = "https://cloud-api.yandex.net/v1/disk"
+
+
+class YandexDiskClient:
+    """
+    Thin REST client. Use as a context manager so a bulk upload reuses
+    one connection:
+
+        with YandexDiskClient() as disk:
+            disk.ensure_folder(folder)
+            url = disk.upload(f"{folder}/a.jpg", data, "image/jpeg")
+    """
+
+    def __init__(self, token: Optional[str] = None, timeout: float = 60.0):
+        self.token = token or settings.yandex_disk_token
+        if not self.token or self.token == "your_yandex_disk_token_here":
+            raise ValueError("YANDEX_DISK_TOKEN not configured")
+        self._client = httpx.Client(timeout=timeout, headers={"Authorization": f"OAuth {self.token}"})
+
+    def __enter__(self) -> "YandexDiskClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._client.close()
+
+    def ensure_folder(self, path: str) -> None:
+        """Create a folder (409 = already exists is fine)."""
+        self._client.put(f"{API_URL}/resources", params={"path": path})
+
+    def upload(self, path: str, content: Union[bytes, BinaryIO], content_type: str) -> str:
+        """
+        Upload (overwriting) and publish a file. Returns its public URL.
+        `content` may be an open binary file, which is streamed from disk.
+        """
+        resp = self._client.get(f"{API_URL}/resources/upload", params={"path": path, "overwrite": "true"})
+        resp.raise_for_status()
+
+        # The upload href is a different host and must not get the OAuth header
+        upload_resp = httpx.put(resp.json()["href"], content=content, headers={"Content-Type": content_type}, timeout=self._client.timeout)
+        upload_resp.raise_for_status()
+
+        self._client.put(f"{API_URL}/resources/publish", params={"path": path})
+
+        meta_resp = self._client.get(f"{API_URL}/resources", params={"path": path})
+        meta_resp.raise_for_status()
+        return meta_resp.json().get("public_url", f"disk:/{path}")
+
+    def public_download_url(self, public_url: str) -> str:
+        """Direct file link behind a public disk.yandex.ru / yadi.sk page."""
+        resp = self._client.get(f"{API_URL}/public/resources/download", params={"public_key": public_url})
+        resp.raise_for_status()
+        return resp.json()["href"]
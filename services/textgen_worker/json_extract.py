@@ -0,0 +1,129 @@
+"""
+AdsGen 2.0 - JSON Extraction for LLM Output
+Single-pass, brace- and string-aware extractor that finds the first complete
+JSON object in free-form model output and repairs the usual LLM mistakes
+"""
+
+import json
+from typing import Optional
+
+_WHITESPACE = " \t\r\n"
+_CLOSERS = {"{": "}", "[": "]"}
+
+# Control characters that are invalid inside JSON strings
+_CONTROL_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t", "\b": "\\b", "\f": "\\f"}
+
+
+def extract_json_object(text: str) -> Optional[dict]:
+    """
+    Return the first JSON object embedded in `text`, or None.
+
+    The text is scanned once. Markdown fences and prose around the object are
+    skipped, braces inside strings (e.g. HTML descriptions) are ignored, and
+    the candidate is repaired on the fly:
+      - trailing commas before } or ] are dropped
+      - raw newlines / tabs / control characters inside strings are escaped
+      - a '"' inside a string that is not followed by , : } or ] is treated
+        as an unescaped quote and escaped
+      - an object truncated at the end of the text is closed
+    If a candidate still fails to parse (or never closes), scanning restarts
+    at the next '{' after the one it began with.
+    """
+    if not text:
+        return None
+
+    n = len(text)
+    i = 0
+
+    while i < n:
+        start = text.find("{", i)
+        if start == -1:
+            return None
+
+        out: list[str] = []
+        stack: list[str] = []
+        in_string = False
+        escape = False
+        pending_comma = False
+        j = start
+
+        while j < n:
+            ch = text[j]
+
+            if in_string:
+                if escape:
+                    out.append(ch)
+                    escape = False
+                elif ch == "\\":
+                    out.append(ch)
+                    escape = True
+                elif ch == '"':
+                    if _closes_string(text, j + 1):
+                        out.append(ch)
+                        in_string = False
+                    else:
+                        out.append('\\"')
+                elif ch in _CONTROL_ESCAPES:
+                    out.append(_CONTROL_ESCAPES[ch])
+                elif ch < " ":
+                    out.append(f"\\u{ord(ch):04x}")
+                else:
+                    out.append(ch)
+                j += 1
+                continue
+
+            if ch in _WHITESPACE:
+                j += 1
+                continue
+
+            if pending_comma:
+                pending_comma = False
+                if ch not in "}]":
+                    out.append(",")
+
+            if ch == ",":
+                pending_comma = True
+            elif ch == '"':
+                out.append(ch)
+                in_string = True
+            elif ch in "{[":
+                stack.append(ch)
+                out.append(ch)
+            elif ch in "}]":
+                if stack:
+                    stack.pop()
+                out.append(ch)
+                if not stack:
+                    break
+            else:
+                out.append(ch)
+            j += 1
+
+        if stack:
+            # Truncated output - close whatever is still open
+            if in_string:
+                if escape:
+                    out.pop()
+                out.append('"')
+            out.extend(_CLOSERS[opener] for opener in reversed(stack))
+
+        try:
+            result = json.loads("".join(out))
+        except json.JSONDecodeError:
+            result = None
+
+        if isinstance(result, dict):
+            return result
+
+        # The object may start inside the failed candidate (e.g. "Sure { here: {...}")
+        i = start + 1
+
+    return None
+
+
+def _closes_string(text: str, pos: int) -> bool:
+    """Whether a quote followed by text[pos:] plausibly terminates a string."""
+    n = len(text)
+    while pos < n and text[pos] in _WHITESPACE:
+        pos += 1
+    return pos >= n or text[pos] in ",:}]"
@@ -3,6 +3,10 @@ AdsGen 2.0 - Text Generation Prompts
 Migrated from avito-vacancies-v3.gs - AI prompts for vacancy content generation
 """
 
+import json
+import random
+import re
+
 # Description templates migrated from templates.gs
 DESCRIPTION_TEMPLATES = {
     "Повар": {
@@ -107,70 +111,44 @@ TONES = [
     "Теплый и человечный",
 ]
 
+_HTML_TAG_RE = re.compile(r'<[^>]*>')
 
-def get_generation_prompt(
-    profession: str,
-    address: str,
-    salary: str,
-    service: str,
-    store_type: str,
-) -> str:
-    """
-    Build the AI generation prompt.
-    Migrated from generateAiVacancyContent() in avito-vacancies-v3.gs
-    """
-    import random
-    
-    # Map store type
-    store_context = "Магазин"
-    if store_type in ("ГМ", "ЦП"):
-        store_context = "Гипермаркет (крупный формат)"
-    elif store_type == "МФ":
-        store_context = "Магазин у дома / Супермаркет (малый формат)"
-    
-    # Get template for inspiration
-    template = DESCRIPTION_TEMPLATES.get(profession, {"duties": [], "advantages": []})
-    
-    random_duty = ""
-    random_adv = ""
-    if template.get("duties"):
-        random_duty = random.choice(template["duties"])
-        # Strip HTML tags for prompt
-        import re
-        random_duty = re.sub(r'<[^>]*>', '', random_duty)
-    
-    if template.get("advantages"):
-        random_adv = random.choice(template["advantages"])
-        import re
-        random_adv = re.sub(r'<[^>]*>', '', random_adv)
-    
-    random_tone = random.choice(TONES)
-    
-    prompt = f"""Ты — опытный HR-копирайтер. Твоя задача — написать уникальное название и описание вакансии для Авито СТРОГО про указанную профессию.
+
+def _strip_html(text: str) -> str:
+    """Strip HTML tags and collapse whitespace."""
+    return " ".join(_HTML_TAG_RE.sub(" ", text).split())
+
+
+# Templates with HTML stripped once at import time (used as prompt inspiration)
+PLAIN_TEMPLATES = {
+    profession: {
+        "duties": [_strip_html(duty) for duty in template.get("duties", [])],
+        "advantages": [_strip_html(adv) for adv in template.get("advantages", [])],
+    }
+    for profession, template in DESCRIPTION_TEMPLATES.items()
+}
+
+# Static instructions. Kept byte-identical across requests so that providers
+# with prefix caching (DeepSeek, OpenAI-compatible) can reuse them; everything
+# that varies per vacancy goes into the short user message that follows.
+SYSTEM_PROMPT = """Ты — опытный HR-копирайтер. Твоя задача — написать уникальное название и описание вакансии для Авито СТРОГО про профессию, указанную в данных вакансии.
 
 КРИТИЧЕСКИЙ КОНТЕКСТ:
-1. Тип объекта: "{store_context}". Используй соответствующую терминологию.
-2. Специфика услуги: "{service or 'Не указана'}". 
+1. Учитывай тип объекта из данных вакансии. Используй соответствующую терминологию.
+2. Учитывай специфику услуги из данных вакансии.
    Если в услуге указано использование техники/оборудования — ОБЯЗАТЕЛЬНО отрази это.
 
-ДАННЫЕ ДЛЯ КОНТЕКСТА:
-Профессия: {profession}
-Локация: {address}
-Зарплата/Ставка: {salary}
-Тональность текста: {random_tone}
-
-ИНФОРМАЦИЯ ДЛЯ ВДОХНОВЕНИЯ (используй факты отсюда, но перефразируй):
-Обязанности: {random_duty}
-Преимущества: {random_adv}
+ИНФОРМАЦИЯ ДЛЯ ВДОХНОВЕНИЯ:
+Обязанности и преимущества из данных вакансии — используй факты оттуда, но перефразируй.
 
 ИНСТРУКЦИИ ПО СОДЕРЖАНИЮ:
-1. Используй СТРОГО только профессию "{profession}".
+1. Используй СТРОГО только профессию из данных вакансии.
 2. Сгенерируй ОДИН вариант названия (Title) и ОДИН вариант описания (Description).
-3. Название должно быть коротким, привлекательным и включать "{profession}".
+3. Название должно быть коротким (не более 50 символов), привлекательным и включать название профессии.
 4. КРИТИЧЕСКИ ВАЖНО: ЗАПРЕЩЕНО указывать зарплату, ставку или фразы вроде "выплаты каждый день" в НАЗВАНИИ (Title).
 5. **ЗАПРЕЩЕНО использовать символ "|" в тексте.**
 6. **Описание должно быть длинным (не менее 600 символов).**
-7. Текст должен быть живым, в стиле "{random_tone}". Выделяй выгоды.
+7. Текст должен быть живым, в тональности из данных вакансии. Выделяй выгоды.
 8. **УНИКАЛЬНОСТЬ:** В конце описания обязательно добавь одно из двух:
    - Либо интересный/необычный факт об этой профессии.
    - Либо очень теплое, нестандартное пожелание кандидату.
@@ -183,6 +161,83 @@ def get_generation_prompt(
 ПРАВИЛА ОФОРМЛЕНИЯ:
 - Описание должно содержать HTML теги: <p>, <strong>, <ul>, <li>.
 - Используй эмодзи.
-- ОТВЕТ В JSON: {{"title": "...", "description": "..."}}"""
+- ОТВЕТ В JSON: {"title": "...", "description": "..."}"""
+
 
-    return prompt
+def _store_context(store_type: str) -> str:
+    """Map store type code to a human-readable object type."""
+    if store_type in ("ГМ", "ЦП"):
+        return "Гипермаркет (крупный формат)"
+    if store_type == "МФ":
+        return "Магазин у дома / Супермаркет (малый формат)"
+    return "Магазин"
+
+
+def build_generation_messages(
+    profession: str,
+    address: str,
+    salary: str,
+    service: str,
+    store_type: str,
+) -> list[dict]:
+    """
+    Build chat messages for AI generation: the static SYSTEM_PROMPT followed
+    by a compact block with the per-vacancy fields.
+    Migrated from generateAiVacancyContent() in avito-vacancies-v3.gs
+    """
+    template = PLAIN_TEMPLATES.get(profession, {"duties": [], "advantages": []})
+    
+    random_duty = random.choice(template["duties"]) if template["duties"] else ""
+    random_adv = random.choice(template["advantages"]) if template["advantages"] else ""
+    random_tone = random.choice(TONES)
+    
+    variable = f"""ДАННЫЕ ВАКАНСИИ:
+Профессия: {profession}
+Тип объекта: {_store_context(store_type)}
+Услуга: {service or 'Не указана'}
+Локация: {address}
+Зарплата/Ставка: {salary}
+Тональность: {random_tone}
+Обязанности: {random_duty}
+Преимущества: {random_adv}"""
+    
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": variable},
+    ]
+
+
+# Human-readable names of the fields the validator may reject
+_FIELD_NAMES = {
+    "title": "название (title)",
+    "description": "описание (description)",
+}
+
+
+def build_fix_messages(
+    messages: list[dict],
+    content: dict,
+    field: str,
+    errors: list[str],
+) -> list[dict]:
+    """
+    Continue the generation dialogue with a request to rewrite one field.
+    The original messages are kept as-is so the provider prefix cache still
+    applies; only the rejected field is asked for.
+    """
+    previous = json.dumps(
+        {"title": content.get("title", ""), "description": content.get("description", "")},
+        ensure_ascii=False,
+    )
+    problems = "\n".join(f"- {error}" for error in errors)
+    
+    request = f"""Поле {_FIELD_NAMES.get(field, field)} не прошло проверку правил Авито:
+{problems}
+
+Перепиши ТОЛЬКО это поле, соблюдая все правила. Остальное не меняй.
+ОТВЕТ В JSON: {{"{field}": "..."}}"""
+    
+    return messages + [
+        {"role": "assistant", "content": previous},
+        {"role": "user", "content": request},
+    ]
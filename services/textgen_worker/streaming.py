@@ -0,0 +1,149 @@
+"""
+AdsGen 2.0 - Streaming Completion Helpers
+Server-sent-events reader for OpenAI-compatible chat completions and an
+incremental extractor that surfaces top-level JSON string fields as soon as
+they are complete
+"""
+
+import json
+import logging
+from typing import Iterator, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# SSE READER
+# ═══════════════════════════════════════════════════════════════════════════
+
+class StreamedCompletion:
+    """
+    Iterate over content deltas of a streamed chat completion.
+
+    Servers that ignore "stream": true and answer with a plain JSON body are
+    handled transparently (the whole message is yielded as one delta).
+    Token usage, when the provider sends it, is available as `.usage` once
+    iteration has finished.
+    """
+
+    def __init__(self, response: httpx.Response):
+        self.response = response
+        self.usage: Optional[dict] = None
+
+    def __iter__(self) -> Iterator[str]:
+        content_type = self.response.headers.get("content-type", "")
+
+        if "text/event-stream" not in content_type:
+            result = json.loads(self.response.read())
+            self.usage = result.get("usage")
+            yield result["choices"][0]["message"]["content"]
+            return
+
+        for line in self.response.iter_lines():
+            if not line.startswith("data:"):
+                continue
+
+            payload = line[5:].strip()
+            if payload == "[DONE]":
+                break
+
+            try:
+                chunk = json.loads(payload)
+            except json.JSONDecodeError:
+                logger.debug(f"Skipping malformed SSE chunk: {payload[:100]}")
+                continue
+
+            if chunk.get("usage"):
+                self.usage = chunk["usage"]
+
+            choices = chunk.get("choices") or []
+            if choices:
+                delta = (choices[0].get("delta") or {}).get("content")
+                if delta:
+                    yield delta
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# INCREMENTAL JSON FIELD EXTRACTOR
+# ═══════════════════════════════════════════════════════════════════════════
+
+class JsonFieldStream:
+    """
+    Incremental, brace- and string-aware scanner for the first JSON object
+    in a stream of text chunks.
+
+    feed() returns the (key, value) pairs of top-level string fields that
+    were completed by the chunk, so callers can act on "title" long before
+    "description" has finished streaming. Anything before the first "{"
+    (markdown fences, chatter) is ignored.
+    """
+
+    def __init__(self):
+        self.fields: dict[str, str] = {}
+        self.done = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._expect_key = False
+        self._string_is_key = False
+        self._key: Optional[str] = None
+        self._buf: list[str] = []
+
+    def feed(self, chunk: str) -> list[tuple[str, str]]:
+        completed = []
+
+        for ch in chunk:
+            if self.done:
+                break
+
+            if self._in_string:
+                if self._depth == 1:
+                    self._buf.append(ch)
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        text = _decode_json_string("".join(self._buf[:-1]))
+                        if self._string_is_key:
+                            self._key = text
+                        elif self._key is not None:
+                            self.fields[self._key] = text
+                            completed.append((self._key, text))
+                continue
+
+            if self._depth == 0:
+                if ch == "{":
+                    self._depth = 1
+                    self._expect_key = True
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_is_key = self._depth == 1 and self._expect_key
+                self._buf = []
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self.done = True
+            elif self._depth == 1:
+                if ch == ":":
+                    self._expect_key = False
+                elif ch == ",":
+                    self._expect_key = True
+
+        return completed
+
+
+def _decode_json_string(raw: str) -> str:
+    """Decode the body of a JSON string literal, tolerating raw control chars."""
+    try:
+        return json.loads(f'"{raw}"', strict=False)
+    except json.JSONDecodeError:
+        return raw
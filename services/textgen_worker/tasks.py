@@ -3,9 +3,12 @@ AdsGen 2.0 - TextGen Worker Tasks
 Celery tasks for generating vacancy titles and descriptions using DeepSeek AI
 """
 
-import json
 import logging
+import math
 import random
+import time
+from dataclasses import dataclass
+from types import SimpleNamespace
 from typing import Optional
 
 import httpx
@@ -17,7 +20,18 @@ from services.shared.config import get_settings
 from services.shared.database import get_sync_engine
 from services.shared.models.vacancy import Vacancy, VacancyStatus
 from services.shared.celery_app import celery_app
-from .prompts import get_generation_prompt, DESCRIPTION_TEMPLATES
+from services.shared.circuit_breaker import get_breaker
+from services.shared.demand import RatePacer, acquire_run_lock, forecast_demand, in_window, release_run_lock
+from services.shared.content_rules import MAX_TITLE_LENGTH, validate_text, validate_title
+from services.shared.html_validator import repair_html
+from services.shared.models.usage import UsageKind
+from services.shared.near_duplicates import add_to_index, find_near_duplicate, minhash, to_hex
+from services.shared.usage import cache_hit_tokens, record_usage
+from services.shared.worker_settings import get_worker_settings
+from .prompts import build_generation_messages, build_fix_messages, DESCRIPTION_TEMPLATES
+from .json_extract import extract_json_object
+from .streaming import JsonFieldStream, StreamedCompletion
+from .variant_cache import add_variant, take_variant, variant_key, variant_stock
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
@@ -25,6 +39,16 @@ settings = get_settings()
 # Sync engine from shared module
 sync_engine = get_sync_engine()
 
+# OpenAI-compatible endpoint of Polza.ai
+POLZA_API_URL = "https://api.polza.ai/api/v1/chat/completions"
+
+# Generation attempts before falling back to templates
+MAX_GENERATION_ATTEMPTS = 3
+
+# Off-peak pre-generation: length of one beat run, cached variants per key
+PREGEN_RUN_MINUTES = 14
+MAX_VARIANTS_PER_KEY = 20
+
 
 # ═══════════════════════════════════════════════════════════════════════════
 # MAIN TASK
@@ -50,21 +74,41 @@ def generate_vacancy_text(self, vacancy_id: str) -> dict:
             vacancy.status = VacancyStatus.TEXT_GENERATING
             session.commit()
             
-            # Generate content using AI
-            content = _generate_ai_content(vacancy)
+            # Use a pre-generated variant when one fits, otherwise generate
+            # with AI (either way already checked against the text rules)
+            content = _take_cached_variant(vacancy) or _generate_ai_content(vacancy) or {}
             
-            if content:
-                vacancy.title = content.get("title")
-                vacancy.description = content.get("description")
-                vacancy.status = VacancyStatus.TEXT_GENERATED
-            else:
-                # Fallback to template-based generation
-                vacancy.title = _generate_fallback_title(vacancy)
-                vacancy.description = _generate_fallback_description(vacancy)
-                vacancy.status = VacancyStatus.TEXT_GENERATED
+            # Fall back to templates for any field that is missing or still
+            # breaks the rules, so only publishable text reaches imagegen
+            errors = validate_text(content.get("title"), content.get("description"))
+            vacancy.title = content.get("title") if "title" not in errors else _generate_fallback_title(vacancy)
+            vacancy.description = (
+                content.get("description") if "description" not in errors
+                else _generate_fallback_description(vacancy)
+            )
+            
+            errors = validate_text(vacancy.title, vacancy.description)
+            if errors:
+                messages = [error for field_errors in errors.values() for error in field_errors]
+                vacancy.status = VacancyStatus.ERROR
+                vacancy.error_message = "; ".join(messages)
+                session.commit()
+                
+                logger.warning(f"Generated text for {vacancy_id} breaks Avito rules: {messages}")
+                return {
+                    "vacancy_id": vacancy_id,
+                    "status": "failed",
+                    "errors": messages,
+                }
             
+            signature = minhash(vacancy.description)
+            vacancy.description_minhash = to_hex(signature) if signature is not None else None
+            vacancy.status = VacancyStatus.TEXT_GENERATED
             session.commit()
             
+            if signature is not None:
+                add_to_index(vacancy.profession, vacancy.id, signature)
+            
             # Trigger image generation (unless in step mode)
             from services.shared.config import is_step_mode_enabled
             if not is_step_mode_enabled():
@@ -94,123 +138,317 @@ def generate_vacancy_text(self, vacancy_id: str) -> dict:
             return {"error": str(e)}
 
 
+# ═══════════════════════════════════════════════════════════════════════════
+# AI PROVIDER
+# ═══════════════════════════════════════════════════════════════════════════
+
+@dataclass(frozen=True)
+class TextProvider:
+    """Resolved chat-completions endpoint for one generation."""
+    name: str           # deepseek / polza / local (also the breaker name)
+    url: str
+    api_key: str
+    model: str
+    temperature: float
+    max_tokens: int     # -1 = let the server decide
+
+
+def _resolve_provider(worker_settings: Optional[dict] = None) -> TextProvider:
+    """
+    Build the provider from the textgen worker settings (admin panel).
+    DeepSeek credentials and URL come from the environment, so
+    DEEPSEEK_API_URL can point the worker at any OpenAI-compatible server
+    (e.g. benchmarks/fake_llm_server.py); "local" uses local_ai_url and
+    needs no key.
+    """
+    worker_settings = worker_settings or get_worker_settings("textgen")
+    name = worker_settings.get("ai_provider") or "deepseek"
+    temperature = float(worker_settings.get("temperature", 0.9))
+    max_tokens = int(worker_settings.get("max_tokens", 2000))
+    
+    if name == "polza":
+        return TextProvider(
+            name=name,
+            url=POLZA_API_URL,
+            api_key=worker_settings.get("polza_api_key", ""),
+            model=worker_settings.get("polza_model", ""),
+            temperature=temperature,
+            max_tokens=max_tokens,
+        )
+    
+    if name == "local":
+        return TextProvider(
+            name=name,
+            url=worker_settings.get("local_ai_url", ""),
+            api_key="",
+            model=worker_settings.get("local_ai_model", ""),
+            temperature=temperature,
+            max_tokens=max_tokens,
+        )
+    
+    return TextProvider(
+        name="deepseek",
+        url=settings.deepseek_api_url,
+        api_key=settings.deepseek_api_key,
+        model=settings.deepseek_model,
+        temperature=temperature,
+        max_tokens=max_tokens,
+    )
+
+
 # ═══════════════════════════════════════════════════════════════════════════
 # AI GENERATION
 # ═══════════════════════════════════════════════════════════════════════════
 
 def _generate_ai_content(vacancy: Vacancy) -> Optional[dict]:
     """
-    Generate title and description using DeepSeek API.
+    Generate title and description with the configured AI provider.
+    The completion is streamed and aborted as soon as the title breaks the
+    Avito title rules, so a bad generation is retried without paying for
+    the description. A parsed result that still breaks a rule gets only the
+    failing field regenerated, up to max_fix_attempts times; the returned
+    content may still be invalid and is checked again by the caller.
     """
-    if not settings.deepseek_api_key:
-        logger.warning("DeepSeek API key not configured, using fallback")
+    worker_settings = get_worker_settings("textgen")
+    provider = _resolve_provider(worker_settings)
+    if not provider.api_key and provider.name != "local":
+        logger.warning(f"{provider.name} API key not configured, using fallback")
         return None
     
-    # Build prompt
-    prompt = get_generation_prompt(
+    # Build prompt (static system message + per-vacancy block)
+    messages = build_generation_messages(
         profession=vacancy.profession,
-        address=f"{vacancy.city}, {vacancy.address}",
+        address=", ".join(part for part in (vacancy.city, vacancy.address) if part),
         salary="от 200 рублей/час",
         service=vacancy.service or "",
         store_type=vacancy.store_type or "",
     )
     
-    # Call DeepSeek API
+    for attempt in range(1, MAX_GENERATION_ATTEMPTS + 1):
+        ai_text, violation = _stream_completion(messages, vacancy, provider)
+        
+        if violation:
+            logger.info(f"Aborted generation attempt {attempt}/{MAX_GENERATION_ATTEMPTS}: {violation}")
+            continue
+        
+        if not ai_text:
+            return None
+        
+        # Parse JSON response with multiple fallback strategies
+        content = _parse_ai_response(ai_text)
+        
+        if not content:
+            logger.warning("Failed to parse AI response, using fallback")
+            return None
+        
+        _clean_content(content)
+        
+        # Validate required fields
+        if not content.get("title") or not content.get("description"):
+            logger.warning("AI response missing required fields (title or description)")
+            return None
+        
+        max_fix_attempts = int(worker_settings.get("max_fix_attempts", 2))
+        return _fix_rule_violations(messages, content, vacancy, provider, max_fix_attempts)
+    
+    logger.warning(f"All {MAX_GENERATION_ATTEMPTS} generation attempts produced invalid titles, using fallback")
+    return None
+
+
+def _clean_content(content: dict) -> None:
+    """
+    Strip whitespace and '|' from generated text fields in place and repair
+    the description markup (headings, unclosed tags...) instead of asking
+    the model again.
+    """
+    for field in ("title", "description"):
+        if isinstance(content.get(field), str):
+            content[field] = content[field].replace("|", "").strip()
+    if isinstance(content.get("description"), str):
+        content["description"] = repair_html(content["description"])
+
+
+def _content_errors(content: dict, vacancy: Vacancy) -> dict[str, list[str]]:
+    """Text rule errors per field, plus a near-duplicate check of the description."""
+    errors = validate_text(content.get("title"), content.get("description"))
+    
+    if "description" not in errors:
+        signature = minhash(content.get("description"))
+        duplicate = None
+        if signature is not None:
+            duplicate = find_near_duplicate(vacancy.profession, signature, exclude_id=vacancy.id)
+        if duplicate:
+            errors["description"] = [
+                f"Description nearly duplicates another ad (~{duplicate[1]:.0%} similar), "
+                f"rewrite it with different wording and structure"
+            ]
+    
+    return errors
+
+
+def _fix_rule_violations(
+    messages: list[dict],
+    content: dict,
+    vacancy: Vacancy,
+    provider: "TextProvider",
+    max_attempts: int,
+) -> dict:
+    """
+    Re-ask the model for each field that breaks the Avito text rules (or
+    whose description nearly duplicates another ad), keeping the field that
+    already passes.
+    """
+    for attempt in range(1, max_attempts + 1):
+        errors = _content_errors(content, vacancy)
+        if not errors:
+            break
+        
+        for field, field_errors in errors.items():
+            logger.info(f"Regenerating {field} ({attempt}/{max_attempts}): {field_errors}")
+            fix_messages = build_fix_messages(messages, content, field, field_errors)
+            ai_text, violation = _stream_completion(fix_messages, vacancy, provider)
+            
+            fixed = _parse_ai_response(ai_text) if ai_text else None
+            if fixed and isinstance(fixed.get(field), str):
+                _clean_content(fixed)
+                content[field] = fixed[field]
+    
+    return content
+
+
+def _stream_completion(
+    messages: list[dict],
+    vacancy: Optional[Vacancy] = None,
+    provider: Optional["TextProvider"] = None,
+) -> tuple[Optional[str], Optional[str]]:
+    """
+    Stream a chat completion from the configured provider.
+    Returns (ai_text, violation): ai_text is None on failure, violation is
+    set when the stream was cancelled because of a bad title.
+    Every request is recorded in generation_usage.
+    """
+    provider = provider or _resolve_provider()
+    
+    # Short-circuit to the template fallback while the provider is failing
+    breaker = get_breaker(provider.name)
+    token = breaker.allow_request()
+    if not token:
+        logger.warning(f"{provider.name} circuit is open, using fallback")
+        return None, None
+    
+    headers = {"Content-Type": "application/json"}
+    if provider.api_key:
+        headers["Authorization"] = f"Bearer {provider.api_key}"
+    
+    payload = {
+        "model": provider.model,
+        "messages": messages,
+        "temperature": provider.temperature,
+        "stream": True,
+        "stream_options": {"include_usage": True},
+    }
+    if provider.max_tokens > 0:
+        payload["max_tokens"] = provider.max_tokens
+    
+    started = time.monotonic()
     try:
         with httpx.Client(timeout=60.0) as client:
-            response = client.post(
-                settings.deepseek_api_url,
-                headers={
-                    "Authorization": f"Bearer {settings.deepseek_api_key}",
-                    "Content-Type": "application/json",
-                },
-                json={
-                    "model": settings.deepseek_model,
-                    "messages": [{"role": "user", "content": prompt}],
-                    "max_tokens": 2000,
-                    "temperature": 0.9,
-                },
-            )
-            
-            if response.status_code != 200:
-                logger.error(f"DeepSeek API error: {response.status_code} - {response.text}")
-                return None
-            
-            result = response.json()
-            ai_text = result["choices"][0]["message"]["content"].strip()
-            
-            # Parse JSON response with multiple fallback strategies
-            content = _parse_ai_response(ai_text)
-            
-            if not content:
-                logger.warning("Failed to parse AI response, using fallback")
-                return None
-            
-            # Clean up and validate content
-            if content.get("title"):
-                content["title"] = content["title"].replace("|", "").strip()[:100]
-            
-            if content.get("description"):
-                content["description"] = content["description"].replace("|", "").strip()
-            
-            # Validate required fields
-            if not content.get("title") or not content.get("description"):
-                logger.warning("AI response missing required fields (title or description)")
-                return None
-            
-            return content
+            with client.stream("POST", provider.url, headers=headers, json=payload) as response:
+                if response.status_code != 200:
+                    response.read()
+                    logger.error(f"{provider.name} API error: {response.status_code} - {response.text}")
+                    if response.status_code == 429 or response.status_code >= 500:
+                        breaker.record_failure(token)
+                    _record_text_usage(vacancy, provider, started, None, success=False)
+                    return None, None
+                
+                completion = StreamedCompletion(response)
+                fields = JsonFieldStream()
+                parts = []
+                
+                for delta in completion:
+                    parts.append(delta)
+                    for key, value in fields.feed(delta):
+                        if key == "title":
+                            violation = _check_title_early(value)
+                            if violation:
+                                # Leaving the context manager closes the stream
+                                breaker.record_success(time.monotonic() - started, token)
+                                _record_text_usage(vacancy, provider, started, completion.usage, success=False)
+                                return None, violation
+                
+                latency = time.monotonic() - started
+                breaker.record_success(latency, token)
+                _log_usage(provider, completion.usage, latency)
+                _record_text_usage(vacancy, provider, started, completion.usage, success=True)
+                return "".join(parts).strip(), None
             
+    except httpx.HTTPError as e:
+        logger.error(f"{provider.name} API call failed: {e}")
+        breaker.record_failure(token)
+        _record_text_usage(vacancy, provider, started, None, success=False)
+        return None, None
     except Exception as e:
-        logger.error(f"DeepSeek API call failed: {e}")
-        return None
+        logger.error(f"{provider.name} API call failed: {e}")
+        return None, None
+    finally:
+        # A probe that recorded no outcome (4xx, unexpected error) frees its slot
+        breaker.release(token)
+
+
+def _record_text_usage(
+    vacancy: Optional[Vacancy],
+    provider: "TextProvider",
+    started: float,
+    usage: Optional[dict],
+    success: bool,
+) -> None:
+    """Store token and latency accounting for one completion request."""
+    record_usage(
+        UsageKind.TEXT,
+        provider=provider.name,
+        latency=time.monotonic() - started,
+        vacancy=vacancy,
+        model=provider.model,
+        usage=usage,
+        success=success,
+    )
+
+
+def _log_usage(provider: "TextProvider", usage: Optional[dict], latency: float) -> None:
+    """Log token usage including provider-side prefix cache hits."""
+    if not usage:
+        logger.info(f"{provider.name} completion in {latency:.2f}s (no usage reported)")
+        return
+    
+    logger.info(
+        f"{provider.name} completion in {latency:.2f}s: "
+        f"prompt={usage.get('prompt_tokens')} "
+        f"cached={cache_hit_tokens(usage)} "
+        f"completion={usage.get('completion_tokens')}"
+    )
+
+
+def _check_title_early(title: str) -> Optional[str]:
+    """
+    Title rules run while the description is still streaming.
+    Returns the first violation, or None.
+    """
+    errors = validate_text(title.strip(), None).get("title")
+    return errors[0] if errors else None
 
 
 def _parse_ai_response(ai_text: str) -> Optional[dict]:
     """
-    Parse AI response with multiple fallback strategies.
+    Parse the JSON object out of an AI response.
     Returns parsed dict or None if parsing fails.
     """
-    if not ai_text:
-        return None
-    
-    # Strategy 1: Try to parse as-is JSON
-    try:
-        return json.loads(ai_text)
-    except json.JSONDecodeError:
-        pass
-    
-    # Strategy 2: Remove markdown code blocks
-    cleaned = ai_text
-    for marker in ["```json", "```", "```python", "```javascript"]:
-        if marker in cleaned:
-            # Extract content between markers
-            parts = cleaned.split(marker)
-            if len(parts) >= 3:
-                cleaned = parts[1].strip()
-            else:
-                cleaned = cleaned.replace(marker, "").strip()
-    
-    # Strategy 3: Try to find JSON object/array
-    import re
-    json_pattern = r'\{[^{}]*\{[^{}]*\}[^{}]*\}|\{[^{}]*\}'
-    matches = re.findall(json_pattern, cleaned, re.DOTALL)
+    content = extract_json_object(ai_text)
     
-    for match in matches:
-        try:
-            return json.loads(match)
-        except json.JSONDecodeError:
-            continue
-    
-    # Strategy 4: Try to parse as single-line JSON without formatting
-    try:
-        # Remove newlines and extra spaces
-        single_line = ' '.join(cleaned.split())
-        return json.loads(single_line)
-    except json.JSONDecodeError:
-        pass
+    if content is None and ai_text:
+        logger.error(f"Failed to parse AI response: {ai_text[:200]}...")
     
-    logger.error(f"Failed to parse AI response after all strategies: {ai_text[:200]}...")
-    return None
+    return content
 
 
 # ═══════════════════════════════════════════════════════════════════════════
@@ -218,7 +456,7 @@ def _parse_ai_response(ai_text: str) -> Optional[dict]:
 # ═══════════════════════════════════════════════════════════════════════════
 
 def _generate_fallback_title(vacancy: Vacancy) -> str:
-    """Generate a simple title without AI."""
+    """Generate a simple title without AI that passes the Avito title rules."""
     bases = [
         vacancy.profession,
         f"{vacancy.profession} в магазин",
@@ -228,11 +466,13 @@ def _generate_fallback_title(vacancy: Vacancy) -> str:
     suffixes = [
         "",
         " без опыта",
-        ", ежедневные выплаты",
+        ", гибкий график",
     ]
     
-    title = random.choice(bases) + random.choice(suffixes)
-    return title[:100]
+    candidates = [base + suffix for base in bases for suffix in suffixes]
+    valid = [title for title in candidates if not validate_title(title)]
+    
+    return random.choice(valid) if valid else vacancy.profession[:MAX_TITLE_LENGTH]
 
 
 def _generate_fallback_description(vacancy: Vacancy) -> str:
@@ -249,11 +489,153 @@ def _generate_fallback_description(vacancy: Vacancy) -> str:
     <p><strong>{vacancy.profession}</strong></p>
     <p>Приглашаем в нашу команду на позицию <strong>{vacancy.profession}</strong>!</p>
     <p>Адрес: {vacancy.city}, {vacancy.address}</p>
-    <h3>Обязанности:</h3>
+    <p>Официальное оформление, обучение на месте и поддержка наставника с первого дня.</p>
+    <p><strong>Обязанности:</strong></p>
     {duty}
-    <h3>Мы предлагаем:</h3>
+    <p><strong>Мы предлагаем:</strong></p>
     {adv}
-    <p>Звоните или пишите прямо сейчас! 📞</p>
+    <p>Откликайтесь прямо сейчас — ждём вас в команде! 🤝</p>
     """.strip()
     
     return description
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# NEAR-DUPLICATE SCAN
+# ═══════════════════════════════════════════════════════════════════════════
+
+@celery_app.task
+def scan_near_duplicates(profession: Optional[str] = None, regenerate: bool = False) -> dict:
+    """
+    Rebuild the near-duplicate index from the existing corpus.
+    Vacancies are visited oldest first; a description at least
+    SIMILARITY_THRESHOLD similar to an earlier one of the same profession is
+    reported as a duplicate (and re-queued for text generation if
+    `regenerate`). Missing description_minhash values are backfilled.
+    """
+    from services.shared.near_duplicates import MinHashIndex, clear_index, index_many
+    
+    query = (
+        select(Vacancy)
+        .where(Vacancy.description.isnot(None), Vacancy.status != VacancyStatus.ARCHIVED)
+        .order_by(Vacancy.profession, Vacancy.created_at)
+        .execution_options(yield_per=500)
+    )
+    if profession:
+        query = query.where(Vacancy.profession == profession)
+    
+    clear_index(profession)
+    
+    scanned = 0
+    duplicates = []
+    indexes: dict[str, MinHashIndex] = {}
+    
+    with Session(sync_engine) as session:
+        for vacancy in session.scalars(query):
+            scanned += 1
+            signature = minhash(vacancy.description)
+            if signature is None:
+                continue
+            
+            if vacancy.description_minhash != to_hex(signature):
+                vacancy.description_minhash = to_hex(signature)
+            
+            index = indexes.setdefault(vacancy.profession, MinHashIndex())
+            match = index.find(signature)
+            if match:
+                duplicates.append({"vacancy_id": vacancy.id, "duplicate_of": match[0], "similarity": match[1]})
+            index.add(vacancy.id, signature)
+        
+        session.commit()
+    
+    for name, index in indexes.items():
+        index_many(name, index.items())
+    
+    if regenerate:
+        for duplicate in duplicates:
+            generate_vacancy_text.delay(duplicate["vacancy_id"])
+    
+    logger.info(f"Near-duplicate scan: {scanned} descriptions, {len(duplicates)} duplicates")
+    
+    return {
+        "scanned": scanned,
+        "duplicates": len(duplicates),
+        "regenerated": len(duplicates) if regenerate else 0,
+        "pairs": duplicates[:100],
+    }
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# OFF-PEAK PRE-GENERATION
+# ═══════════════════════════════════════════════════════════════════════════
+
+def _take_cached_variant(vacancy: Vacancy) -> Optional[dict]:
+    """A pre-generated variant for the vacancy's key that still passes the checks."""
+    key = variant_key(vacancy.profession, vacancy.store_type, vacancy.service, vacancy.city)
+    for _ in range(3):
+        content = take_variant(key)
+        if not content:
+            return None
+        if not _content_errors(content, vacancy):
+            logger.info(f"Using pre-generated text for {vacancy.id}")
+            return content
+    return None
+
+
+@celery_app.task(ignore_result=True)
+def pregenerate_texts() -> dict:
+    """
+    Fill the text variant cache during the off-peak window (beat, every
+    15 min). Keys are visited in order of forecast demand, each topped up
+    to its expected daily need; calls are paced to pregen_per_minute so the
+    provider rate limit is left alone.
+    """
+    worker_settings = get_worker_settings("textgen")
+    window = worker_settings.get("pregen_window", "")
+    if not worker_settings.get("pregen_enabled") or not in_window(window):
+        return {"status": "skipped"}
+    
+    provider = _resolve_provider(worker_settings)
+    if not provider.api_key and provider.name != "local":
+        return {"status": "skipped"}
+    
+    if not acquire_run_lock("textgen", PREGEN_RUN_MINUTES * 60):
+        return {"status": "running"}
+    
+    per_minute = float(worker_settings.get("pregen_per_minute", 10))
+    budget = int(per_minute * PREGEN_RUN_MINUTES)
+    pacer = RatePacer(per_minute)
+    generated = failures = 0
+    
+    try:
+        with Session(sync_engine) as session:
+            demand = forecast_demand(
+                session, [Vacancy.profession, Vacancy.store_type, Vacancy.service, Vacancy.city]
+            )
+        
+        for (profession, store_type, service, city), expected in demand:
+            key = variant_key(profession, store_type, service, city)
+            missing = min(math.ceil(expected), MAX_VARIANTS_PER_KEY) - variant_stock(key)
+            stub = SimpleNamespace(
+                id=None, import_batch_id=None, profession=profession,
+                store_type=store_type, service=service, city=city, address="",
+            )
+            
+            for _ in range(max(missing, 0)):
+                if generated >= budget or failures >= 3 or not in_window(window):
+                    return {"status": "done", "generated": generated}
+                
+                pacer.wait()
+                content = _generate_ai_content(stub)
+                if not content or validate_text(content.get("title"), content.get("description")):
+                    failures += 1
+                    continue
+                
+                failures = 0
+                add_variant(key, {"title": content["title"], "description": content["description"]})
+                generated += 1
+        
+        return {"status": "done", "generated": generated}
+    finally:
+        release_run_lock("textgen")
+        logger.info(f"Text pre-generation: {generated} variants cached")
@@ -0,0 +1,64 @@
+"""
+AdsGen 2.0 - Text Variant Cache
+Pre-generated title/description pairs per (profession, store type,
+service, city), filled off-peak and handed out to vacancies one at a time
+"""
+
+import hashlib
+import json
+import logging
+from typing import Optional
+
+import redis
+
+from services.shared.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Redis key prefix for the variant lists
+VARIANT_PREFIX = "adsgen:text_variants:"
+
+# Unused variants are dropped after a week (prompts and rules move on)
+VARIANT_TTL = 7 * 24 * 3600
+
+
+def _get_redis_client() -> redis.Redis:
+    """Get Redis client."""
+    return redis.from_url(settings.redis_url, socket_timeout=1.0, socket_connect_timeout=1.0)
+
+
+def variant_key(profession: str, store_type: Optional[str], service: Optional[str], city: Optional[str]) -> str:
+    """Cache key of vacancies whose texts are interchangeable."""
+    raw = "|".join([profession or "", store_type or "", service or "", city or ""])
+    return f"{VARIANT_PREFIX}{hashlib.md5(raw.encode()).hexdigest()}"
+
+
+def variant_stock(key: str) -> int:
+    """Number of cached variants for a key."""
+    try:
+        return _get_redis_client().llen(key)
+    except Exception as e:
+        logger.debug(f"Text variant cache unavailable ({e})")
+        return 0
+
+
+def add_variant(key: str, content: dict) -> None:
+    """Append a generated {"title", "description"} pair."""
+    try:
+        pipe = _get_redis_client().pipeline()
+        pipe.rpush(key, json.dumps(content, ensure_ascii=False))
+        pipe.expire(key, VARIANT_TTL)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to cache text variant: {e}")
+
+
+def take_variant(key: str) -> Optional[dict]:
+    """Remove and return the oldest variant for a key, if any."""
+    try:
+        raw = _get_redis_client().lpop(key)
+    except Exception as e:
+        logger.debug(f"Text variant cache unavailable ({e})")
+        return None
+    return json.loads(raw) if raw else None
@@ -3,18 +3,41 @@ AdsGen 2.0 - Validation Worker Tasks
 Celery tasks for validating vacancy content against Avito rules
 """
 
+import asyncio
 import logging
-import re
+import time
+from collections import defaultdict
 from typing import Optional
 
 import httpx
 from celery import shared_task
+from sqlalchemy import bindparam, or_, select, update
 from sqlalchemy.orm import Session
 
 from services.shared.config import get_settings
 from services.shared.database import get_sync_engine
 from services.shared.models.vacancy import Vacancy, VacancyStatus
+from services.shared.models.image_asset import ImageAsset
 from services.shared.celery_app import celery_app
+from services.shared.content_rules import (
+    MAX_DESCRIPTION_LENGTH,
+    MAX_TITLE_LENGTH,
+    MIN_DESCRIPTION_LENGTH,
+    STOP_WORDS,
+    check_stop_words,
+    validate_description,
+    validate_image_metadata,
+    validate_title,
+)
+from services.shared.validation_rules import (
+    AdContent,
+    RuleStats,
+    content_hash,
+    get_rule_config,
+    rules_version,
+    run_rules,
+)
+from services.validation_worker.url_cache import cached_check, get_cached, store
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
@@ -22,49 +45,16 @@ settings = get_settings()
 # Sync engine from shared module
 sync_engine = get_sync_engine()
 
-
-# ═══════════════════════════════════════════════════════════════════════════
-# AVITO RULES & STOP WORDS
-# ═══════════════════════════════════════════════════════════════════════════
-
-# Words that are prohibited in Avito ads
-STOP_WORDS = [
-    # Discrimination
-    "только мужчины",
-    "только женщины",
-    "славянская внешность",
-    "без вредных привычек",
-    "молодых",
-    "до 35 лет",
-    "граждане рф",
-    
-    # Health discrimination (must not require health certificates in ads)
-    "медицинская справка",
-    "хорошее здоровье",
-    "крепкое здоровье",
-    "физически здоровым",
-    "отсутствие инвалидности",
-    
-    # Prohibited content
-    "гарантированный заработок",
-    "пассивный доход",
-    "без вложений",
-    "легкие деньги",
-    "высокий доход без опыта",
-    
-    # Contact info in title (should be in dedicated fields)
-    "телефон",
-    "звоните",
-    "пишите в",
-    "whatsapp",
-    "telegram",
-    "viber",
+# Bulk revalidation: statuses revisited by default, rows per page and
+# image requests in flight
+BULK_STATUSES = [
+    VacancyStatus.IMAGE_GENERATED.value,
+    VacancyStatus.VALIDATED.value,
+    VacancyStatus.PUBLISHED.value,
+    VacancyStatus.ERROR.value,
 ]
-
-# Maximum lengths
-MAX_TITLE_LENGTH = 50
-MIN_DESCRIPTION_LENGTH = 300
-MAX_DESCRIPTION_LENGTH = 10000
+BULK_PAGE_SIZE = 1000
+BULK_CONCURRENCY = 50
 
 
 # ═══════════════════════════════════════════════════════════════════════════
@@ -89,29 +79,31 @@ def validate_vacancy_content(self, vacancy_id: str) -> dict:
             vacancy.status = VacancyStatus.VALIDATING
             session.commit()
             
-            errors = []
-            warnings = []
-            
-            # 1. Validate title
-            title_errors = _validate_title(vacancy.title)
-            errors.extend(title_errors)
-            
-            # 2. Validate description
-            desc_errors, desc_warnings = _validate_description(vacancy.description)
-            errors.extend(desc_errors)
-            warnings.extend(desc_warnings)
-            
-            # 3. Validate image URL
-            image_errors = _validate_image(vacancy.image_url)
-            errors.extend(image_errors)
+            config = get_rule_config()
+            version = rules_version(config)
+            digest = content_hash(vacancy.title, vacancy.description, vacancy.image_url, vacancy.image_hash)
+            cached = vacancy.validated_hash == digest and vacancy.validated_rules_version == version
             
-            # 4. Check for stop words
-            stop_word_errors = _check_stop_words(vacancy.title, vacancy.description)
-            errors.extend(stop_word_errors)
+            if cached:
+                # Same content already passed this rule set
+                errors, warnings = [], []
+            else:
+                # Rules from the registry; the image (recorded metadata if
+                # post-processed, cached HEAD otherwise) only if its rule is on
+                ad = AdContent(
+                    vacancy.title,
+                    vacancy.description,
+                    image=lambda: _validate_image(vacancy.image_url, _find_asset(session, vacancy)),
+                )
+                stats = RuleStats()
+                errors, warnings = run_rules(ad, config, stats)
+                stats.flush()
             
             if errors:
                 vacancy.status = VacancyStatus.ERROR
                 vacancy.error_message = "; ".join(errors)
+                vacancy.validated_hash = None
+                vacancy.validated_rules_version = None
                 session.commit()
                 
                 logger.warning(f"Validation failed for {vacancy_id}: {errors}")
@@ -125,6 +117,8 @@ def validate_vacancy_content(self, vacancy_id: str) -> dict:
             else:
                 vacancy.status = VacancyStatus.VALIDATED
                 vacancy.error_message = None
+                vacancy.validated_hash = digest
+                vacancy.validated_rules_version = version
                 session.commit()
                 
                 # Trigger publishing (unless in step mode)
@@ -140,6 +134,7 @@ def validate_vacancy_content(self, vacancy_id: str) -> dict:
                     "vacancy_id": vacancy_id,
                     "status": "passed",
                     "warnings": warnings,
+                    "cached": cached,
                 }
                 
         except Exception as e:
@@ -152,85 +147,286 @@ def validate_vacancy_content(self, vacancy_id: str) -> dict:
 
 
 # ═══════════════════════════════════════════════════════════════════════════
-# VALIDATION FUNCTIONS
+# BULK VALIDATION
 # ═══════════════════════════════════════════════════════════════════════════
 
-def _validate_title(title: Optional[str]) -> list[str]:
-    """Validate ad title."""
-    errors = []
+@celery_app.task
+def validate_bulk(
+    statuses: Optional[list[str]] = None,
+    page_size: int = BULK_PAGE_SIZE,
+    concurrency: int = BULK_CONCURRENCY,
+    only_changed: bool = False,
+    since_version: Optional[str] = None,
+) -> dict:
+    """
+    Revalidate the catalogue (e.g. after a rule change) in one task.
+    Vacancies are read in primary key pages; text rules run in-process,
+    images without recorded metadata are checked concurrently (at most
+    `concurrency` requests in flight, cached URLs skipped) and each page is
+    written back with one bulk UPDATE. Published vacancies that still pass
+    stay published; newly passed ones go on to publishing as usual.
     
-    if not title:
-        errors.append("Title is missing")
-        return errors
+    `only_changed` skips ads whose content already passed the current rule
+    set; `since_version` limits the run to ads last passed under that rules
+    version.
+    """
+    from services.shared.config import is_step_mode_enabled
     
-    if len(title) > MAX_TITLE_LENGTH:
-        errors.append(f"Title too long: {len(title)} chars (max {MAX_TITLE_LENGTH})")
+    statuses = [VacancyStatus(s) for s in (statuses or BULK_STATUSES)]
+    started = time.monotonic()
+    checked = passed = failed = skipped = 0
+    newly_validated = []
+    last_id = ""
     
-    if len(title) < 10:
-        errors.append("Title too short (min 10 characters)")
+    config = get_rule_config()
+    version = rules_version(config)
+    stats = RuleStats()
     
-    # Check for salary in title (not allowed)
-    salary_patterns = [
-        r'\d+\s*(руб|₽|р\.)',
-        r'от\s+\d+',
-        r'до\s+\d+\s*(руб|₽)',
-        r'зарплата',
-        r'оклад',
-        r'выплат',
-    ]
-    for pattern in salary_patterns:
-        if re.search(pattern, title, re.IGNORECASE):
-            errors.append("Title should not contain salary information")
-            break
+    query = (
+        select(
+            Vacancy.id, Vacancy.status, Vacancy.title, Vacancy.description,
+            Vacancy.image_url, Vacancy.image_hash,
+            Vacancy.validated_hash, Vacancy.validated_rules_version,
+        )
+        .where(
+            Vacancy.status.in_(statuses),
+            Vacancy.description.isnot(None),
+            Vacancy.image_url.isnot(None),
+        )
+        .order_by(Vacancy.id)
+        .limit(page_size)
+    )
+    if since_version:
+        query = query.where(Vacancy.validated_rules_version == since_version)
+    
+    with Session(sync_engine) as session:
+        while True:
+            rows = session.execute(query.where(Vacancy.id > last_id)).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            
+            pending = []
+            for row in rows:
+                digest = content_hash(row.title, row.description, row.image_url, row.image_hash)
+                if only_changed and row.validated_hash == digest and row.validated_rules_version == version:
+                    skipped += 1
+                else:
+                    pending.append((row, digest))
+            
+            image_errors = {}
+            if pending and config["image"] != "off":
+                image_errors = _validate_images_bulk(session, [row for row, _ in pending], concurrency)
+            
+            updates = []
+            promoted = []
+            for row, digest in pending:
+                ad = AdContent(row.title, row.description, image=lambda errors=image_errors.get(row.id, []): errors)
+                errors, _ = run_rules(ad, config, stats)
+                values = {}
+                
+                if errors:
+                    failed += 1
+                    values.update(
+                        status=VacancyStatus.ERROR, error_message="; ".join(errors),
+                        validated_hash=None, validated_rules_version=None,
+                    )
+                    updates.append({"vacancy_id": row.id, "read_status": row.status, **values})
+                    continue
+                
+                passed += 1
+                if (row.validated_hash, row.validated_rules_version) != (digest, version):
+                    values.update(validated_hash=digest, validated_rules_version=version)
+                if row.status != VacancyStatus.PUBLISHED:
+                    values.update(status=VacancyStatus.VALIDATED, error_message=None)
+                if values:
+                    params = {"vacancy_id": row.id, "read_status": row.status, **values}
+                    if row.status in (VacancyStatus.VALIDATED, VacancyStatus.PUBLISHED):
+                        updates.append(params)
+                    else:
+                        promoted.append(params)
+            
+            _write_unchanged(session, updates)
+            # Written one by one: only rows still as read go on to publishing
+            for params in promoted:
+                if session.execute(_guarded_update(), params).rowcount:
+                    newly_validated.append(params["vacancy_id"])
+            session.commit()
+            stats.flush()
+            checked += len(pending)
+            logger.info(f"Bulk validation: {checked} checked ({failed} failed), {skipped} unchanged")
     
-    # Check for pipe character
-    if "|" in title:
-        errors.append("Title contains prohibited character '|'")
+    if newly_validated and not is_step_mode_enabled():
+        from services.publisher_worker.tasks import publish_vacancy
+        for vacancy_id in newly_validated:
+            publish_vacancy.delay(vacancy_id)
     
-    return errors
+    elapsed = time.monotonic() - started
+    logger.info(
+        f"Bulk validation done: {checked} vacancies in {elapsed:.1f}s, {passed} passed, "
+        f"{failed} failed, {skipped} unchanged"
+    )
+    
+    return {
+        "checked": checked,
+        "passed": passed,
+        "failed": failed,
+        "skipped": skipped,
+        "newly_validated": len(newly_validated),
+        "rules_version": version,
+        "seconds": round(elapsed, 1),
+    }
 
 
-def _validate_description(description: Optional[str]) -> tuple[list[str], list[str]]:
-    """Validate ad description."""
-    errors = []
-    warnings = []
-    
-    if not description:
-        errors.append("Description is missing")
-        return errors, warnings
+def _guarded_update():
+    """UPDATE of one vacancy that applies only while its status is the one read."""
+    table = Vacancy.__table__
+    return update(table).where(
+        table.c.id == bindparam("vacancy_id"),
+        table.c.status == bindparam("read_status"),
+    )
+
+
+def _write_unchanged(session: Session, updates: list[dict]) -> None:
+    """
+    Bulk-write page results, skipping vacancies whose status changed since
+    the page was read (published, or re-driven by a worker meanwhile).
+    One executemany per set of written columns.
+    """
+    groups: dict[tuple, list[dict]] = defaultdict(list)
+    for params in updates:
+        groups[tuple(sorted(params))].append(params)
+    for params in groups.values():
+        session.execute(_guarded_update(), params)
+
+
+def _validate_images_bulk(session: Session, rows: list, concurrency: int) -> dict[str, list[str]]:
+    """Image errors per vacancy id: metadata where recorded, one request per unchecked URL otherwise."""
+    hashes = {row.image_hash for row in rows if row.image_hash}
+    urls = {row.image_url for row in rows if not row.image_hash}
     
-    # Length checks
-    if len(description) < MIN_DESCRIPTION_LENGTH:
-        errors.append(f"Description too short: {len(description)} chars (min {MIN_DESCRIPTION_LENGTH})")
+    by_hash: dict[str, ImageAsset] = {}
+    by_url: dict[str, ImageAsset] = {}
+    if hashes:
+        by_hash = {a.sha256: a for a in session.scalars(select(ImageAsset).where(ImageAsset.sha256.in_(hashes)))}
+    if urls:
+        for asset in session.scalars(
+            select(ImageAsset).where(or_(ImageAsset.public_url.in_(urls), ImageAsset.source_url.in_(urls)))
+        ):
+            for url in (asset.public_url, asset.source_url):
+                if url:
+                    by_url.setdefault(url, asset)
     
-    if len(description) > MAX_DESCRIPTION_LENGTH:
-        errors.append(f"Description too long: {len(description)} chars (max {MAX_DESCRIPTION_LENGTH})")
+    results: dict[str, list[str]] = {}
+    pending: dict[str, list[str]] = {}
+    for row in rows:
+        asset = by_hash.get(row.image_hash) if row.image_hash else by_url.get(row.image_url)
+        errors = _validate_image_offline(row.image_url, asset)
+        if errors is None:
+            errors = get_cached(row.image_url)
+        if errors is None:
+            pending.setdefault(row.image_url, []).append(row.id)
+        else:
+            results[row.id] = errors
     
-    # Check for pipe character
-    if "|" in description:
-        warnings.append("Description contains '|' character - may cause issues")
+    if pending:
+        checked = asyncio.run(_check_image_urls(list(pending), concurrency))
+        for url, errors in checked.items():
+            store(url, errors)
+            for vacancy_id in pending[url]:
+                results[vacancy_id] = errors
     
-    # Check for broken HTML
-    open_tags = len(re.findall(r'<[^/][^>]*>', description))
-    close_tags = len(re.findall(r'</[^>]+>', description))
-    if abs(open_tags - close_tags) > 3:
-        warnings.append("Description may have unbalanced HTML tags")
+    return results
+
+
+async def _check_image_urls(urls: list[str], concurrency: int) -> dict[str, list[str]]:
+    """HEAD many image URLs over one pooled client, `concurrency` at a time."""
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
     
-    return errors, warnings
+    async with httpx.AsyncClient(timeout=10.0, limits=limits) as client:
+        async def check(url: str) -> tuple[str, list[str]]:
+            async with semaphore:
+                try:
+                    response = await client.head(url, follow_redirects=True)
+                except httpx.TimeoutException:
+                    return url, ["Image URL timed out"]
+                except Exception as e:
+                    return url, [f"Cannot verify image: {e}"]
+                return url, _response_errors(url, response)
+        
+        return dict(await asyncio.gather(*(check(url) for url in urls)))
 
 
-def _validate_image(image_url: Optional[str]) -> list[str]:
+# ═══════════════════════════════════════════════════════════════════════════
+# VALIDATION FUNCTIONS
+# ═══════════════════════════════════════════════════════════════════════════
+
+def _validate_title(title: Optional[str]) -> list[str]:
+    """Validate ad title (see shared.content_rules)."""
+    return validate_title(title)
+
+
+def _validate_description(description: Optional[str]) -> tuple[list[str], list[str]]:
+    """Validate ad description (see shared.content_rules)."""
+    return validate_description(description)
+
+
+def _find_asset(session: Session, vacancy: Vacancy) -> Optional[ImageAsset]:
+    """Recorded metadata of the vacancy's image, by hash or by a known URL."""
+    if vacancy.image_hash:
+        return session.get(ImageAsset, vacancy.image_hash)
+    if not vacancy.image_url:
+        return None
+    return session.scalars(
+        select(ImageAsset).where(
+            or_(ImageAsset.public_url == vacancy.image_url, ImageAsset.source_url == vacancy.image_url)
+        )
+    ).first()
+
+
+def _validate_image(image_url: Optional[str], asset: Optional[ImageAsset] = None) -> list[str]:
     """Validate image URL accessibility."""
-    errors = []
+    errors = _validate_image_offline(image_url, asset)
+    if errors is not None:
+        return errors
     
+    # Shared images (fallback, library variants) are checked once per TTL
+    return cached_check(image_url, _check_image_url)
+
+
+def _validate_image_offline(image_url: Optional[str], asset: Optional[ImageAsset] = None) -> Optional[list[str]]:
+    """Image errors decidable without a request (None = URL needs a check)."""
     if not image_url:
-        errors.append("Image URL is missing")
-        return errors
+        return ["Image URL is missing"]
     
     # Check URL format
     if not image_url.startswith(("http://", "https://")):
-        errors.append("Invalid image URL format")
-        return errors
+        return ["Invalid image URL format"]
+    
+    # Post-processed images were downloaded and checked once already
+    if asset is not None:
+        return validate_image_metadata(asset.width, asset.height, asset.mime)
+    
+    return None
+
+
+def _check_image_url(image_url: str) -> list[str]:
+    """HEAD the image URL and check that it serves an image."""
+    try:
+        with httpx.Client(timeout=10.0) as client:
+            response = client.head(image_url, follow_redirects=True)
+    except httpx.TimeoutException:
+        return ["Image URL timed out"]
+    except Exception as e:
+        return [f"Cannot verify image: {e}"]
+    
+    return _response_errors(image_url, response)
+
+
+def _response_errors(image_url: str, response: httpx.Response) -> list[str]:
+    """Errors of a HEAD response for an image URL."""
+    errors = []
     
     # Skip content-type check for known image hosting services
     # (they may return HTML preview pages instead of direct image)
@@ -243,40 +439,22 @@ def _validate_image(image_url: Optional[str]) -> list[str]:
     
     is_trusted = any(host in image_url for host in trusted_hosts)
     
-    # Check image accessibility (HEAD request)
-    try:
-        with httpx.Client(timeout=10.0) as client:
-            response = client.head(image_url, follow_redirects=True)
-            
-            if response.status_code != 200:
-                # For trusted hosts, 302/303 redirects are OK
-                if is_trusted and response.status_code in [301, 302, 303, 307, 308]:
-                    pass  # OK, redirect is expected
-                else:
-                    errors.append(f"Image not accessible (HTTP {response.status_code})")
-            else:
-                # Check content type only for untrusted sources
-                if not is_trusted:
-                    content_type = response.headers.get("content-type", "")
-                    if not content_type.startswith("image/"):
-                        errors.append(f"URL does not point to an image: {content_type}")
-                    
-    except httpx.TimeoutException:
-        errors.append("Image URL timed out")
-    except Exception as e:
-        errors.append(f"Cannot verify image: {e}")
+    if response.status_code != 200:
+        # For trusted hosts, 302/303 redirects are OK
+        if is_trusted and response.status_code in [301, 302, 303, 307, 308]:
+            pass  # OK, redirect is expected
+        else:
+            errors.append(f"Image not accessible (HTTP {response.status_code})")
+    else:
+        # Check content type only for untrusted sources
+        if not is_trusted:
+            content_type = response.headers.get("content-type", "")
+            if not content_type.startswith("image/"):
+                errors.append(f"URL does not point to an image: {content_type}")
     
     return errors
 
 
 def _check_stop_words(title: Optional[str], description: Optional[str]) -> list[str]:
-    """Check for prohibited stop words."""
-    errors = []
-    
-    combined_text = f"{title or ''} {description or ''}".lower()
-    
-    for word in STOP_WORDS:
-        if word.lower() in combined_text:
-            errors.append(f"Contains prohibited phrase: '{word}'")
-    
-    return errors
+    """Check for prohibited stop words (see shared.content_rules)."""
+    return check_stop_words(title, description)
@@ -0,0 +1,194 @@
+"""
+AdsGen 2.0 - Image URL Check Cache
+Results of image URL reachability checks, cached per URL in process and in
+Redis (long TTL for reachable images, short for failures), with
+single-flight so concurrent validations of one URL send one request
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import redis
+
+from services.shared.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Redis key prefixes for results and in-flight checks
+URL_CHECK_PREFIX = "adsgen:image_check:"
+URL_CHECK_LOCK_PREFIX = "adsgen:image_check_lock:"
+
+# Reachable images rarely disappear; failures may be transient
+POSITIVE_TTL = 6 * 3600
+NEGATIVE_TTL = 10 * 60
+
+# A check holds the lock at most this long (HEAD timeout + margin)
+CHECK_LOCK_TTL = 15
+WAIT_POLL_SECONDS = 0.2
+
+MEMORY_CACHE_SIZE = 4096
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# CACHES
+# ═══════════════════════════════════════════════════════════════════════════
+
+class _TTLCache:
+    """Small thread-safe LRU whose entries expire."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: OrderedDict[str, tuple[float, list[str]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[list[str]]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return list(entry[1])
+
+    def put(self, key: str, value: list[str], ttl: float) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, list(value))
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+_memory_cache = _TTLCache(MEMORY_CACHE_SIZE)
+
+
+def _get_redis_client() -> redis.Redis:
+    """Get Redis client."""
+    return redis.from_url(settings.redis_url, socket_timeout=1.0, socket_connect_timeout=1.0)
+
+
+def _digest(url: str) -> str:
+    return hashlib.md5(url.encode()).hexdigest()
+
+
+def _ttl(errors: list[str]) -> int:
+    return NEGATIVE_TTL if errors else POSITIVE_TTL
+
+
+def get_cached(url: str) -> Optional[list[str]]:
+    """Cached errors of a URL ([] = reachable), None if unknown."""
+    errors = _memory_cache.get(url)
+    if errors is not None:
+        return errors
+
+    try:
+        client = _get_redis_client()
+        pipe = client.pipeline()
+        pipe.get(f"{URL_CHECK_PREFIX}{_digest(url)}")
+        pipe.ttl(f"{URL_CHECK_PREFIX}{_digest(url)}")
+        raw, ttl = pipe.execute()
+    except Exception as e:
+        logger.debug(f"Image check cache unavailable ({e})")
+        return None
+    if raw is None:
+        return None
+
+    errors = json.loads(raw)
+    _memory_cache.put(url, errors, max(ttl, 1))
+    return errors
+
+
+def store(url: str, errors: list[str]) -> None:
+    """Remember a check result for POSITIVE_TTL or NEGATIVE_TTL."""
+    ttl = _ttl(errors)
+    _memory_cache.put(url, errors, ttl)
+    try:
+        _get_redis_client().setex(f"{URL_CHECK_PREFIX}{_digest(url)}", ttl, json.dumps(errors, ensure_ascii=False))
+    except Exception as e:
+        logger.debug(f"Failed to cache image check for {url}: {e}")
+
+
+def clear_memory_cache() -> None:
+    _memory_cache.clear()
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# SINGLE-FLIGHT
+# ═══════════════════════════════════════════════════════════════════════════
+
+def acquire_check(url: str) -> Optional[str]:
+    """
+    Claim the check of a URL. Returns the lock token, None when another
+    worker holds the lock ("" when Redis is down: check alone).
+    """
+    token = uuid.uuid4().hex
+    try:
+        if _get_redis_client().set(f"{URL_CHECK_LOCK_PREFIX}{_digest(url)}", token, nx=True, ex=CHECK_LOCK_TTL):
+            return token
+        return None
+    except Exception as e:
+        logger.debug(f"Image check lock unavailable ({e})")
+        return ""
+
+
+def release_check(url: str, token: str) -> None:
+    """Release the lock if it is still ours (it may have expired and been taken over)."""
+    if not token:
+        return
+    key = f"{URL_CHECK_LOCK_PREFIX}{_digest(url)}"
+    try:
+        with _get_redis_client().pipeline() as pipe:
+            pipe.watch(key)
+            if pipe.get(key) == token.encode():
+                pipe.multi()
+                pipe.delete(key)
+                pipe.execute()
+    except redis.WatchError:
+        pass  # changed hands between our read and the delete
+    except Exception as e:
+        logger.debug(f"Failed to release image check lock ({e})")
+
+
+def cached_check(url: str, check: Callable[[str], list[str]]) -> list[str]:
+    """
+    Errors of `check(url)`, served from the cache when possible. When
+    another worker is already checking the URL, wait for its result (up to
+    CHECK_LOCK_TTL) instead of sending a second request.
+    """
+    errors = get_cached(url)
+    if errors is not None:
+        return errors
+
+    deadline = time.monotonic() + CHECK_LOCK_TTL
+    token = acquire_check(url)
+    while token is None and time.monotonic() < deadline:
+        time.sleep(WAIT_POLL_SECONDS)
+        errors = get_cached(url)
+        if errors is not None:
+            return errors
+        token = acquire_check(url)
+
+    try:
+        # The previous holder may have stored its result between our read and the lock
+        if token is not None:
+            errors = get_cached(url)
+            if errors is not None:
+                return errors
+        errors = check(url)
+        store(url, errors)
+        return errors
+    finally:
+        if token:
+            release_check(url, token)
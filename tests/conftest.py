@@ -68,6 +68,7 @@ def mock_vacancy():
     vacancy.title = None
     vacancy.description = None
     vacancy.image_url = None
+    vacancy.image_hash = None
     vacancy.status = "pending"
     vacancy.error_message = None
     vacancy.retry_count = 0
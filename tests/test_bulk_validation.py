@@ -0,0 +1,260 @@
+"""
+AdsGen 2.0 - Bulk Validation Tests
+Tests for catalogue revalidation with paging, concurrent image checks and bulk updates
+"""
+
+import pytest
+from unittest.mock import AsyncMock, patch
+
+import fakeredis
+import httpx
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+GOOD_DESCRIPTION = (
+    "Приглашаем на работу кассира в дружный коллектив магазина. "
+    "Официальное оформление, стабильная заработная плата два раза в месяц, "
+    "удобный график работы и обучение за счёт компании. "
+) * 2
+
+
+@pytest.fixture
+def db_engine():
+    """SQLite engine with the tables bulk validation reads and writes."""
+    from services.shared.database import Base
+    from services.shared.models.image_asset import ImageAsset
+    from services.shared.models.vacancy import Vacancy
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[ImageAsset.__table__, Vacancy.__table__])
+    with patch('services.validation_worker.tasks.sync_engine', engine):
+        yield engine
+
+
+@pytest.fixture
+def fake_redis():
+    """In-memory Redis for the image check cache."""
+    from services.validation_worker.url_cache import clear_memory_cache
+
+    clear_memory_cache()
+    client = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+    with patch('services.validation_worker.url_cache._get_redis_client', return_value=client):
+        yield client
+    clear_memory_cache()
+
+
+def _vacancy(vacancy_id, status, title="Кассир в магазин", image_url="https://cdn.example.com/shared.jpg", **kwargs):
+    from services.shared.models.vacancy import Vacancy
+
+    return Vacancy(
+        id=vacancy_id, city="Москва", address="ул. Тестовая, 1", position="Кассир", profession="Кассир",
+        title=title, image_url=image_url, status=status, **{"description": GOOD_DESCRIPTION, **kwargs},
+    )
+
+
+class TestValidateBulk:
+    """Tests for the bulk task."""
+
+    def test_pages_and_bulk_updates(self, db_engine, fake_redis):
+        """Test that every page is validated and written back with one request per URL."""
+        from services.shared.models.image_asset import ImageAsset
+        from services.shared.models.vacancy import Vacancy, VacancyStatus
+        from services.validation_worker.tasks import validate_bulk
+
+        with Session(db_engine) as session:
+            session.add(ImageAsset(
+                sha256="a" * 64, source_url="https://comfy/own.png", width=1280, height=960,
+                mime="image/jpeg", size_bytes=1000,
+            ))
+            session.add_all([
+                _vacancy("V-1", VacancyStatus.IMAGE_GENERATED),
+                _vacancy("V-2", VacancyStatus.PUBLISHED, description="<h3>Кассир</h3>" + GOOD_DESCRIPTION),
+                _vacancy("V-3", VacancyStatus.VALIDATED, title="Кассир | 50000 руб"),
+                _vacancy("V-4", VacancyStatus.ERROR, image_url="https://cdn.example.com/own.jpg", image_hash="a" * 64),
+                _vacancy("V-5", VacancyStatus.PUBLISHED, image_url="https://cdn.example.com/gone.jpg"),
+                _vacancy("V-6", VacancyStatus.PENDING),
+            ])
+            session.commit()
+
+        checks = AsyncMock(side_effect=lambda urls, concurrency: {
+            url: (["Image not accessible (HTTP 404)"] if "gone" in url else []) for url in urls
+        })
+        with patch('services.validation_worker.tasks._check_image_urls', checks), \
+             patch('services.shared.config.is_step_mode_enabled', return_value=False), \
+             patch('services.publisher_worker.tasks.publish_vacancy') as mock_publish:
+            result = validate_bulk(page_size=2)
+
+        assert (result["checked"], result["passed"], result["failed"]) == (5, 2, 3)
+        assert sorted(url for call in checks.call_args_list for url in call[0][0]) == [
+            "https://cdn.example.com/gone.jpg",
+            "https://cdn.example.com/shared.jpg",
+        ]
+        assert sorted(call[0][0] for call in mock_publish.delay.call_args_list) == ["V-1", "V-4"]
+
+        with Session(db_engine) as session:
+            statuses = dict(session.execute(select(Vacancy.id, Vacancy.status)).all())
+            assert statuses == {
+                "V-1": VacancyStatus.VALIDATED,
+                "V-2": VacancyStatus.ERROR,
+                "V-3": VacancyStatus.ERROR,
+                "V-4": VacancyStatus.VALIDATED,
+                "V-5": VacancyStatus.ERROR,
+                "V-6": VacancyStatus.PENDING,
+            }
+            assert session.get(Vacancy, "V-4").error_message is None
+            # Markup errors are reported, the description is left as generated
+            assert "<h3>" in session.get(Vacancy, "V-2").error_message
+            assert session.get(Vacancy, "V-2").description.startswith("<h3>Кассир</h3>")
+            assert "HTTP 404" in session.get(Vacancy, "V-5").error_message
+
+    def test_cached_urls_skip_requests(self, db_engine, fake_redis):
+        """Test that URLs with a cached result are not requested again."""
+        from services.shared.models.vacancy import VacancyStatus
+        from services.validation_worker.tasks import validate_bulk
+        from services.validation_worker.url_cache import store
+
+        store("https://cdn.example.com/shared.jpg", [])
+        with Session(db_engine) as session:
+            session.add(_vacancy("V-1", VacancyStatus.VALIDATED))
+            session.commit()
+
+        with patch('services.validation_worker.tasks._check_image_urls', AsyncMock()) as checks:
+            result = validate_bulk()
+
+        assert result["passed"] == 1
+        checks.assert_not_called()
+
+    def test_rows_changed_since_read_are_kept(self, db_engine, fake_redis):
+        """Test that vacancies whose status changed during the page are neither overwritten nor republished."""
+        from services.shared.models.vacancy import Vacancy, VacancyStatus
+        from services.validation_worker.tasks import validate_bulk
+
+        with Session(db_engine) as session:
+            session.add_all([
+                _vacancy("V-1", VacancyStatus.IMAGE_GENERATED),
+                _vacancy("V-2", VacancyStatus.VALIDATED, title="Кассир | 50000 руб"),
+                _vacancy("V-3", VacancyStatus.IMAGE_GENERATED),
+            ])
+            session.commit()
+
+        def checks(urls, concurrency):
+            # Another worker moves V-1 and V-2 on while the page is being checked
+            with Session(db_engine) as other:
+                other.get(Vacancy, "V-1").status = VacancyStatus.TEXT_GENERATING
+                other.get(Vacancy, "V-2").status = VacancyStatus.PUBLISHED
+                other.commit()
+            return {url: [] for url in urls}
+
+        with patch('services.validation_worker.tasks._check_image_urls', AsyncMock(side_effect=checks)), \
+             patch('services.shared.config.is_step_mode_enabled', return_value=False), \
+             patch('services.publisher_worker.tasks.publish_vacancy') as mock_publish:
+            validate_bulk()
+
+        assert [call[0][0] for call in mock_publish.delay.call_args_list] == ["V-3"]
+        with Session(db_engine) as session:
+            statuses = dict(session.execute(select(Vacancy.id, Vacancy.status)).all())
+            assert statuses == {
+                "V-1": VacancyStatus.TEXT_GENERATING,
+                "V-2": VacancyStatus.PUBLISHED,
+                "V-3": VacancyStatus.VALIDATED,
+            }
+            assert session.get(Vacancy, "V-2").error_message is None
+
+
+class TestConcurrentChecks:
+    """Tests for the async HEAD fan-out."""
+
+    def test_check_image_urls(self):
+        """Test that responses are judged like single validation."""
+        import asyncio
+        from services.validation_worker.tasks import _check_image_urls
+
+        def handler(request):
+            if request.url.path == "/ok.jpg":
+                return httpx.Response(200, headers={"content-type": "image/jpeg"})
+            if request.url.path == "/page":
+                return httpx.Response(200, headers={"content-type": "text/html"})
+            raise httpx.ConnectTimeout("slow", request=request)
+
+        real_client = httpx.AsyncClient
+        with patch('httpx.AsyncClient', lambda **kw: real_client(transport=httpx.MockTransport(handler), **kw)):
+            results = asyncio.run(_check_image_urls(
+                ["https://a.example/ok.jpg", "https://a.example/page", "https://a.example/slow.jpg"], 2,
+            ))
+
+        assert results == {
+            "https://a.example/ok.jpg": [],
+            "https://a.example/page": ["URL does not point to an image: text/html"],
+            "https://a.example/slow.jpg": ["Image URL timed out"],
+        }
+
+
+class TestMemoizedValidation:
+    """Tests for skipping ads whose content already passed the current rules."""
+
+    def test_unchanged_vacancy_is_not_checked_again(self, db_engine, fake_redis):
+        """Test that revalidating identical content is a no-op until it changes."""
+        from services.shared.models.vacancy import Vacancy, VacancyStatus
+        from services.validation_worker.tasks import validate_vacancy_content
+
+        with Session(db_engine) as session:
+            session.add(_vacancy("V-1", VacancyStatus.IMAGE_GENERATED))
+            session.commit()
+
+        with patch('services.validation_worker.tasks._validate_image', return_value=[]) as mock_image, \
+             patch('services.shared.config.is_step_mode_enabled', return_value=True):
+            first = validate_vacancy_content("V-1")
+            second = validate_vacancy_content("V-1")
+
+            with Session(db_engine) as session:
+                session.get(Vacancy, "V-1").title = "Кассир в супермаркет"
+                session.commit()
+            third = validate_vacancy_content("V-1")
+
+        assert (first["cached"], second["cached"], third["cached"]) == (False, True, False)
+        assert mock_image.call_count == 2
+
+    def test_rule_change_invalidates(self, db_engine, fake_redis):
+        """Test that a different rule configuration re-runs the checks."""
+        from services.shared.models.vacancy import VacancyStatus
+        from services.validation_worker.tasks import validate_vacancy_content
+
+        with Session(db_engine) as session:
+            session.add(_vacancy("V-1", VacancyStatus.IMAGE_GENERATED))
+            session.commit()
+
+        with patch('services.validation_worker.tasks._validate_image', return_value=[]), \
+             patch('services.shared.config.is_step_mode_enabled', return_value=True):
+            validate_vacancy_content("V-1")
+            with patch('services.shared.worker_settings.get_worker_settings', return_value={"rule_title_pipe": "warning"}):
+                result = validate_vacancy_content("V-1")
+
+        assert result["cached"] is False
+
+    def test_bulk_only_changed(self, db_engine, fake_redis):
+        """Test that the changed-only mode checks just edited ads and older rule versions."""
+        from services.shared.models.vacancy import Vacancy, VacancyStatus
+        from services.validation_worker.tasks import validate_bulk
+
+        with Session(db_engine) as session:
+            session.add_all([_vacancy(f"V-{i}", VacancyStatus.VALIDATED) for i in range(4)])
+            session.commit()
+
+        checks = AsyncMock(side_effect=lambda urls, concurrency: {url: [] for url in urls})
+        with patch('services.validation_worker.tasks._check_image_urls', checks):
+            first = validate_bulk(only_changed=True)
+            version = first["rules_version"]
+
+            with Session(db_engine) as session:
+                session.get(Vacancy, "V-1").description += " Ждём вас!"
+                session.get(Vacancy, "V-2").validated_rules_version = "0123456789abcdef"
+                session.commit()
+
+            second = validate_bulk(only_changed=True)
+            old_only = validate_bulk(since_version="0123456789abcdef")
+
+        assert (first["checked"], first["skipped"]) == (4, 0)
+        assert (second["checked"], second["skipped"]) == (2, 2)
+        assert old_only["checked"] == 0
+        with Session(db_engine) as session:
+            assert {v.validated_rules_version for v in session.scalars(select(Vacancy))} == {version}
@@ -0,0 +1,195 @@
+"""
+AdsGen 2.0 - Circuit Breaker Tests
+Tests for the Redis-backed circuit breaker
+"""
+
+import pytest
+from unittest.mock import MagicMock, patch
+
+import fakeredis
+
+
+@pytest.fixture
+def fake_redis():
+    """In-memory Redis shared by all breakers in a test."""
+    server = fakeredis.FakeServer()
+    client = fakeredis.FakeRedis(server=server)
+    with patch('services.shared.circuit_breaker._get_redis_client', return_value=client):
+        yield client
+
+
+def _breaker(**overrides):
+    from services.shared.circuit_breaker import BreakerConfig, CircuitBreaker
+    config = BreakerConfig(**{"min_calls": 4, "failure_rate": 0.5, "open_seconds": 30, **overrides})
+    return CircuitBreaker("test", config)
+
+
+class TestCircuitBreaker:
+    """Tests for state transitions."""
+
+    def test_closed_by_default(self, fake_redis):
+        """Test that a fresh breaker allows requests."""
+        from services.shared.circuit_breaker import ALLOWED
+
+        breaker = _breaker()
+
+        assert breaker.allow_request() == ALLOWED
+        assert breaker.get_state() == "closed"
+
+    def test_opens_on_error_rate(self, fake_redis):
+        """Test that the breaker opens once the failure rate is reached."""
+        breaker = _breaker()
+
+        breaker.record_success(0.1)
+        breaker.record_success(0.1)
+        breaker.record_failure()
+        assert breaker.get_state() == "closed"
+
+        breaker.record_failure()
+
+        assert breaker.get_state() == "open"
+        assert breaker.allow_request() is None
+
+    def test_window_slides(self, fake_redis):
+        """Test that failures spread over the window still open it, and old ones expire."""
+        breaker = _breaker(window_seconds=60)
+
+        with patch('services.shared.circuit_breaker.time.time', return_value=1000.0):
+            breaker.record_failure()
+            breaker.record_failure()
+        # A fixed bucket would have started from zero at t=1020
+        with patch('services.shared.circuit_breaker.time.time', return_value=1030.0):
+            breaker.record_success(0.1)
+            breaker.record_failure()
+
+            assert breaker.get_state() == "open"
+
+        breaker.reset()
+        with patch('services.shared.circuit_breaker.time.time', return_value=1000.0):
+            for _ in range(3):
+                breaker.record_failure()
+        with patch('services.shared.circuit_breaker.time.time', return_value=1070.0):
+            breaker.record_failure()
+
+        assert breaker.get_state() == "closed"
+
+    def test_slow_calls_count_as_failures(self, fake_redis):
+        """Test that latency above the threshold opens the breaker."""
+        breaker = _breaker(slow_call_seconds=1.0)
+
+        for _ in range(4):
+            breaker.record_success(5.0)
+
+        assert breaker.get_state() == "open"
+
+    def test_half_open_single_probe(self, fake_redis):
+        """Test that only one probe is allowed after the open period."""
+        breaker = _breaker(open_seconds=0)
+        for _ in range(4):
+            breaker.record_failure()
+
+        assert breaker.allow_request() is not None
+        assert breaker.allow_request() is None
+
+    def test_probe_success_closes(self, fake_redis):
+        """Test that a successful probe closes the breaker."""
+        breaker = _breaker(open_seconds=0)
+        for _ in range(4):
+            breaker.record_failure()
+
+        token = breaker.allow_request()
+        breaker.record_success(0.1, token)
+
+        assert breaker.get_state() == "closed"
+        assert breaker.allow_request() is not None
+
+    def test_only_probe_closes(self, fake_redis):
+        """Test that a success of a call started before the breaker opened does not close it."""
+        from services.shared.circuit_breaker import ALLOWED
+
+        breaker = _breaker(open_seconds=0)
+        for _ in range(4):
+            breaker.record_failure()
+
+        token = breaker.allow_request()
+        breaker.record_success(0.1, ALLOWED)
+
+        assert breaker.get_state() == "half_open"
+        assert breaker.allow_request() is None
+
+        breaker.record_success(0.1, token)
+
+        assert breaker.get_state() == "closed"
+
+    def test_release_frees_probe(self, fake_redis):
+        """Test that a probe without an outcome hands the slot to the next caller."""
+        breaker = _breaker(open_seconds=0)
+        for _ in range(4):
+            breaker.record_failure()
+
+        token = breaker.allow_request()
+        breaker.release("someone-else")
+        assert breaker.allow_request() is None
+
+        breaker.release(token)
+
+        assert breaker.allow_request() is not None
+        assert breaker.get_state() == "half_open"
+
+    def test_probe_failure_reopens(self, fake_redis):
+        """Test that a failed probe keeps the breaker open."""
+        breaker = _breaker(open_seconds=30)
+        for _ in range(4):
+            breaker.record_failure()
+
+        # Pretend the open period elapsed
+        fake_redis.hset("adsgen:circuit:test:state", "opened_at", 0)
+        token = breaker.allow_request()
+        breaker.record_failure(token)
+
+        assert breaker.get_state() == "open"
+        assert breaker.allow_request() is None
+
+    def test_fails_open_without_redis(self):
+        """Test that requests are allowed when Redis is unavailable."""
+        broken = MagicMock()
+        broken.hgetall.side_effect = ConnectionError("redis down")
+
+        with patch('services.shared.circuit_breaker._get_redis_client', return_value=broken):
+            breaker = _breaker()
+            assert breaker.allow_request()
+            breaker.record_failure()  # Must not raise
+
+
+class TestBreakerIntegration:
+    """Tests for short-circuiting in the workers."""
+
+    @patch('services.textgen_worker.tasks.settings')
+    @patch('httpx.Client')
+    def test_textgen_skips_api_when_open(self, mock_httpx, mock_settings, mock_vacancy):
+        """Test that text generation falls back without calling DeepSeek."""
+        from services.textgen_worker.tasks import _generate_ai_content
+
+        mock_settings.deepseek_api_key = "test_key"
+
+        with patch('services.textgen_worker.tasks.get_breaker') as mock_get_breaker:
+            mock_get_breaker.return_value.allow_request.return_value = None
+            result = _generate_ai_content(mock_vacancy)
+
+        assert result is None
+        mock_httpx.assert_not_called()
+
+    @patch('services.imagegen_worker.tasks.settings')
+    @patch('httpx.Client')
+    def test_comfyui_skipped_when_open(self, mock_httpx, mock_settings):
+        """Test that ComfyUI is not called while its circuit is open."""
+        from services.imagegen_worker.tasks import _call_comfyui
+
+        mock_settings.comfyui_url = "http://localhost:8188"
+
+        with patch('services.imagegen_worker.tasks.get_breaker') as mock_get_breaker:
+            mock_get_breaker.return_value.allow_request.return_value = None
+            result = _call_comfyui("Cashier", "man", 30)
+
+        assert result is None
+        mock_httpx.assert_not_called()
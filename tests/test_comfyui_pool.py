@@ -0,0 +1,119 @@
+"""
+AdsGen 2.0 - ComfyUI Node Pool Tests
+Tests for routing, concurrency caps and ejection of render nodes
+"""
+
+import pytest
+from unittest.mock import patch
+
+import fakeredis
+
+NODES = ["http://comfy-1:5000", "http://comfy-2:5000"]
+
+
+@pytest.fixture
+def fake_redis():
+    """In-memory Redis for pool state."""
+    client = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+    with patch('services.shared.comfyui_pool._get_redis_client', return_value=client):
+        yield client
+
+
+class TestRouting:
+    """Tests for slot reservation."""
+
+    def test_least_loaded_node_first(self, fake_redis):
+        """Test that jobs are spread across nodes."""
+        from services.shared.comfyui_pool import acquire_node
+
+        first, _ = acquire_node(NODES, max_jobs=2, lease=60)
+        second, _ = acquire_node(NODES, max_jobs=2, lease=60)
+
+        assert {first, second} == set(NODES)
+
+    def test_cap_and_release(self, fake_redis):
+        """Test that a full pool refuses until a slot is released."""
+        from services.shared.comfyui_pool import acquire_node, release_node
+
+        slots = [acquire_node(NODES, max_jobs=1, lease=60) for _ in range(2)]
+
+        assert acquire_node(NODES, max_jobs=1, lease=60) == (None, None)
+        release_node(*slots[0])
+        assert acquire_node(NODES, max_jobs=1, lease=60)[0] == slots[0][0]
+
+    def test_expired_lease_frees_slot(self, fake_redis):
+        """Test that slots of crashed workers expire."""
+        from services.shared.comfyui_pool import acquire_node
+
+        acquire_node(NODES[:1], max_jobs=1, lease=-1)
+
+        assert acquire_node(NODES[:1], max_jobs=1, lease=60)[0] == NODES[0]
+
+    def test_fails_open_without_redis(self):
+        """Test that rendering goes on when Redis is down."""
+        from services.shared.comfyui_pool import acquire_node
+
+        with patch('services.shared.comfyui_pool._get_redis_client', side_effect=ConnectionError("down")):
+            node, slot = acquire_node(NODES, max_jobs=1, lease=60)
+
+        assert node in NODES
+        assert slot is None
+
+
+class TestHealth:
+    """Tests for ejecting and readmitting nodes."""
+
+    def test_failing_node_ejected_and_readmitted(self, fake_redis):
+        """Test ejection after repeated failures and return after a good probe."""
+        from services.shared.comfyui_pool import (
+            EJECT_AFTER_FAILURES, acquire_node, get_pool_status, mark_health, report_failure,
+        )
+
+        for _ in range(EJECT_AFTER_FAILURES):
+            report_failure(NODES[0])
+
+        for _ in range(3):
+            assert acquire_node(NODES, max_jobs=5, lease=60)[0] == NODES[1]
+        assert get_pool_status(NODES)[0]["healthy"] is False
+
+        mark_health(NODES[0], True)
+        assert get_pool_status(NODES)[0] == {
+            "url": NODES[0], "healthy": True, "down_since": None, "in_flight": 0, "failures": 0,
+        }
+
+    def test_success_resets_failure_streak(self, fake_redis):
+        """Test that only consecutive failures eject a node."""
+        from services.shared.comfyui_pool import EJECT_AFTER_FAILURES, has_healthy_node, report_failure, report_success
+
+        for _ in range(EJECT_AFTER_FAILURES - 1):
+            report_failure(NODES[0])
+        report_success(NODES[0])
+        report_failure(NODES[0])
+
+        assert has_healthy_node(NODES[:1])
+
+    def test_probe_task(self, fake_redis):
+        """Test that the periodic probe ejects dead nodes."""
+        from services.shared.comfyui_pool import has_healthy_node
+        from services.imagegen_worker.tasks import probe_comfyui_nodes
+
+        with patch('services.imagegen_worker.tasks.get_worker_settings', return_value={"comfyui_url": ",".join(NODES)}), \
+             patch('services.imagegen_worker.tasks._check_comfyui_health', side_effect=lambda url: url == NODES[1]):
+            result = probe_comfyui_nodes()
+
+        assert result == {NODES[0]: False, NODES[1]: True}
+        assert not has_healthy_node(NODES[:1])
+        assert has_healthy_node(NODES)
+
+    def test_open_node_breaker_routes_elsewhere(self, fake_redis):
+        """Test that a failing node opens only its own breaker and the other node keeps rendering."""
+        from services.imagegen_worker.tasks import _node_breaker, _routable_nodes
+
+        worker_settings = {"comfyui_url": ",".join(NODES)}
+        with patch('services.shared.circuit_breaker._get_redis_client', return_value=fake_redis):
+            for _ in range(3):
+                _node_breaker(NODES[0]).record_failure()
+
+            assert _node_breaker(NODES[0]).get_state() == "open"
+            assert _node_breaker(NODES[1]).allow_request()
+            assert _routable_nodes(worker_settings) == NODES[1:]
@@ -0,0 +1,83 @@
+"""
+AdsGen 2.0 - HTML Validator Tests
+Tests for the single-pass description markup check and its repair mode
+"""
+
+import pytest
+
+
+class TestCheck:
+    """Tests for reporting markup problems."""
+
+    def test_valid_markup(self):
+        """Test that allowed, well-nested markup passes and text is measured without tags."""
+        from services.shared.html_validator import check_html
+
+        result = check_html("<p>Привет, <strong>мир</strong>!</p><ul><li>Раз</li><li>Два</li></ul>")
+
+        assert result.errors == []
+        assert result.text_length == len("Привет, мир ! Раз Два")
+
+    @pytest.mark.parametrize("markup,error", [
+        ("<h3>Обязанности</h3>", "Tag <h3> is not allowed"),
+        ('<p class="x">Текст</p>', "Attribute 'class' is not allowed on <p>"),
+        ("<p>Текст", "Tag <p> is not closed"),
+        ("<p>Текст</p></ul>", "Unexpected closing tag </ul>"),
+        ("<li>Пункт</li>", "<li> outside of a list"),
+        ("<p>**Важно**</p>", "Markdown bold ('**') is not rendered, use <strong>"),
+        ("<p><!-- tmp -->Текст</p>", "HTML comments are not allowed"),
+    ])
+    def test_reported_errors(self, markup, error):
+        """Test each kind of markup error."""
+        from services.shared.html_validator import check_html
+
+        assert error in check_html(markup).errors
+
+    def test_description_rules_use_text_length(self):
+        """Test that markup does not count towards the description length."""
+        from services.shared.content_rules import MIN_DESCRIPTION_LENGTH, validate_description
+
+        padded = "<p><strong></strong></p>" * 40 + "<p>" + "А" * (MIN_DESCRIPTION_LENGTH - 10) + "</p>"
+        errors, _ = validate_description(padded)
+
+        assert errors == [f"Description too short: {MIN_DESCRIPTION_LENGTH - 10} chars (min {MIN_DESCRIPTION_LENGTH})"]
+
+
+class TestRepair:
+    """Tests for fixing common LLM slips without regeneration."""
+
+    @pytest.mark.parametrize("markup,expected", [
+        ("<h3>Обязанности:</h3><ul><li>Касса<li>Выкладка</ul>",
+         "<p><strong>Обязанности:</strong></p><ul><li>Касса</li><li>Выкладка</li></ul>"),
+        ('<p style="color:red">Текст<ul><li>Пункт</li></ul></p>',
+         "<p>Текст</p><ul><li>Пункт</li></ul>"),
+        ("<li>Раз</li><li>Два</li>Итог", "<ul><li>Раз</li><li>Два</li></ul>Итог"),
+        ("<b>Важно</b> и **очень**<br/><span>важно</span>",
+         "<strong>Важно</strong> и <strong>очень</strong><br>важно"),
+        ("<p>Без <em>закрытия", "<p>Без <em>закрытия</em></p>"),
+    ])
+    def test_repairs(self, markup, expected):
+        """Test that repaired markup is valid and keeps all text."""
+        from services.shared.html_validator import check_html, repair_html
+
+        repaired = repair_html(markup)
+
+        assert repaired == expected
+        assert check_html(repaired).errors == []
+
+    def test_valid_markup_unchanged(self):
+        """Test that repair leaves valid descriptions byte for byte."""
+        from services.shared.html_validator import repair_html
+
+        markup = "<p>Оплата &amp; бонусы &nbsp;каждую неделю</p>\n<ul><li>Касса</li></ul>"
+
+        assert repair_html(markup) == markup
+
+    def test_generated_description_is_repaired(self):
+        """Test that generated content is repaired before the rules run."""
+        from services.textgen_worker.tasks import _clean_content
+
+        content = {"title": " Кассир ", "description": "<h2>Кассир</h2><p>Работа | в магазине"}
+        _clean_content(content)
+
+        assert content == {"title": "Кассир", "description": "<p><strong>Кассир</strong></p><p>Работа  в магазине</p>"}
@@ -0,0 +1,130 @@
+"""
+AdsGen 2.0 - Image Post-Processing Tests
+Tests for recompression, content-addressed dedup and the bulk upload
+"""
+
+import io
+import pytest
+from unittest.mock import MagicMock, patch
+
+from PIL import Image
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+
+def _png(width: int, height: int, color=(200, 40, 40)) -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(out, "PNG")
+    return out.getvalue()
+
+
+@pytest.fixture
+def db_session(tmp_path):
+    """SQLite session with the tables post-processing touches, cache in tmp_path."""
+    from services.shared.database import Base
+    from services.shared.models.image_asset import ImageAsset
+    from services.shared.models.image_library import ImageLibraryItem
+    from services.shared.models.vacancy import Vacancy
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(
+        engine, tables=[ImageAsset.__table__, ImageLibraryItem.__table__, Vacancy.__table__]
+    )
+    with patch('services.imagegen_worker.postprocess.settings') as mock_settings:
+        mock_settings.image_cache_dir = str(tmp_path)
+        mock_settings.yandex_disk_folder = "Test_Folder"
+        with Session(engine) as session:
+            yield session
+
+
+class TestProcessImage:
+    """Tests for the recompression step."""
+
+    def test_fits_avito_size(self):
+        """Test that large renders are scaled down to JPEG, keeping the aspect ratio."""
+        from services.imagegen_worker.postprocess import process_image
+
+        result = process_image(_png(2048, 1536))
+
+        assert (result.width, result.height) == (1280, 960)
+        assert result.mime == "image/jpeg"
+        assert Image.open(io.BytesIO(result.data)).format == "JPEG"
+
+    def test_rejects_bad_input(self):
+        """Test that non-images and tiny images are refused."""
+        from services.imagegen_worker.postprocess import process_image
+
+        with pytest.raises(ValueError):
+            process_image(b"<html>not an image</html>")
+        with pytest.raises(ValueError):
+            process_image(_png(200, 150))
+
+
+class TestRegisterImage:
+    """Tests for content-addressed assets."""
+
+    def test_identical_renders_share_asset(self, db_session, tmp_path):
+        """Test dedup by hash and by known URL."""
+        from services.imagegen_worker.postprocess import cache_path, register_image
+
+        with patch('services.imagegen_worker.postprocess.download_image', return_value=_png(1024, 768)) as mock_download:
+            first = register_image(db_session, "https://comfy/a.png")
+            second = register_image(db_session, "https://comfy/b.png")
+            again = register_image(db_session, "https://comfy/a.png")
+
+        assert first.sha256 == second.sha256 == again.sha256
+        assert (first.width, first.height, first.mime) == (1024, 768, "image/jpeg")
+        assert cache_path(first.sha256).read_bytes()[:2] == b"\xff\xd8"
+        assert mock_download.call_count == 2
+
+    def test_unusable_image_keeps_raw_url(self, db_session):
+        """Test that failures return None instead of raising."""
+        from services.imagegen_worker.postprocess import register_image
+
+        with patch('services.imagegen_worker.postprocess.download_image', side_effect=ConnectionError("down")):
+            assert register_image(db_session, "https://comfy/a.png") is None
+
+
+class TestBulkUpload:
+    """Tests for publishing cached images."""
+
+    def test_upload_repoints_vacancies(self, db_session):
+        """Test that vacancies and library variants move to the published copy."""
+        from services.imagegen_worker.postprocess import register_image, upload_pending
+        from services.shared.models.image_library import ImageLibraryItem
+        from services.shared.models.vacancy import Vacancy
+
+        with patch('services.imagegen_worker.postprocess.download_image', return_value=_png(1024, 768)):
+            asset = register_image(db_session, "https://comfy/a.png")
+        db_session.add(Vacancy(id="MSK-1", city="Москва", address="ул. Тестовая, 1", position="Кассир",
+                               profession="Кассир", image_url="https://comfy/a.png", image_hash=asset.sha256))
+        db_session.add(ImageLibraryItem(profession="Кассир", gender="man", age_bucket="20-29", style="s",
+                                        workflow="w", image_url="https://comfy/a.png"))
+        db_session.commit()
+
+        with patch('services.imagegen_worker.postprocess.YandexDiskClient') as mock_client:
+            disk = mock_client.return_value.__enter__.return_value
+            disk.upload.return_value = "https://disk.yandex.ru/i/abc"
+            assert upload_pending(db_session, limit=10) == 1
+            assert upload_pending(db_session, limit=10) == 0
+
+        assert disk.upload.call_count == 1
+        assert disk.upload.call_args[0][0] == f"Test_Folder/images/{asset.sha256}.jpg"
+        assert db_session.get(Vacancy, "MSK-1").image_url == "https://disk.yandex.ru/i/abc"
+        assert db_session.query(ImageLibraryItem).one().image_url == "https://disk.yandex.ru/i/abc"
+
+
+class TestValidationUsesMetadata:
+    """Tests for validating processed images without a request."""
+
+    @patch('httpx.Client')
+    def test_no_head_request(self, mock_httpx):
+        """Test that recorded metadata replaces the HEAD check."""
+        from services.validation_worker.tasks import _validate_image
+
+        asset = MagicMock(width=300, height=300, mime="image/jpeg")
+
+        errors = _validate_image("https://disk.yandex.ru/i/abc", asset)
+
+        assert errors == ["Image too small: 300x300 (min side 400px)"]
+        mock_httpx.assert_not_called()
@@ -0,0 +1,171 @@
+"""
+AdsGen 2.0 - Image Routing Tests
+Tests for provider/workflow routing, the backlog downgrade and render profiles
+"""
+
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+import fakeredis
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+
+@pytest.fixture
+def fake_redis():
+    """In-memory Redis for the profiles."""
+    client = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+    with patch('services.shared.image_routing._get_redis_client', return_value=client):
+        yield client
+
+
+class TestDowngrade:
+    """Tests for trading quality for throughput."""
+
+    @pytest.mark.parametrize("waited_minutes,threshold,expected", [
+        (45, 30, ("turbo_fast", True)),
+        (10, 30, ("flux_realism", False)),
+        (45, 0, ("flux_realism", False)),
+    ])
+    def test_choose_workflow(self, waited_minutes, threshold, expected):
+        """Test that only an old backlog switches to the fast workflow."""
+        from services.shared.image_routing import choose_workflow
+
+        now = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc)
+        oldest = now - timedelta(minutes=waited_minutes)
+
+        assert choose_workflow("flux_realism", oldest, threshold, now=now) == expected
+
+    def test_empty_backlog_keeps_workflow(self):
+        """Test that nothing waiting means no downgrade."""
+        from services.shared.image_routing import choose_workflow
+
+        assert choose_workflow("sdxl_quality", None, 30) == ("sdxl_quality", False)
+
+    def test_parked_and_stuck_rows_do_not_downgrade(self):
+        """Test that only rows with a render queued or in flight age the backlog."""
+        from services.shared.database import Base
+        from services.shared.image_routing import choose_workflow, oldest_waiting_query
+        from services.shared.models.vacancy import Vacancy, VacancyStatus
+
+        now = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc)
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine, tables=[Vacancy.__table__])
+
+        def oldest(step_mode):
+            with Session(engine) as session:
+                return session.scalar(oldest_waiting_query(30, step_mode=step_mode, now=now))
+
+        def add(vacancy_id, status, minutes_ago):
+            with Session(engine) as session:
+                session.add(Vacancy(
+                    id=vacancy_id, city="Москва", address="ул. Тестовая, 1", position="Кассир", profession="Кассир",
+                    status=status, updated_at=now - timedelta(minutes=minutes_ago),
+                ))
+                session.commit()
+
+        # Parked by step mode, and a render lost by a crashed worker hours ago
+        add("V-1", VacancyStatus.TEXT_GENERATED, 45)
+        add("V-2", VacancyStatus.IMAGE_GENERATING, 5 * 60)
+        add("V-3", VacancyStatus.IMAGE_GENERATING, 5)
+
+        assert choose_workflow("flux_realism", oldest(True), 30, now=now) == ("flux_realism", False)
+
+        # Outside step mode the TEXT_GENERATED row has its render queued
+        assert choose_workflow("flux_realism", oldest(False), 30, now=now) == ("turbo_fast", True)
+
+    def test_route_follows_settings(self):
+        """Test that the resolved route reflects the admin settings and the backlog."""
+        from services.imagegen_worker.tasks import _resolve_route
+
+        session = MagicMock()
+        session.scalar.return_value = datetime.now(timezone.utc) - timedelta(hours=2)
+        worker_settings = {"provider": "comfyui", "workflow": "sdxl_quality", "style": "realistic", "timeout": 200}
+
+        route = _resolve_route(session, worker_settings)
+
+        assert (route.workflow, route.downgraded, route.style, route.timeout) == ("turbo_fast", True, "realistic", 200)
+
+        route = _resolve_route(session, {"provider": "polza", "polza_model": "seedream-v4", "polza_api_key": "k"})
+
+        assert (route.provider, route.workflow, route.breaker) == ("polza", "seedream-v4", "polza_image")
+
+
+class TestProfiles:
+    """Tests for rolling latency/throughput profiles."""
+
+    def test_profile_summary(self, fake_redis):
+        """Test latency percentiles, success rate and throughput."""
+        from services.shared.image_routing import get_all_profiles, get_profile, record_render
+
+        record_render("comfyui", "sdxl_quality", 30.0)
+        record_render("comfyui", "sdxl_quality", 60.0, images=4)
+        record_render("comfyui", "sdxl_quality", 90.0, success=False)
+        record_render("polza", "seedream-v4", 10.0)
+
+        profile = get_profile("comfyui", "sdxl_quality")
+
+        assert profile["renders"] == 3
+        assert profile["success_rate"] == pytest.approx(0.667)
+        assert profile["p50_seconds"] == 45.0
+        assert profile["images_per_minute"] == pytest.approx(5 / 180 * 60, abs=0.01)
+        assert [(p["provider"], p["workflow"]) for p in get_all_profiles()] == [
+            ("comfyui", "sdxl_quality"),
+            ("polza", "seedream-v4"),
+        ]
+
+    def test_profiles_without_redis(self):
+        """Test that a missing Redis yields an empty profile instead of an error."""
+        from services.shared.image_routing import get_profile
+
+        with patch('services.shared.image_routing._get_redis_client', side_effect=ConnectionError("down")):
+            assert get_profile("comfyui", "turbo_fast")["renders"] == 0
+
+
+class TestRouting:
+    """Tests for rendering with the routed provider."""
+
+    @patch('httpx.Client')
+    def test_comfyui_gets_workflow_and_timeout(self, mock_httpx):
+        """Test that the workflow, style and timeout settings reach ComfyUI."""
+        from services.imagegen_worker.tasks import _call_comfyui
+
+        mock_response = MagicMock(status_code=200)
+        mock_response.json.return_value = {"success": True, "image_url": "https://disk.yandex.ru/i/a.jpg"}
+        mock_httpx.return_value.__enter__.return_value.post.return_value = mock_response
+
+        _call_comfyui("Cashier", "man", 30, url="http://comfy-1", workflow="flux_realism", style="realistic", timeout=200)
+
+        payload = mock_httpx.return_value.__enter__.return_value.post.call_args[1]["json"]
+        assert (payload["workflow"], payload["style"]) == ("flux_realism", "realistic")
+        assert mock_httpx.call_args[1]["timeout"] == 200
+
+    @patch('services.imagegen_worker.tasks.sync_engine')
+    @patch('services.imagegen_worker.tasks.Session')
+    def test_polza_provider_skips_comfyui(self, mock_session_class, mock_engine, mock_vacancy):
+        """Test that the polza provider renders without the ComfyUI pool."""
+        from services.imagegen_worker.tasks import generate_vacancy_image
+
+        mock_session = MagicMock()
+        mock_session_class.return_value.__enter__ = MagicMock(return_value=mock_session)
+        mock_session_class.return_value.__exit__ = MagicMock(return_value=False)
+        mock_session.get.return_value = mock_vacancy
+        worker_settings = {"provider": "polza", "polza_model": "seedream-v4", "polza_api_key": "k", "style": "stylized"}
+
+        with patch('services.imagegen_worker.tasks.get_worker_settings', return_value=worker_settings), \
+             patch('services.imagegen_worker.tasks._library_stock', return_value=0), \
+             patch('services.imagegen_worker.tasks._add_to_library') as mock_add, \
+             patch('services.imagegen_worker.tasks.acquire_node') as mock_acquire, \
+             patch('services.imagegen_worker.tasks._call_polza', return_value="https://cdn.polza.ai/a.png") as mock_polza, \
+             patch('services.imagegen_worker.tasks.translate_many', return_value=["Cashier", None]), \
+             patch('services.imagegen_worker.tasks._record_render') as mock_record, \
+             patch('services.imagegen_worker.tasks.register_image', return_value=None), \
+             patch('services.validation_worker.tasks.validate_vacancy_content'):
+            result = generate_vacancy_image(mock_vacancy.id)
+
+        assert result["image_url"] == "https://cdn.polza.ai/a.png"
+        assert mock_polza.call_args[0][4].workflow == "seedream-v4"
+        assert mock_add.call_args[0][1]["workflow"] == "polza:seedream-v4"
+        assert mock_record.call_args[0][:2] == ("polza", "seedream-v4")
+        mock_acquire.assert_not_called()
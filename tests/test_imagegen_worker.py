@@ -7,9 +7,33 @@ import pytest
 from unittest.mock import MagicMock, patch
 
 
+@pytest.fixture(autouse=True)
+def sync_render():
+    """A single free ComfyUI node without the async API, so renders go through _call_comfyui."""
+    with patch('services.imagegen_worker.tasks._submit_comfyui', return_value=(None, False)), \
+         patch('services.imagegen_worker.tasks.acquire_node', return_value=("http://localhost:8188", None)), \
+         patch('services.imagegen_worker.tasks.release_node'):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def no_postprocess():
+    """Keep rendered URLs as-is (post-processing has its own tests)."""
+    with patch('services.imagegen_worker.tasks.register_image', return_value=None):
+        yield
+
+
 class TestGenerateVacancyImage:
     """Tests for generate_vacancy_image task."""
     
+    @pytest.fixture(autouse=True)
+    def empty_library(self):
+        """Image library without variants (every key understocked)."""
+        with patch('services.imagegen_worker.tasks._library_stock', return_value=0), \
+             patch('services.imagegen_worker.tasks._take_from_library', return_value=None), \
+             patch('services.imagegen_worker.tasks._add_to_library'):
+            yield
+    
     @patch('services.imagegen_worker.tasks.sync_engine')
     @patch('services.imagegen_worker.tasks.Session')
     def test_generate_image_success(
@@ -28,8 +52,8 @@ class TestGenerateVacancyImage:
         with patch('services.imagegen_worker.tasks._call_comfyui') as mock_comfy:
             mock_comfy.return_value = "https://disk.yandex.ru/test.jpg"
             
-            with patch('services.imagegen_worker.tasks._translate_to_english') as mock_translate:
-                mock_translate.return_value = "Cashier"
+            with patch('services.imagegen_worker.tasks.translate_many') as mock_translate:
+                mock_translate.return_value = ["Cashier", None]
                 
                 with patch('services.validation_worker.tasks.validate_vacancy_content'):
                     result = generate_vacancy_image(mock_vacancy.id)
@@ -51,7 +75,7 @@ class TestGenerateVacancyImage:
         with patch('services.imagegen_worker.tasks._call_comfyui') as mock_comfy:
             mock_comfy.return_value = None  # ComfyUI fails
             
-            with patch('services.imagegen_worker.tasks._translate_to_english', return_value="Cashier"):
+            with patch('services.imagegen_worker.tasks.translate_many', return_value=["Cashier", None]):
                 with patch('services.validation_worker.tasks.validate_vacancy_content'):
                     result = generate_vacancy_image(mock_vacancy.id)
         
@@ -73,6 +97,78 @@ class TestGenerateVacancyImage:
         assert "error" in result
 
 
+class TestImageLibrary:
+    """Tests for reusing rendered images."""
+    
+    def _session(self, mock_session_class, vacancy):
+        mock_session = MagicMock()
+        mock_session_class.return_value.__enter__ = MagicMock(return_value=mock_session)
+        mock_session_class.return_value.__exit__ = MagicMock(return_value=False)
+        mock_session.get.return_value = vacancy
+        return mock_session
+    
+    @patch('services.imagegen_worker.tasks.sync_engine')
+    @patch('services.imagegen_worker.tasks.Session')
+    def test_stocked_key_skips_comfyui(self, mock_session_class, mock_engine, mock_vacancy):
+        """Test that a fully stocked key is served without rendering."""
+        from services.imagegen_worker.tasks import generate_vacancy_image
+        
+        self._session(mock_session_class, mock_vacancy)
+        
+        with patch('services.imagegen_worker.tasks._library_stock', return_value=5), \
+             patch('services.imagegen_worker.tasks._take_from_library', return_value="https://disk.yandex.ru/lib.jpg"), \
+             patch('services.imagegen_worker.tasks._call_comfyui') as mock_comfy, \
+             patch('services.imagegen_worker.tasks.translate_many') as mock_translate, \
+             patch('services.validation_worker.tasks.validate_vacancy_content'):
+            result = generate_vacancy_image(mock_vacancy.id)
+        
+        assert result["image_url"] == "https://disk.yandex.ru/lib.jpg"
+        mock_comfy.assert_not_called()
+        mock_translate.assert_not_called()
+    
+    @patch('services.imagegen_worker.tasks.sync_engine')
+    @patch('services.imagegen_worker.tasks.Session')
+    def test_understocked_key_renders_and_stores(self, mock_session_class, mock_engine, mock_vacancy):
+        """Test that a render fills the library for its key."""
+        from services.imagegen_worker.tasks import generate_vacancy_image
+        
+        self._session(mock_session_class, mock_vacancy)
+        
+        with patch('services.imagegen_worker.tasks._library_stock', return_value=2), \
+             patch('services.imagegen_worker.tasks._add_to_library') as mock_add, \
+             patch('services.imagegen_worker.tasks._call_comfyui', return_value="https://disk.yandex.ru/new.jpg"), \
+             patch('services.imagegen_worker.tasks.translate_many', return_value=["Cashier", None]), \
+             patch('services.validation_worker.tasks.validate_vacancy_content'):
+            generate_vacancy_image(mock_vacancy.id, gender="woman", age=33)
+        
+        key = mock_add.call_args[0][1]
+        assert mock_add.call_args[0][2] == "https://disk.yandex.ru/new.jpg"
+        assert key["profession"] == mock_vacancy.profession
+        assert key["gender"] == "woman"
+        assert key["age_bucket"] == "30-39"
+    
+    def test_age_bucket_clamped(self):
+        """Test age bands for explicit ages."""
+        from services.imagegen_worker.tasks import _age_bucket
+        
+        assert _age_bucket(18) == "20-29"
+        assert _age_bucket(40) == "40-45"
+        assert _age_bucket(60) == "40-45"
+    
+    def test_key_ignores_notes(self):
+        """Test that the key depends on the service only, not on free-text notes."""
+        from services.imagegen_worker.tasks import ImageRoute, _image_context, _library_key
+        
+        route = ImageRoute(provider="comfyui", workflow="flux", style="photo", timeout=120)
+        
+        key = _library_key("Кассир", "man", "20-29", "Выкладка  товара", route)
+        
+        assert key == _library_key("Кассир", "man", "20-29", "выкладка товара", route)
+        assert key != _library_key("Кассир", "man", "20-29", None, route)
+        assert _library_key("Кассир", "man", "20-29", None, route)["context_hash"] == ""
+        assert _image_context("Выкладка  товара") == "Service context: выкладка товара"
+
+
 class TestComfyUIIntegration:
     """Tests for ComfyUI API integration."""
     
@@ -105,10 +201,367 @@ class TestComfyUIIntegration:
         assert result is None
 
 
+class TestAsyncRender:
+    """Tests for submit/poll rendering."""
+    
+    def _session(self, mock_session_class, vacancy):
+        mock_session = MagicMock()
+        mock_session_class.return_value.__enter__ = MagicMock(return_value=mock_session)
+        mock_session_class.return_value.__exit__ = MagicMock(return_value=False)
+        mock_session.get.return_value = vacancy
+        mock_session.scalars.return_value.first.return_value = vacancy
+        return mock_session
+    
+    @patch('services.imagegen_worker.tasks.sync_engine')
+    @patch('services.imagegen_worker.tasks.Session')
+    def test_submit_releases_worker(self, mock_session_class, mock_engine, mock_vacancy):
+        """Test that a submitted job is recorded and polled instead of awaited."""
+        from services.imagegen_worker.tasks import generate_vacancy_image, POLL_INTERVAL
+        
+        self._session(mock_session_class, mock_vacancy)
+        
+        with patch('services.imagegen_worker.tasks._library_stock', return_value=0), \
+             patch('services.imagegen_worker.tasks._submit_comfyui', return_value=("job-1", True)), \
+             patch('services.imagegen_worker.tasks._save_job_context') as mock_save, \
+             patch('services.imagegen_worker.tasks.poll_comfyui_job') as mock_poll, \
+             patch('services.imagegen_worker.tasks._call_comfyui') as mock_comfy, \
+             patch('services.imagegen_worker.tasks.translate_many', return_value=["Cashier", None]):
+            result = generate_vacancy_image(mock_vacancy.id)
+        
+        assert result["status"] == "submitted"
+        assert mock_vacancy.image_job_id == "job-1"
+        assert mock_save.call_args[0][:2] == ("job-1", mock_vacancy.id)
+        mock_poll.apply_async.assert_called_once_with(args=[mock_vacancy.id, "job-1"], countdown=POLL_INTERVAL)
+        mock_comfy.assert_not_called()
+    
+    @patch('services.imagegen_worker.tasks.sync_engine')
+    @patch('services.imagegen_worker.tasks.Session')
+    def test_busy_pool_requeues(self, mock_session_class, mock_engine, mock_vacancy):
+        """Test that the task comes back later when every node is at its cap."""
+        from services.imagegen_worker.tasks import generate_vacancy_image
+        
+        self._session(mock_session_class, mock_vacancy)
+        
+        with patch('services.imagegen_worker.tasks._library_stock', return_value=0), \
+             patch('services.imagegen_worker.tasks.acquire_node', return_value=(None, None)), \
+             patch('services.imagegen_worker.tasks.has_healthy_node', return_value=True), \
+             patch.object(generate_vacancy_image, 'apply_async') as mock_apply, \
+             patch('services.imagegen_worker.tasks.translate_many') as mock_translate:
+            result = generate_vacancy_image(mock_vacancy.id, gender="man", age=30)
+        
+        assert result["status"] == "queued"
+        assert mock_apply.call_args[1]["args"] == [mock_vacancy.id, "man", 30]
+        mock_translate.assert_not_called()
+    
+    @patch('services.imagegen_worker.tasks.sync_engine')
+    @patch('services.imagegen_worker.tasks.Session')
+    def test_poll_reschedules_pending_job(self, mock_session_class, mock_engine, mock_vacancy):
+        """Test that an unfinished job is checked again later."""
+        from services.imagegen_worker.tasks import poll_comfyui_job
+        
+        mock_vacancy.image_job_id = "job-1"
+        self._session(mock_session_class, mock_vacancy)
+        
+        with patch('services.imagegen_worker.tasks._get_comfyui_job', return_value=("pending", None)), \
+             patch('services.imagegen_worker.tasks.get_worker_settings', return_value={"timeout": 120}), \
+             patch.object(poll_comfyui_job, 'apply_async') as mock_apply:
+            result = poll_comfyui_job(mock_vacancy.id, "job-1", 3)
+        
+        assert result["status"] == "pending"
+        assert mock_apply.call_args[1]["args"] == [mock_vacancy.id, "job-1", 4]
+    
+    @patch('services.imagegen_worker.tasks.sync_engine')
+    @patch('services.imagegen_worker.tasks.Session')
+    def test_poll_completes_finished_job(self, mock_session_class, mock_engine, mock_vacancy):
+        """Test that a finished job stores the image and stocks the library."""
+        from services.imagegen_worker.tasks import poll_comfyui_job
+        
+        mock_vacancy.image_job_id = "job-1"
+        self._session(mock_session_class, mock_vacancy)
+        key = {"profession": mock_vacancy.profession}
+        
+        with patch('services.imagegen_worker.tasks._get_comfyui_job', return_value=("done", "https://disk.yandex.ru/a.jpg")), \
+             patch('services.imagegen_worker.tasks._pop_job_context', return_value={"key": key}), \
+             patch('services.imagegen_worker.tasks._add_to_library') as mock_add, \
+             patch('services.validation_worker.tasks.validate_vacancy_content'):
+            result = poll_comfyui_job(mock_vacancy.id, "job-1")
+        
+        assert result["status"] == "success"
+        assert mock_vacancy.image_url == "https://disk.yandex.ru/a.jpg"
+        assert mock_vacancy.image_job_id is None
+        assert mock_add.call_args[0][1:] == (key, "https://disk.yandex.ru/a.jpg")
+    
+    @patch('services.imagegen_worker.tasks.sync_engine')
+    @patch('services.imagegen_worker.tasks.Session')
+    def test_poll_stops_after_webhook(self, mock_session_class, mock_engine, mock_vacancy):
+        """Test that polling stops once the webhook finished the job."""
+        from services.imagegen_worker.tasks import poll_comfyui_job
+        
+        mock_vacancy.image_job_id = None
+        self._session(mock_session_class, mock_vacancy)
+        
+        with patch('services.imagegen_worker.tasks._get_comfyui_job') as mock_status:
+            result = poll_comfyui_job(mock_vacancy.id, "job-1")
+        
+        assert result["status"] == "skipped"
+        mock_status.assert_not_called()
+
+
+class TestComfyUIWebhook:
+    """Tests for the completion callback endpoint."""
+    
+    def _call(self, headers, payload, secret="s3cret", hosts=""):
+        import asyncio
+        from services.api import main
+        
+        request = MagicMock(headers=headers)
+        with patch.object(main.settings, 'comfyui_webhook_secret', secret), \
+             patch.object(main.settings, 'comfyui_image_hosts', hosts), \
+             patch('services.shared.celery_app.celery_app.send_task') as mock_send:
+            result = asyncio.run(main.comfyui_webhook(request, payload))
+        return result, mock_send
+    
+    @pytest.mark.parametrize("secret,headers,hosts,status", [
+        ("", {"X-Webhook-Secret": ""}, "", 404),
+        ("s3cret", {}, "", 403),
+        ("s3cret", {"X-Webhook-Secret": "wrong"}, "", 403),
+        ("s3cret", {"X-Webhook-Secret": "s3cret"}, "disk.yandex.ru", 400),
+    ])
+    def test_rejected(self, secret, headers, hosts, status):
+        """Test that callbacks without the configured secret or to foreign hosts are refused."""
+        from fastapi import HTTPException
+        
+        payload = {"job_id": "job-1", "status": "done", "image_url": "http://169.254.169.254/latest"}
+        with pytest.raises(HTTPException) as error:
+            self._call(headers, payload, secret=secret, hosts=hosts)
+        
+        assert error.value.status_code == status
+    
+    def test_accepted(self):
+        """Test that a signed callback with an allowed image host completes the job."""
+        payload = {"job_id": "job-1", "status": "done", "image_url": "https://disk.yandex.ru/i/a.jpg"}
+        
+        result, mock_send = self._call({"X-Webhook-Secret": "s3cret"}, payload, hosts="disk.yandex.ru")
+        
+        assert result["job_id"] == "job-1"
+        assert mock_send.call_args[1]["args"] == ["job-1", "https://disk.yandex.ru/i/a.jpg"]
+
+
+class TestLateJobs:
+    """Tests for async jobs that run past the imagegen timeout."""
+    
+    def _session(self, mock_session_class, vacancy):
+        mock_session = MagicMock()
+        mock_session_class.return_value.__enter__ = MagicMock(return_value=mock_session)
+        mock_session_class.return_value.__exit__ = MagicMock(return_value=False)
+        mock_session.get.return_value = vacancy
+        mock_session.scalars.return_value.first.return_value = vacancy
+        return mock_session
+    
+    @patch('services.imagegen_worker.tasks.sync_engine')
+    @patch('services.imagegen_worker.tasks.Session')
+    def test_timeout_keeps_slot(self, mock_session_class, mock_engine, mock_vacancy):
+        """Test that a timed-out job frees the vacancy but keeps its node slot."""
+        from services.imagegen_worker.tasks import LATE_JOB_TIMEOUTS, LEASE_MARGIN, poll_comfyui_job
+        
+        mock_vacancy.image_job_id = "job-1"
+        self._session(mock_session_class, mock_vacancy)
+        context = {"key": {"workflow": "flux"}, "node": "http://gpu-1:8188", "slot": "s1"}
+        
+        with patch('services.imagegen_worker.tasks._get_comfyui_job', return_value=("pending", None)), \
+             patch('services.imagegen_worker.tasks.get_worker_settings', return_value={"timeout": 60}), \
+             patch('services.imagegen_worker.tasks._load_job_context', return_value=context), \
+             patch('services.imagegen_worker.tasks._get_redis_client') as mock_redis, \
+             patch('services.imagegen_worker.tasks.renew_node') as mock_renew, \
+             patch('services.imagegen_worker.tasks.release_node') as mock_release, \
+             patch('services.imagegen_worker.tasks._take_from_library', return_value="https://disk.yandex.ru/lib.jpg"), \
+             patch('services.validation_worker.tasks.validate_vacancy_content'):
+            result = poll_comfyui_job(mock_vacancy.id, "job-1", 11)
+        
+        assert result["status"] == "success"
+        assert mock_vacancy.image_url == "https://disk.yandex.ru/lib.jpg"
+        assert mock_vacancy.image_job_id is None
+        mock_release.assert_not_called()
+        mock_renew.assert_called_once_with("http://gpu-1:8188", "s1", 60 * (LATE_JOB_TIMEOUTS - 1) + LEASE_MARGIN)
+        assert '"late": true' in mock_redis.return_value.setex.call_args[0][2]
+    
+    @patch('services.imagegen_worker.tasks.sync_engine')
+    @patch('services.imagegen_worker.tasks.Session')
+    def test_late_result_stocks_library(self, mock_session_class, mock_engine):
+        """Test that a render finishing after the timeout frees the slot and becomes stock."""
+        from services.imagegen_worker.tasks import complete_comfyui_job
+        
+        mock_session = self._session(mock_session_class, None)
+        context = {"key": {"profession": "Кассир"}, "node": "http://gpu-1:8188", "slot": "s1", "late": True}
+        
+        with patch('services.imagegen_worker.tasks._load_job_context', return_value=context), \
+             patch('services.imagegen_worker.tasks._pop_job_context', return_value=context), \
+             patch('services.imagegen_worker.tasks.release_node') as mock_release, \
+             patch('services.imagegen_worker.tasks._add_to_library') as mock_add:
+            result = complete_comfyui_job("job-1", "https://disk.yandex.ru/late.jpg")
+        
+        assert result["status"] == "stocked"
+        mock_release.assert_called_once_with("http://gpu-1:8188", "s1")
+        mock_add.assert_called_once_with(mock_session, context["key"], "https://disk.yandex.ru/late.jpg", used=False)
+    
+    @patch('services.imagegen_worker.tasks.sync_engine')
+    @patch('services.imagegen_worker.tasks.Session')
+    def test_duplicate_completion_skipped(self, mock_session_class, mock_engine):
+        """Test that a second report of a job completed in time changes nothing."""
+        from services.imagegen_worker.tasks import complete_comfyui_job
+        
+        self._session(mock_session_class, None)
+        
+        with patch('services.imagegen_worker.tasks._load_job_context', return_value=None), \
+             patch('services.imagegen_worker.tasks._pop_job_context') as mock_pop, \
+             patch('services.imagegen_worker.tasks._add_to_library') as mock_add:
+            result = complete_comfyui_job("job-1", "https://disk.yandex.ru/a.jpg")
+        
+        assert result["status"] == "skipped"
+        mock_pop.assert_not_called()
+        mock_add.assert_not_called()
+    
+    @patch('services.imagegen_worker.tasks.sync_engine')
+    @patch('services.imagegen_worker.tasks.Session')
+    def test_late_job_still_polled(self, mock_session_class, mock_engine, mock_vacancy):
+        """Test that polling continues for a late job although the vacancy moved on."""
+        from services.imagegen_worker.tasks import poll_comfyui_job
+        
+        mock_vacancy.image_job_id = None
+        self._session(mock_session_class, mock_vacancy)
+        
+        with patch('services.imagegen_worker.tasks._load_job_context', return_value={"late": True, "node": "http://gpu-1:8188"}), \
+             patch('services.imagegen_worker.tasks._get_comfyui_job', return_value=("pending", None)), \
+             patch('services.imagegen_worker.tasks.get_worker_settings', return_value={"timeout": 60}), \
+             patch.object(poll_comfyui_job, 'apply_async') as mock_apply:
+            result = poll_comfyui_job(mock_vacancy.id, "job-1", 12)
+        
+        assert result["status"] == "pending"
+        assert mock_apply.call_args[1]["args"] == [mock_vacancy.id, "job-1", 13]
+
+
+class TestBatchedRender:
+    """Tests for rendering several images per workflow run."""
+    
+    @patch('httpx.Client')
+    def test_batch_request(self, mock_httpx):
+        """Test that one request asks for the whole batch and returns every image."""
+        from services.imagegen_worker.tasks import _call_comfyui_batch
+        
+        urls = [f"https://disk.yandex.ru/i/{i}.jpg" for i in range(4)]
+        mock_response = MagicMock(status_code=200)
+        mock_response.json.return_value = {"success": True, "image_urls": urls}
+        mock_post = mock_httpx.return_value.__enter__.return_value.post
+        mock_post.return_value = mock_response
+        
+        result = _call_comfyui_batch("Cashier", "man", 30, None, 4, url="http://comfy-1")
+        
+        assert result == urls
+        assert mock_post.call_args[1]["json"]["batch_size"] == 4
+    
+    def test_batch_flushes_when_full(self):
+        """Test that the first vacancy arms the timer and a full batch flushes at once."""
+        import fakeredis
+        from services.imagegen_worker.tasks import _join_batch
+        
+        client = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+        key = {"profession": "Кассир", "gender": "man"}
+        
+        with patch('services.imagegen_worker.tasks._get_redis_client', return_value=client), \
+             patch('services.imagegen_worker.tasks.flush_image_batch') as mock_flush:
+            assert _join_batch(key, "MSK-1", 30, 2, 20)
+            mock_flush.apply_async.assert_called_once()
+            assert mock_flush.apply_async.call_args[1]["countdown"] == 20
+            
+            assert _join_batch(key, "MSK-2", 30, 2, 20)
+            mock_flush.delay.assert_called_once_with(mock_flush.apply_async.call_args[1]["args"][0])
+    
+    def test_batches_split_by_age_band(self):
+        """Test that vacancies of different age bands never share a render."""
+        import fakeredis
+        from services.imagegen_worker.tasks import _join_batch, flush_image_batch
+        
+        client = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+        key = {"profession": "Кассир", "gender": "man"}
+        
+        with patch('services.imagegen_worker.tasks._get_redis_client', return_value=client), \
+             patch('services.imagegen_worker.tasks.flush_image_batch') as mock_flush:
+            for vacancy_id, age in (("MSK-1", 25), ("MSK-2", 50), ("MSK-3", 26)):
+                _join_batch(key, vacancy_id, age, 2, 20)
+        
+        young = mock_flush.delay.call_args[0][0]
+        timers = [call[1]["args"][0] for call in mock_flush.apply_async.call_args_list]
+        assert timers[0] == young and len(set(timers)) == 2
+        
+        with patch('services.imagegen_worker.tasks._get_redis_client', return_value=client), \
+             patch('services.imagegen_worker.tasks.get_worker_settings', return_value={"batch_size": 2}), \
+             patch('services.imagegen_worker.tasks.render_image_batch', return_value={}) as mock_render:
+            flush_image_batch(young)
+        
+        assert mock_render.call_args[0] == (["MSK-1", "MSK-3"], key, 26)
+    
+    @patch('services.imagegen_worker.tasks.sync_engine')
+    @patch('services.imagegen_worker.tasks.Session')
+    def test_outputs_split_between_vacancies_and_library(self, mock_session_class, mock_engine):
+        """Test that each vacancy gets one output and the surplus stocks the library."""
+        from services.imagegen_worker.tasks import render_image_batch
+        from services.shared.models.vacancy import VacancyStatus
+        
+        vacancies = {
+            vacancy_id: MagicMock(id=vacancy_id, profession="Кассир", notes=None, service=None,
+                                  status=VacancyStatus.IMAGE_GENERATING)
+            for vacancy_id in ("MSK-1", "MSK-2")
+        }
+        mock_session = MagicMock()
+        mock_session_class.return_value.__enter__ = MagicMock(return_value=mock_session)
+        mock_session_class.return_value.__exit__ = MagicMock(return_value=False)
+        mock_session.get.side_effect = lambda model, vacancy_id: vacancies[vacancy_id]
+        urls = [f"https://disk.yandex.ru/i/{i}.jpg" for i in range(4)]
+        key = {"profession": "Кассир", "gender": "woman"}
+        
+        with patch('services.imagegen_worker.tasks.get_worker_settings', return_value={"batch_size": 4}), \
+             patch('services.imagegen_worker.tasks.translate_many', return_value=["Cashier", None]), \
+             patch('services.imagegen_worker.tasks._call_comfyui_batch', return_value=urls) as mock_comfy, \
+             patch('services.imagegen_worker.tasks._add_to_library') as mock_add, \
+             patch('services.imagegen_worker.tasks._finish_with_image') as mock_finish, \
+             patch('services.imagegen_worker.tasks.record_usage'):
+            result = render_image_batch(["MSK-1", "MSK-2"], key, 33)
+        
+        assert result == {"status": "done", "rendered": 4, "vacancies": 2}
+        assert mock_comfy.call_args[0] == ("Cashier", "woman", 33, None, 4)
+        assert [call[0][1:] for call in mock_finish.call_args_list] == [
+            (vacancies["MSK-1"], urls[0]),
+            (vacancies["MSK-2"], urls[1]),
+        ]
+        unused = [call[0][2] for call in mock_add.call_args_list if call[1] == {"used": False}]
+        assert unused == urls[2:]
+
+
 class TestTranslation:
     """Tests for translation functionality."""
     
-    @patch('services.imagegen_worker.tasks.settings')
+    @pytest.fixture(autouse=True)
+    def fake_redis(self):
+        """In-memory Redis cache and an empty process cache."""
+        import fakeredis
+        from services.imagegen_worker.translation import clear_memory_cache
+        
+        client = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+        clear_memory_cache()
+        with patch('services.imagegen_worker.translation._get_redis_client', return_value=client):
+            yield client
+        clear_memory_cache()
+    
+    @staticmethod
+    def _llm(mock_httpx, content):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {"choices": [{"message": {"content": content}}]}
+        post = mock_httpx.return_value.__enter__.return_value.post
+        post.return_value = mock_response
+        return post
+    
+    @patch('services.imagegen_worker.translation.settings')
     @patch('httpx.Client')
     def test_translation_success(
         self, mock_httpx, mock_settings, mock_deepseek_translation_response
@@ -125,29 +578,81 @@ class TestTranslation:
         mock_response.json.return_value = mock_deepseek_translation_response
         mock_httpx.return_value.__enter__.return_value.post.return_value = mock_response
         
-        result = _translate_to_english("Кассир")
+        result = _translate_to_english("Кассир в ночную смену")
         
         assert result == "Cashier"
     
-    @patch('services.imagegen_worker.tasks.settings')
+    @patch('services.imagegen_worker.translation.settings')
     def test_translation_without_api_key(self, mock_settings):
         """Test fallback when API key is missing."""
         from services.imagegen_worker.tasks import _translate_to_english
         
         mock_settings.deepseek_api_key = ""
         
-        result = _translate_to_english("Кассир")
+        result = _translate_to_english("В фирменной футболке")
         
         # Should return original text as fallback
-        assert result == "Кассир"
+        assert result == "В фирменной футболке"
     
     def test_translation_empty_text(self):
         """Test handling of empty text."""
         from services.imagegen_worker.tasks import _translate_to_english
         
-        with patch('services.imagegen_worker.tasks.settings') as mock_settings:
+        with patch('services.imagegen_worker.translation.settings') as mock_settings:
             mock_settings.deepseek_api_key = "test_key"
             
             result = _translate_to_english("")
             
             assert result == ""
+    
+    @patch('httpx.Client')
+    def test_known_profession_from_dictionary(self, mock_httpx):
+        """Test that known professions are translated without an API call."""
+        from services.imagegen_worker.translation import translate
+        
+        assert translate("Повар") == "Cook"
+        mock_httpx.assert_not_called()
+    
+    @patch('services.imagegen_worker.translation.settings')
+    @patch('httpx.Client')
+    def test_translation_cached(self, mock_httpx, mock_settings, fake_redis):
+        """Test that a translation is reused from memory and from Redis."""
+        from services.imagegen_worker.translation import clear_memory_cache, translate
+        
+        mock_settings.deepseek_api_key = "test_key"
+        post = self._llm(mock_httpx, "In a branded T-shirt")
+        
+        assert translate("В фирменной футболке") == "In a branded T-shirt"
+        assert translate("В фирменной футболке") == "In a branded T-shirt"
+        clear_memory_cache()
+        assert translate("В фирменной футболке") == "In a branded T-shirt"
+        
+        assert post.call_count == 1
+    
+    @patch('services.imagegen_worker.translation.settings')
+    @patch('httpx.Client')
+    def test_translate_many_single_request(self, mock_httpx, mock_settings):
+        """Test that all misses go out in one request, in order."""
+        from services.imagegen_worker.translation import translate_many
+        
+        mock_settings.deepseek_api_key = "test_key"
+        post = self._llm(mock_httpx, '```json\n["Night shift", "In a branded T-shirt"]\n```')
+        
+        result = translate_many(["Кассир", "Ночная смена", None, "В фирменной футболке"])
+        
+        assert result == ["Cashier", "Night shift", None, "In a branded T-shirt"]
+        assert post.call_count == 1
+    
+    @patch('services.imagegen_worker.translation.settings')
+    @patch('httpx.Client')
+    def test_translate_many_bad_reply(self, mock_httpx, mock_settings, fake_redis):
+        """Test that an unparseable batch reply keeps the originals uncached."""
+        from services.imagegen_worker.translation import translate_many
+        
+        mock_settings.deepseek_api_key = "test_key"
+        self._llm(mock_httpx, "Night shift; In a branded T-shirt")
+        
+        result = translate_many(["Ночная смена", "В фирменной футболке"])
+        
+        assert result == ["Ночная смена", "В фирменной футболке"]
+        assert fake_redis.keys("adsgen:translation:*") == []
@@ -0,0 +1,122 @@
+"""
+AdsGen 2.0 - Near-Duplicate Detection Tests
+Tests for MinHash signatures and the LSH index
+"""
+
+import json
+import pytest
+from unittest.mock import patch
+
+import fakeredis
+
+BASE = (
+    "<p>Приглашаем кассира в гипермаркет у дома! Мы ищем ответственного и доброжелательного "
+    "человека, который станет частью нашей команды.</p><p><strong>Обязанности:</strong></p>"
+    "<ul><li>Сканирование товаров и работа с наличными и картами</li><li>Выдача сдачи и чеков</li>"
+    "<li>Консультация покупателей на кассе</li><li>Контроль весового товара</li></ul>"
+    "<p><strong>Мы предлагаем:</strong></p><ul><li>Гибкий график работы — выбирайте удобные смены</li>"
+    "<li>Быстрое оформление через приложение</li><li>Обучение на месте, даже без опыта</li>"
+    "<li>Дружный коллектив и поддержку наставника</li></ul><p>Интересный факт: первый кассовый "
+    "аппарат изобрели в 1879 году, чтобы бармены не прикарманивали выручку!</p><p>Откликайтесь!</p>"
+)
+NEAR = BASE.replace("Дружный коллектив", "Сплочённый коллектив").replace("ответственного", "внимательного")
+OTHER = (
+    "<p>Ждём кассира в магазин у дома! Если вам нравится общаться с людьми — эта работа для вас.</p>"
+    "<p><strong>Что нужно делать:</strong></p><ul><li>Обслуживать покупателей на кассе</li>"
+    "<li>Принимать оплату наличными и картой</li><li>Следить за порядком в прикассовой зоне</li></ul>"
+    "<p><strong>Что мы даём:</strong></p><ul><li>Гибкий график работы</li><li>Обучение на месте</li>"
+    "<li>Дружный коллектив</li><li>Оформление за один день</li></ul><p>Желаем удачи!</p>"
+)
+
+
+@pytest.fixture
+def fake_redis():
+    """In-memory Redis for the index."""
+    client = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+    with patch('services.shared.near_duplicates._get_redis_client', return_value=client):
+        yield client
+
+
+class TestMinHash:
+    """Tests for signatures."""
+
+    def test_near_texts_are_similar(self):
+        """Test that a small edit keeps the texts above the threshold."""
+        from services.shared.near_duplicates import minhash, similarity, SIMILARITY_THRESHOLD
+
+        assert similarity(minhash(BASE), minhash(NEAR)) >= SIMILARITY_THRESHOLD
+
+    def test_different_texts_are_not(self):
+        """Test that differently worded descriptions are not near-duplicates."""
+        from services.shared.near_duplicates import minhash, similarity, SIMILARITY_THRESHOLD
+
+        assert similarity(minhash(BASE), minhash(OTHER)) < SIMILARITY_THRESHOLD
+
+    def test_markup_ignored(self):
+        """Test that HTML tags do not affect the signature."""
+        from services.shared.near_duplicates import minhash
+
+        assert minhash(BASE) == minhash(BASE.replace("<p>", "<p><em>").replace("</p>", "</em></p>"))
+
+    def test_hex_roundtrip(self):
+        """Test the stored form of a signature."""
+        from services.shared.near_duplicates import from_hex, minhash, to_hex
+
+        signature = minhash(BASE)
+        assert from_hex(to_hex(signature)) == signature
+
+
+class TestIndex:
+    """Tests for the Redis and in-process indexes."""
+
+    def test_finds_duplicate_of_same_profession(self, fake_redis):
+        """Test lookup within a profession, excluding the vacancy itself."""
+        from services.shared.near_duplicates import add_to_index, find_near_duplicate, minhash
+
+        add_to_index("Кассир", "MSK-1", minhash(BASE))
+
+        assert find_near_duplicate("Кассир", minhash(NEAR))[0] == "MSK-1"
+        assert find_near_duplicate("Кассир", minhash(BASE), exclude_id="MSK-1") is None
+        assert find_near_duplicate("Повар", minhash(NEAR)) is None
+        assert find_near_duplicate("Кассир", minhash(OTHER)) is None
+
+    def test_fails_open_without_redis(self):
+        """Test that lookups return None when Redis is down."""
+        from services.shared.near_duplicates import find_near_duplicate, minhash
+
+        with patch('services.shared.near_duplicates._get_redis_client', side_effect=ConnectionError("down")):
+            assert find_near_duplicate("Кассир", minhash(BASE)) is None
+
+    def test_in_process_index(self):
+        """Test the bulk-scan index."""
+        from services.shared.near_duplicates import MinHashIndex, minhash
+
+        index = MinHashIndex()
+        index.add("MSK-1", minhash(BASE))
+
+        assert index.find(minhash(NEAR))[0] == "MSK-1"
+        assert index.find(minhash(OTHER)) is None
+
+
+class TestTextgenIntegration:
+    """Tests for regenerating duplicate descriptions."""
+
+    @patch('services.textgen_worker.tasks.get_worker_settings')
+    def test_duplicate_description_is_rewritten(self, mock_worker_settings, fake_redis, mock_vacancy):
+        """Test that a near-duplicate description is sent back for rewriting."""
+        from services.shared.near_duplicates import add_to_index, minhash
+        from services.textgen_worker.tasks import _generate_ai_content
+
+        mock_worker_settings.return_value = {"ai_provider": "deepseek", "max_fix_attempts": 1}
+        add_to_index(mock_vacancy.profession, "MSK-OLD", minhash(BASE))
+        fresh = OTHER
+
+        with patch('services.textgen_worker.tasks._stream_completion') as mock_stream:
+            mock_stream.side_effect = [
+                (json.dumps({"title": "Кассир в гипермаркет", "description": NEAR}, ensure_ascii=False), None),
+                (json.dumps({"description": fresh}, ensure_ascii=False), None),
+            ]
+            result = _generate_ai_content(mock_vacancy)
+
+        assert result["description"] == fresh
+        assert "duplicates" in mock_stream.call_args_list[1][0][0][-1]["content"]
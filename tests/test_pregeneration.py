@@ -0,0 +1,200 @@
+"""
+AdsGen 2.0 - Off-Peak Pre-Generation Tests
+Tests for the demand forecast helpers and the text/image pre-generation jobs
+"""
+
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+
+import fakeredis
+
+
+@pytest.fixture
+def fake_redis():
+    """In-memory Redis for the variant cache and run locks."""
+    client = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+    with patch('services.textgen_worker.variant_cache._get_redis_client', return_value=client), \
+         patch('services.shared.demand._get_redis_client', return_value=client):
+        yield client
+
+
+def _session(mock_session_class, vacancy=None):
+    mock_session = MagicMock()
+    mock_session_class.return_value.__enter__ = MagicMock(return_value=mock_session)
+    mock_session_class.return_value.__exit__ = MagicMock(return_value=False)
+    mock_session.get.return_value = vacancy
+    return mock_session
+
+
+class TestScheduling:
+    """Tests for the off-peak window and pacing."""
+
+    @pytest.mark.parametrize("window, hour, expected", [
+        ("01:00-06:00", 3, True),
+        ("01:00-06:00", 6, False),
+        ("22:00-06:00", 23, True),
+        ("22:00-06:00", 2, True),
+        ("22:00-06:00", 12, False),
+        ("", 3, False),
+        ("ночью", 3, False),
+    ])
+    def test_in_window(self, window, hour, expected):
+        """Test windows in Moscow time, including ones wrapping midnight."""
+        from services.shared.demand import LOCAL_TZ, in_window
+
+        now = datetime(2026, 1, 15, hour, 0, tzinfo=LOCAL_TZ).astimezone(timezone.utc)
+        assert in_window(window, now) is expected
+
+    def test_pacer_spacing(self):
+        """Test that calls are spread to the requested rate."""
+        from services.shared.demand import RatePacer
+
+        pacer = RatePacer(per_minute=30)
+        with patch('services.shared.demand.time.monotonic', return_value=100.0), \
+             patch('services.shared.demand.time.sleep') as mock_sleep:
+            pacer.wait()
+            pacer.wait()
+
+        mock_sleep.assert_called_once_with(2.0)
+
+
+class TestTextPregeneration:
+    """Tests for the text variant cache."""
+
+    @patch('services.textgen_worker.tasks.in_window', return_value=True)
+    @patch('services.textgen_worker.tasks.get_worker_settings')
+    @patch('services.textgen_worker.tasks.sync_engine')
+    @patch('services.textgen_worker.tasks.Session')
+    def test_fills_forecast_deficit(self, mock_session_class, mock_engine, mock_worker_settings, mock_window,
+                                    fake_redis, mock_vacancy):
+        """Test that each key is topped up to its expected demand."""
+        from services.textgen_worker.tasks import (
+            _generate_fallback_description, _generate_fallback_title, pregenerate_texts,
+        )
+        from services.textgen_worker.variant_cache import add_variant, variant_key, variant_stock
+
+        _session(mock_session_class)
+        mock_worker_settings.return_value = {"ai_provider": "local", "pregen_enabled": True, "pregen_per_minute": 60}
+        content = {
+            "title": _generate_fallback_title(mock_vacancy),
+            "description": _generate_fallback_description(mock_vacancy),
+        }
+        key = variant_key("Кассир", "ГМ", "", "Москва")
+        add_variant(key, content)
+
+        with patch('services.textgen_worker.tasks.forecast_demand', return_value=[(("Кассир", "ГМ", "", "Москва"), 2.4)]), \
+             patch('services.textgen_worker.tasks._generate_ai_content', return_value=content) as mock_ai, \
+             patch('services.textgen_worker.tasks.RatePacer'):
+            result = pregenerate_texts()
+
+        assert result == {"status": "done", "generated": 2}
+        assert mock_ai.call_args[0][0].address == ""
+        assert variant_stock(key) == 3
+
+    @patch('services.textgen_worker.tasks.get_worker_settings', return_value={"pregen_enabled": False})
+    def test_disabled_by_default(self, mock_worker_settings):
+        """Test that nothing runs unless enabled."""
+        from services.textgen_worker.tasks import pregenerate_texts
+
+        with patch('services.textgen_worker.tasks._generate_ai_content') as mock_ai:
+            assert pregenerate_texts() == {"status": "skipped"}
+        mock_ai.assert_not_called()
+
+    @patch('services.textgen_worker.tasks.sync_engine')
+    @patch('services.textgen_worker.tasks.Session')
+    def test_vacancy_uses_cached_variant(self, mock_session_class, mock_engine, fake_redis, mock_vacancy):
+        """Test that a cached variant replaces the AI call."""
+        from services.textgen_worker.tasks import (
+            _generate_fallback_description, _generate_fallback_title, generate_vacancy_text,
+        )
+        from services.textgen_worker.variant_cache import add_variant, variant_key
+
+        _session(mock_session_class, mock_vacancy)
+        title = _generate_fallback_title(mock_vacancy)
+        add_variant(
+            variant_key(mock_vacancy.profession, mock_vacancy.store_type, mock_vacancy.service, mock_vacancy.city),
+            {"title": title, "description": _generate_fallback_description(mock_vacancy)},
+        )
+
+        with patch('services.textgen_worker.tasks._content_errors', return_value={}), \
+             patch('services.textgen_worker.tasks._generate_ai_content') as mock_ai, \
+             patch('services.textgen_worker.tasks.add_to_index'), \
+             patch('services.imagegen_worker.tasks.generate_vacancy_image'):
+            result = generate_vacancy_text(mock_vacancy.id)
+
+        assert result["status"] == "success"
+        assert mock_vacancy.title == title
+        mock_ai.assert_not_called()
+
+
+class TestImagePregeneration:
+    """Tests for stocking the image library."""
+
+    @patch('services.imagegen_worker.tasks.in_window', return_value=True)
+    @patch('services.imagegen_worker.tasks.sync_engine')
+    @patch('services.imagegen_worker.tasks.Session')
+    def test_fill_sized_by_forecast(self, mock_session_class, mock_engine, mock_window, fake_redis):
+        """Test that a group gets one unused variant per expected vacancy, spread over its keys."""
+        from services.imagegen_worker.tasks import pregenerate_images
+
+        _session(mock_session_class)
+        worker_settings = {"pregen_enabled": True, "pregen_per_minute": 60, "library_variants": 2}
+
+        with patch('services.imagegen_worker.tasks.get_worker_settings', return_value=worker_settings), \
+             patch('services.imagegen_worker.tasks.forecast_demand', return_value=[(("Кассир", None), 2.2)]), \
+             patch('services.imagegen_worker.tasks._library_stock', return_value=1), \
+             patch('services.imagegen_worker.tasks.acquire_node', return_value=("http://comfy-1", "slot")), \
+             patch('services.imagegen_worker.tasks.release_node'), \
+             patch('services.imagegen_worker.tasks.translate_many', return_value=["Cashier", None]) as mock_translate, \
+             patch('services.imagegen_worker.tasks._call_comfyui_batch', return_value=["https://disk.yandex.ru/p.jpg"]) as mock_comfy, \
+             patch('services.imagegen_worker.tasks._add_to_library') as mock_add, \
+             patch('services.imagegen_worker.tasks.record_usage'), \
+             patch('services.imagegen_worker.tasks.RatePacer'):
+            result = pregenerate_images()
+
+        assert result == {"status": "done", "rendered": 3}
+        assert len({call[0][1]["age_bucket"] for call in mock_add.call_args_list}) == 2
+        assert mock_translate.call_count == 1
+        assert mock_comfy.call_args[1]["url"] == "http://comfy-1"
+        assert {call[0][1]["gender"] for call in mock_add.call_args_list} == {"man", "woman"}
+        assert all(call[1] == {"used": False} for call in mock_add.call_args_list)
+
+
+class TestDemandForecast:
+    """Tests for the grouping behind pre-generation."""
+
+    def test_pending_counted_once(self):
+        """Test that recent imports still PENDING are backlog, not also daily rate."""
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import Session
+        from services.shared.database import Base
+        from services.shared.demand import forecast_demand
+        from services.shared.models.vacancy import Vacancy, VacancyStatus
+
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine, tables=[Vacancy.__table__])
+        with Session(engine) as session:
+            session.add_all([
+                Vacancy(
+                    id=f"V-{i}", city="Москва", address="ул. Тестовая, 1", position="Кассир", profession="Кассир",
+                    status=VacancyStatus.PENDING if i < 7 else VacancyStatus.PUBLISHED,
+                    created_at=datetime.now(timezone.utc),
+                )
+                for i in range(14)
+            ])
+            session.commit()
+
+            demand = forecast_demand(session, [Vacancy.profession], days=7)
+
+        assert demand == [(("Кассир",), 8.0)]
+
+    def test_image_groups_follow_library_key(self):
+        """Test that service spellings of one library key share their forecast."""
+        from services.imagegen_worker.tasks import _merge_demand, _plan_fill
+
+        demand = [(("Кассир", "Выкладка"), 1.5), (("Кассир", " выкладка "), 1.0), (("Повар", None), 2.0)]
+
+        assert _merge_demand(demand) == [(("Кассир", "выкладка"), 2.5), (("Повар", ""), 2.0)]
+        assert _plan_fill({"a": 0, "b": 2, "c": 1}, 3, 4) == {"a": 3, "c": 1}
+        assert _plan_fill({"a": 3}, 3, 5) == {}
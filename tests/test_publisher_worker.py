@@ -4,8 +4,43 @@ Tests for XML export and publishing functionality
 """
 
 import pytest
+from datetime import datetime, timezone
 from unittest.mock import MagicMock, patch
 
+import fakeredis
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+
+@pytest.fixture
+def db_engine():
+    """SQLite engine with the vacancies table for export tests."""
+    from services.shared.database import Base
+    from services.shared.models.vacancy import Vacancy
+    
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[Vacancy.__table__])
+    with patch('services.publisher_worker.tasks.sync_engine', engine):
+        yield engine
+
+
+@pytest.fixture
+def fake_redis():
+    """In-memory Redis for the ad fragment cache."""
+    client = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+    with patch('services.publisher_worker.fragment_cache._get_redis_client', return_value=client):
+        yield client
+
+
+def _published(vacancy_id, **kwargs):
+    from services.shared.models.vacancy import Vacancy, VacancyStatus
+    
+    return Vacancy(
+        id=vacancy_id, city="Москва", address="ул. Тестовая, 1", position="Кассир", profession="Кассир",
+        title="Кассир в магазин", description="<p>Приглашаем в команду</p>",
+        **{"status": VacancyStatus.PUBLISHED, **kwargs},
+    )
+
 
 class TestPublishVacancy:
     """Tests for publish_vacancy task."""
@@ -55,9 +90,7 @@ class TestExportToXml:
         mock_session_class.return_value.__enter__ = MagicMock(return_value=mock_session)
         mock_session_class.return_value.__exit__ = MagicMock(return_value=False)
         
-        mock_result = MagicMock()
-        mock_result.scalars.return_value.all.return_value = [mock_vacancy]
-        mock_session.execute.return_value = mock_result
+        mock_session.scalars.return_value = [mock_vacancy]
         
         result = export_to_xml()
         
@@ -75,15 +108,171 @@ class TestExportToXml:
         mock_session_class.return_value.__enter__ = MagicMock(return_value=mock_session)
         mock_session_class.return_value.__exit__ = MagicMock(return_value=False)
         
-        mock_result = MagicMock()
-        mock_result.scalars.return_value.all.return_value = []
-        mock_session.execute.return_value = mock_result
+        mock_session.scalars.return_value = []
         
         result = export_to_xml()
         
         assert result["exported"] == 0
 
 
+class TestStreamingExport:
+    """Tests for the feed streamed through a temporary file."""
+    
+    def test_feed_streamed_to_upload(self, db_engine):
+        """Test that the uploaded file is the full feed and new ads get flagged."""
+        from services.publisher_worker.tasks import _build_xml, export_to_xml
+        from services.shared.models.vacancy import Vacancy, VacancyStatus
+        
+        with Session(db_engine) as session:
+            session.add_all([
+                _published("V-1"),
+                _published("V-2", xml_exported=True),
+                _published("V-3", salary_max=60000),
+                _published("V-4", status=VacancyStatus.VALIDATED),
+            ])
+            session.commit()
+        
+        uploaded = {}
+        
+        def fake_upload(feed_path, filename):
+            uploaded["xml"] = feed_path.read_text(encoding="utf-8")
+            return "https://disk.yandex.ru/d/feed"
+        
+        with patch('services.publisher_worker.tasks.STREAM_BATCH_SIZE', 2), \
+                patch('services.publisher_worker.tasks._upload_to_yandex_disk', side_effect=fake_upload):
+            result = export_to_xml()
+        
+        with Session(db_engine) as session:
+            published = session.scalars(select(Vacancy).where(Vacancy.id != "V-4").order_by(Vacancy.id)).all()
+            expected = _build_xml(published)
+            flags = dict(session.execute(select(Vacancy.id, Vacancy.xml_exported)).all())
+        
+        assert result["exported"] == 3
+        assert result["yandex_disk_url"] == "https://disk.yandex.ru/d/feed"
+        assert uploaded["xml"] == expected
+        assert result["xml_length"] == len(expected)
+        assert flags == {"V-1": True, "V-2": True, "V-3": True, "V-4": False}
+    
+    def test_local_fallback_copies_file(self, db_engine, tmp_path, monkeypatch):
+        """Test that a failed upload leaves the feed in data/."""
+        from services.publisher_worker.tasks import FEED_FILENAME, export_to_xml
+        
+        with Session(db_engine) as session:
+            session.add(_published("V-1"))
+            session.commit()
+        
+        (tmp_path / "data").mkdir()
+        monkeypatch.chdir(tmp_path)
+        
+        with patch('services.publisher_worker.tasks._upload_to_yandex_disk', side_effect=RuntimeError("offline")):
+            result = export_to_xml()
+        
+        saved = (tmp_path / "data" / FEED_FILENAME).read_text(encoding="utf-8")
+        assert result["yandex_disk_url"] is None
+        assert saved.count("<Ad>") == 1
+        assert saved.endswith("</Ads>")
+
+
+class TestFragmentCache:
+    """Tests for incremental feed builds from cached ad fragments."""
+    
+    def _export(self, profile):
+        from services.publisher_worker.tasks import export_to_xml
+        
+        uploaded = {}
+        
+        def fake_upload(feed_path, filename):
+            uploaded["xml"] = feed_path.read_text(encoding="utf-8")
+            return "https://disk.yandex.ru/d/feed"
+        
+        with patch('services.shared.company_profile.get_profile', return_value=profile), \
+                patch('services.publisher_worker.tasks._upload_to_yandex_disk', side_effect=fake_upload):
+            result = export_to_xml()
+        return result, uploaded["xml"]
+    
+    def test_only_changed_ads_rendered(self, db_engine, fake_redis):
+        """Test that a second export re-renders just the edited ad."""
+        from services.shared.company_profile import DEFAULT_PROFILE
+        from services.shared.models.vacancy import Vacancy
+        
+        stamp = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        with Session(db_engine) as session:
+            session.add_all([_published(f"V-{i}", updated_at=stamp, xml_exported=True) for i in range(5)])
+            session.commit()
+        
+        first, first_xml = self._export(dict(DEFAULT_PROFILE))
+        second, second_xml = self._export(dict(DEFAULT_PROFILE))
+        
+        assert (first["rendered"], first["reused"]) == (5, 0)
+        assert (second["rendered"], second["reused"]) == (0, 5)
+        assert second_xml == first_xml
+        
+        with Session(db_engine) as session:
+            vacancy = session.get(Vacancy, "V-2")
+            vacancy.title = "Кассир-консультант"
+            vacancy.updated_at = datetime(2025, 1, 2, tzinfo=timezone.utc)
+            session.commit()
+        
+        third, third_xml = self._export(dict(DEFAULT_PROFILE))
+        
+        assert (third["rendered"], third["reused"]) == (1, 4)
+        assert "<Title>Кассир-консультант</Title>" in third_xml
+        assert third_xml.count("<Ad>") == 5
+    
+    def test_first_export_keeps_fragments_valid(self, db_engine, fake_redis):
+        """Test that flagging new ads as exported does not invalidate their fragments."""
+        from services.shared.company_profile import DEFAULT_PROFILE
+        from services.shared.models.vacancy import Vacancy
+        
+        stamp = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        with Session(db_engine) as session:
+            session.add_all([_published(f"V-{i}", updated_at=stamp) for i in range(3)])
+            session.commit()
+        
+        first, _ = self._export(dict(DEFAULT_PROFILE))
+        second, _ = self._export(dict(DEFAULT_PROFILE))
+        
+        assert (first["rendered"], second["rendered"], second["reused"]) == (3, 0, 3)
+        with Session(db_engine) as session:
+            vacancy = session.get(Vacancy, "V-1")
+            assert vacancy.xml_exported is True
+            assert vacancy.updated_at.replace(tzinfo=timezone.utc) == stamp
+    
+    def test_profile_change_rerenders_all(self, db_engine, fake_redis):
+        """Test that a new template version does not reuse old fragments."""
+        from services.shared.company_profile import DEFAULT_PROFILE
+        
+        with Session(db_engine) as session:
+            session.add_all([_published(f"V-{i}", xml_exported=True) for i in range(3)])
+            session.commit()
+        
+        self._export(dict(DEFAULT_PROFILE))
+        result, xml = self._export({**DEFAULT_PROFILE, "tax": "До вычета"})
+        
+        assert (result["rendered"], result["reused"]) == (3, 0)
+        assert xml.count("<Tax>До вычета</Tax>") == 3
+    
+    def test_redis_down_renders_everything(self, mock_vacancy):
+        """Test that without Redis the feed is identical to an uncached build."""
+        import io
+        from services.publisher_worker.ad_template import AdTemplate
+        from services.publisher_worker.fragment_cache import FragmentCache
+        from services.publisher_worker.tasks import _build_xml, _write_feed
+        
+        broken = MagicMock()
+        broken.mget.side_effect = ConnectionError("refused")
+        template = AdTemplate()
+        
+        with patch('services.publisher_worker.fragment_cache._get_redis_client', return_value=broken):
+            cache = FragmentCache(template)
+            out = io.StringIO()
+            _write_feed([mock_vacancy] * 3, out, template, cache)
+        
+        assert out.getvalue() == _build_xml([mock_vacancy] * 3, template)
+        assert cache.rendered == 3
+        broken.pipeline.assert_not_called()
+
+
 class TestXmlGeneration:
     """Tests for XML building functions."""
     
@@ -126,6 +315,46 @@ class TestXmlGeneration:
         assert "</Ads>" in xml
 
 
+class TestAdTemplate:
+    """Tests for the per-export prerendered ad template."""
+    
+    def test_profile_read_once_per_feed(self, mock_vacancy):
+        """Test that a feed takes one profile snapshot for all ads."""
+        from services.publisher_worker.tasks import _build_xml
+        from services.shared.company_profile import DEFAULT_PROFILE
+        
+        with patch('services.publisher_worker.ad_template.get_profile', return_value=dict(DEFAULT_PROFILE)) as mock_profile:
+            xml = _build_xml([mock_vacancy] * 50)
+        
+        assert mock_profile.call_count == 1
+        assert xml.count("<Ad>") == 50
+    
+    def test_profile_values_rendered(self, mock_vacancy):
+        """Test that profile fields and option blocks come from the snapshot."""
+        from services.publisher_worker.ad_template import AdTemplate
+        from services.shared.company_profile import DEFAULT_PROFILE
+        
+        profile = {**DEFAULT_PROFILE, "listing_fee": "Single", "job_bonuses": ["Питание", "Форма"]}
+        mock_vacancy.salary_max = 60000
+        
+        xml = AdTemplate(profile).render(mock_vacancy)
+        
+        assert "<ListingFee>Single</ListingFee>" in xml
+        assert "<JobBonuses>\n\t\t\t<Option>Питание</Option>\n\t\t\t<Option>Форма</Option>\n\t\t</JobBonuses>" in xml
+        assert "<Price>60000</Price>\n\t\t<AskCitizenship>" in xml
+        assert xml.endswith("\t</Ad>")
+    
+    def test_version_follows_profile(self):
+        """Test that the template version changes with the profile."""
+        from services.publisher_worker.ad_template import AdTemplate
+        from services.shared.company_profile import DEFAULT_PROFILE
+        
+        base = AdTemplate(dict(DEFAULT_PROFILE)).version
+        
+        assert base == AdTemplate(dict(DEFAULT_PROFILE)).version
+        assert base != AdTemplate({**DEFAULT_PROFILE, "tax": "До вычета"}).version
+
+
 class TestXmlEscaping:
     """Tests for XML escaping function."""
     
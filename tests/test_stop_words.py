@@ -0,0 +1,100 @@
+"""
+AdsGen 2.0 - Stop Word Matcher Tests
+Tests for word-bounded, inflection-aware stop phrase matching and hot reload
+"""
+
+import pytest
+from unittest.mock import patch
+
+import fakeredis
+
+
+@pytest.fixture
+def fake_redis():
+    """In-memory Redis for the runtime list, with a fresh matcher."""
+    from services.shared.stop_words import reset_matcher
+
+    client = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+    reset_matcher()
+    with patch('services.shared.stop_words._get_redis_client', return_value=client):
+        yield client
+    reset_matcher()
+
+
+class TestMatcher:
+    """Tests for the automaton."""
+
+    @pytest.mark.parametrize("text,expected", [
+        ("Требуется медицинской справки", ["медицинская справка"]),
+        ("Нужно хорошее здоровье", ["хорошее здоровье"]),
+        ("Приём граждан РФ", ["граждане рф"]),
+        ("Звоните по телефону", ["звоните", "телефон"]),
+        ("Телефонный оператор", []),
+        ("Кассир в магазин", []),
+        ("Приглашаем молодых и активных", ['"молодых"']),
+        ("Молодой коллектив, молодёжная команда", []),
+    ])
+    def test_builtin_phrases(self, text, expected):
+        """Test inflected matches and word boundaries."""
+        from services.shared.content_rules import STOP_WORDS
+        from services.shared.stop_words import StopWordMatcher
+
+        assert StopWordMatcher(STOP_WORDS).find(text) == expected
+
+    def test_overlapping_phrases(self):
+        """Test that phrases ending inside a longer partial match are still found."""
+        from services.shared.stop_words import StopWordMatcher
+
+        matcher = StopWordMatcher(["работа без опыта", "без опыта работы", "опыт"])
+
+        assert matcher.find("Работа без опыта работы") == ["работа без опыта", "опыт", "без опыта работы"]
+
+    def test_quoted_phrase_is_exact(self):
+        """Test that a quoted phrase skips stemming and still combines with inflected ones."""
+        from services.shared.stop_words import StopWordMatcher
+
+        matcher = StopWordMatcher(['"молодых сотрудников"', "опыт"])
+
+        assert matcher.find("Для молодых сотрудников без опыта") == ['"молодых сотрудников"', "опыт"]
+        assert matcher.find("Для молодого сотрудника") == []
+
+    def test_phrase_needs_adjacent_words(self):
+        """Test that the words of a phrase have to follow each other."""
+        from services.shared.stop_words import StopWordMatcher
+
+        assert StopWordMatcher(["пассивный доход"]).find("пассивный и стабильный доход") == []
+
+    def test_thousands_of_phrases(self):
+        """Test that a large list builds and matches."""
+        from services.shared.stop_words import StopWordMatcher
+
+        matcher = StopWordMatcher([f"запрет{i} слово{i}" for i in range(5000)])
+
+        assert matcher.find("тут запрет4321 слово4321 и запрет7 слово8") == ["запрет4321 слово4321"]
+
+
+class TestHotReload:
+    """Tests for the Redis phrase list."""
+
+    def test_runtime_phrases_are_picked_up(self, fake_redis):
+        """Test that a new list replaces the matcher once the version changes."""
+        from services.shared.content_rules import check_stop_words
+        from services.shared.stop_words import get_custom_stop_words, set_custom_stop_words
+
+        assert check_stop_words("Кассир", "Оплата наличными") == []
+
+        assert set_custom_stop_words(["оплата наличными", " "])
+        with patch('services.shared.stop_words.RELOAD_CHECK_SECONDS', 0):
+            errors = check_stop_words("Кассир", "Оплата наличными")
+
+        assert errors == ["Contains prohibited phrase: 'оплата наличными'"]
+        assert get_custom_stop_words() == ["оплата наличными"]
+
+    def test_builtin_list_without_redis(self):
+        """Test that the built-in list works when Redis is down."""
+        from services.shared.stop_words import get_matcher, reset_matcher
+
+        reset_matcher()
+        with patch('services.shared.stop_words._get_redis_client', side_effect=ConnectionError("down")):
+            assert get_matcher().find("только мужчины") == ["только мужчины"]
+        reset_matcher()
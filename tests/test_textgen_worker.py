@@ -5,8 +5,23 @@ Tests for text generation functionality
 
 import pytest
 import json
+from pathlib import Path
 from unittest.mock import MagicMock, patch
 
+AI_RESPONSES = json.loads(
+    (Path(__file__).parent / "fixtures" / "ai_responses.json").read_text(encoding="utf-8")
+)
+
+
+def _sse_lines(content: str, size: int = 8) -> list[str]:
+    """Split content into OpenAI-style SSE lines."""
+    lines = []
+    for i in range(0, len(content), size):
+        chunk = {"choices": [{"delta": {"content": content[i:i + size]}}]}
+        lines.append(f"data: {json.dumps(chunk, ensure_ascii=False)}")
+    lines.append("data: [DONE]")
+    return lines
+
 
 class TestGenerateVacancyText:
     """Tests for generate_vacancy_text task."""
@@ -87,11 +102,12 @@ class TestAIContentGeneration:
         mock_settings.deepseek_api_url = "https://api.test.com"
         mock_settings.deepseek_model = "test-model"
         
-        # Mock HTTP response
+        # Mock HTTP response (non-streaming server answering with plain JSON)
         mock_response = MagicMock()
         mock_response.status_code = 200
-        mock_response.json.return_value = mock_deepseek_response
-        mock_httpx.return_value.__enter__.return_value.post.return_value = mock_response
+        mock_response.headers = {"content-type": "application/json"}
+        mock_response.read.return_value = json.dumps(mock_deepseek_response).encode()
+        mock_httpx.return_value.__enter__.return_value.stream.return_value.__enter__.return_value = mock_response
         
         result = _generate_ai_content(mock_vacancy)
         
@@ -99,6 +115,194 @@ class TestAIContentGeneration:
         assert "title" in result
         assert "description" in result
     
+    @patch('services.textgen_worker.tasks.settings')
+    @patch('httpx.Client')
+    def test_ai_content_streamed(self, mock_httpx, mock_settings, mock_vacancy):
+        """Test parsing a streamed (SSE) AI response."""
+        from services.textgen_worker.tasks import _generate_ai_content
+        
+        mock_settings.deepseek_api_key = "test_key"
+        
+        content = '{"title": "Кассир в магазин", "description": "<p>Описание</p>"}'
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.headers = {"content-type": "text/event-stream"}
+        mock_response.iter_lines.return_value = _sse_lines(content)
+        mock_httpx.return_value.__enter__.return_value.stream.return_value.__enter__.return_value = mock_response
+        
+        result = _generate_ai_content(mock_vacancy)
+        
+        assert result == {"title": "Кассир в магазин", "description": "<p>Описание</p>"}
+    
+    @patch('services.textgen_worker.tasks.settings')
+    @patch('httpx.Client')
+    def test_ai_content_aborts_on_bad_title(self, mock_httpx, mock_settings, mock_vacancy):
+        """Test that a salary in the title cancels the stream and retries."""
+        from services.textgen_worker.tasks import _generate_ai_content
+        
+        mock_settings.deepseek_api_key = "test_key"
+        
+        bad = '{"title": "Кассир от 50000 руб", "description": "<p>' + "Описание " * 50 + '</p>"}'
+        good = '{"title": "Кассир в магазин", "description": "<p>Описание</p>"}'
+        
+        streamed = []
+        
+        def make_response(lines):
+            response = MagicMock()
+            response.status_code = 200
+            response.headers = {"content-type": "text/event-stream"}
+            
+            def iter_lines():
+                for line in lines:
+                    streamed.append(line)
+                    yield line
+            response.iter_lines.side_effect = iter_lines
+            return response
+        
+        stream_ctx = mock_httpx.return_value.__enter__.return_value.stream.return_value
+        stream_ctx.__enter__.side_effect = [make_response(_sse_lines(bad)), make_response(_sse_lines(good))]
+        
+        result = _generate_ai_content(mock_vacancy)
+        
+        assert result["title"] == "Кассир в магазин"
+        # The bad stream was cancelled before the description was read
+        assert len(streamed) < len(_sse_lines(bad)) + len(_sse_lines(good))
+
+
+class TestProviderResolution:
+    """Tests for choosing the chat-completions endpoint."""
+
+    @patch('services.textgen_worker.tasks.get_worker_settings')
+    @patch('services.textgen_worker.tasks.settings')
+    def test_deepseek_from_environment(self, mock_settings, mock_worker_settings):
+        """Test that DeepSeek uses the URL and key from the environment."""
+        from services.textgen_worker.tasks import _resolve_provider
+
+        mock_settings.deepseek_api_url = "http://localhost:8090/v1/chat/completions"
+        mock_settings.deepseek_api_key = "fake"
+        mock_settings.deepseek_model = "deepseek-chat"
+        mock_worker_settings.return_value = {"ai_provider": "deepseek", "temperature": 0.5, "max_tokens": 1000}
+
+        provider = _resolve_provider()
+
+        assert provider.name == "deepseek"
+        assert provider.url == "http://localhost:8090/v1/chat/completions"
+        assert provider.temperature == 0.5
+        assert provider.max_tokens == 1000
+
+    @patch('services.textgen_worker.tasks.get_worker_settings')
+    @patch('services.textgen_worker.tasks.settings')
+    @patch('httpx.Client')
+    def test_local_provider_without_key(self, mock_httpx, mock_settings, mock_worker_settings, mock_vacancy):
+        """Test that a local server is called without a key or max_tokens."""
+        from services.textgen_worker.tasks import _generate_ai_content
+
+        mock_settings.deepseek_api_key = ""
+        mock_worker_settings.return_value = {
+            "ai_provider": "local",
+            "local_ai_url": "http://localhost:8090/v1/chat/completions",
+            "local_ai_model": "fake",
+            "temperature": 0.9,
+            "max_tokens": -1,
+        }
+
+        content = '{"title": "Кассир в магазин", "description": "<p>Описание</p>"}'
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.headers = {"content-type": "text/event-stream"}
+        mock_response.iter_lines.return_value = _sse_lines(content)
+        client = mock_httpx.return_value.__enter__.return_value
+        client.stream.return_value.__enter__.return_value = mock_response
+
+        result = _generate_ai_content(mock_vacancy)
+
+        assert result["title"] == "Кассир в магазин"
+        args, kwargs = client.stream.call_args
+        assert args[1] == "http://localhost:8090/v1/chat/completions"
+        assert "Authorization" not in kwargs["headers"]
+        assert "max_tokens" not in kwargs["json"]
+
+
+class TestRuleFixLoop:
+    """Tests for inline validation of generated text."""
+    
+    @patch('services.textgen_worker.tasks.get_worker_settings')
+    def test_regenerates_only_failing_field(self, mock_worker_settings, mock_vacancy):
+        """Test that a too-short description is rewritten and the title kept."""
+        from services.textgen_worker.tasks import _generate_ai_content
+        
+        mock_worker_settings.return_value = {"ai_provider": "deepseek", "max_fix_attempts": 2}
+        long_description = "<p>" + "Работа в дружной команде. " * 20 + "</p>"
+        
+        with patch('services.textgen_worker.tasks._stream_completion') as mock_stream:
+            mock_stream.side_effect = [
+                ('{"title": "Кассир в магазин", "description": "<p>Коротко</p>"}', None),
+                (json.dumps({"description": long_description}, ensure_ascii=False), None),
+            ]
+            result = _generate_ai_content(mock_vacancy)
+        
+        assert result == {"title": "Кассир в магазин", "description": long_description}
+        assert mock_stream.call_count == 2
+        fix_request = mock_stream.call_args_list[1][0][0][-1]["content"]
+        assert "description" in fix_request
+        assert "Description too short" in fix_request
+    
+    @patch('services.textgen_worker.tasks.sync_engine')
+    @patch('services.textgen_worker.tasks.Session')
+    def test_invalid_text_stops_before_imagegen(self, mock_session_class, mock_engine, mock_vacancy):
+        """Test that text failing the rules is marked ERROR without an image job."""
+        from services.shared.models.vacancy import VacancyStatus
+        from services.textgen_worker.tasks import generate_vacancy_text
+        
+        mock_session = MagicMock()
+        mock_session_class.return_value.__enter__ = MagicMock(return_value=mock_session)
+        mock_session_class.return_value.__exit__ = MagicMock(return_value=False)
+        mock_session.get.return_value = mock_vacancy
+        
+        with patch('services.textgen_worker.tasks._generate_ai_content', return_value=None), \
+             patch('services.textgen_worker.tasks._generate_fallback_description', return_value="<p>Коротко</p>"), \
+             patch('services.imagegen_worker.tasks.generate_vacancy_image') as mock_image:
+            result = generate_vacancy_text(mock_vacancy.id)
+        
+        assert result["status"] == "failed"
+        assert mock_vacancy.status == VacancyStatus.ERROR
+        mock_image.delay.assert_not_called()
+    
+    def test_fallback_text_passes_rules(self, mock_vacancy):
+        """Test that template fallbacks never break the Avito rules."""
+        from services.shared.content_rules import validate_text
+        from services.textgen_worker.tasks import _generate_fallback_title, _generate_fallback_description
+        
+        for _ in range(20):
+            title = _generate_fallback_title(mock_vacancy)
+            description = _generate_fallback_description(mock_vacancy)
+            assert validate_text(title, description) == {}
+
+
+class TestJsonFieldStream:
+    """Tests for the incremental JSON field extractor."""
+    
+    def test_fields_emitted_when_complete(self):
+        """Test that the title is available before the description ends."""
+        from services.textgen_worker.streaming import JsonFieldStream
+        
+        parser = JsonFieldStream()
+        
+        assert parser.feed('```json\n{"title": "Касс') == []
+        assert parser.feed('ир", "descr') == [("title", "Кассир")]
+        assert parser.feed('iption": "<p>{а}</p>') == []
+        assert parser.feed(' \\"ok\\""}') == [("description", '<p>{а}</p> "ok"')]
+        assert parser.done
+    
+    def test_nested_values_ignored(self):
+        """Test that nested objects do not confuse the extractor."""
+        from services.textgen_worker.streaming import JsonFieldStream
+        
+        parser = JsonFieldStream()
+        completed = parser.feed('{"meta": {"title": "x"}, "title": "Повар"}')
+        
+        assert completed == [("title", "Повар")]
+    
     @patch('services.textgen_worker.tasks.settings')
     def test_ai_content_without_api_key(self, mock_settings, mock_vacancy):
         """Test fallback when API key is missing."""
@@ -127,3 +331,93 @@ class TestTitleCleaning:
         truncated = long_title[:100]
         
         assert len(truncated) == 100
+
+
+class TestPromptLayout:
+    """Tests for the cache-friendly prompt layout."""
+    
+    def test_static_prefix_shared_across_vacancies(self):
+        """Test that the system message does not depend on vacancy fields."""
+        from services.textgen_worker.prompts import build_generation_messages
+        
+        first = build_generation_messages("Кассир", "Москва, ул. 1", "от 200", "", "ГМ")
+        second = build_generation_messages("Повар", "Курск, ул. 2", "от 300", "Кухня", "МФ")
+        
+        assert first[0]["role"] == "system"
+        assert first[0]["content"] == second[0]["content"]
+        assert "Кассир" not in first[0]["content"]
+        assert "Профессия: Повар" in second[1]["content"]
+    
+    def test_templates_stripped_at_import(self):
+        """Test that inspiration templates carry no HTML."""
+        from services.textgen_worker.prompts import PLAIN_TEMPLATES
+        
+        for template in PLAIN_TEMPLATES.values():
+            for text in template["duties"] + template["advantages"]:
+                assert "<" not in text
+
+
+class TestParseAiResponse:
+    """Tests for JSON extraction from LLM output (regression corpus)."""
+    
+    @pytest.mark.parametrize("case", AI_RESPONSES, ids=[c["name"] for c in AI_RESPONSES])
+    def test_corpus(self, case):
+        """Test every recorded response shape."""
+        from services.textgen_worker.tasks import _parse_ai_response
+        
+        assert _parse_ai_response(case["raw"]) == case["expected"]
+    
+    def test_linear_on_large_input(self):
+        """Test that a long brace-heavy preamble is skipped in one pass."""
+        from services.textgen_worker.json_extract import extract_json_object
+        
+        text = "{x} " * 50000 + '{"title": "Кассир", "description": "<p>ok</p>"}'
+        
+        assert extract_json_object(text) == {"title": "Кассир", "description": "<p>ok</p>"}
+
+
+class TestUsageAccounting:
+    """Tests for token and latency accounting."""
+    
+    def test_cache_hit_tokens_deepseek(self):
+        """Test DeepSeek-style cache hit reporting."""
+        from services.shared.usage import cache_hit_tokens
+        
+        assert cache_hit_tokens({"prompt_tokens": 900, "prompt_cache_hit_tokens": 640}) == 640
+    
+    def test_cache_hit_tokens_openai(self):
+        """Test OpenAI-style cache hit reporting."""
+        from services.shared.usage import cache_hit_tokens
+        
+        assert cache_hit_tokens({"prompt_tokens_details": {"cached_tokens": 512}}) == 512
+        assert cache_hit_tokens({}) == 0
+    
+    def test_record_usage_row(self, mock_vacancy):
+        """Test that a usage row is built from the provider usage object."""
+        from services.shared.usage import record_usage
+        from services.shared.models.usage import UsageKind
+        
+        mock_vacancy.import_batch_id = 7
+        
+        with patch('services.shared.usage.Session') as mock_session_class:
+            session = mock_session_class.return_value.__enter__.return_value
+            record_usage(
+                UsageKind.TEXT, "deepseek", 1.5, vacancy=mock_vacancy, model="deepseek-chat",
+                usage={"prompt_tokens": 900, "prompt_cache_hit_tokens": 640, "completion_tokens": 400},
+            )
+        
+        row = session.add.call_args[0][0]
+        assert row.vacancy_id == mock_vacancy.id
+        assert row.import_batch_id == 7
+        assert row.prompt_tokens == 900
+        assert row.cached_tokens == 640
+        assert row.completion_tokens == 400
+        assert row.latency_ms == 1500
+    
+    def test_record_usage_never_raises(self):
+        """Test that accounting failures do not break generation."""
+        from services.shared.usage import record_usage
+        from services.shared.models.usage import UsageKind
+        
+        with patch('services.shared.usage.Session', side_effect=RuntimeError("db down")):
+            record_usage(UsageKind.IMAGE, "comfyui", 10.0)
@@ -0,0 +1,187 @@
+"""
+AdsGen 2.0 - Image URL Check Cache Tests
+Tests for cached, single-flight image reachability checks in validation
+"""
+
+import threading
+import pytest
+from unittest.mock import MagicMock, patch
+
+import fakeredis
+
+
+@pytest.fixture
+def fake_redis():
+    """In-memory Redis and an empty process cache."""
+    from services.validation_worker.url_cache import clear_memory_cache
+
+    clear_memory_cache()
+    client = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+    with patch('services.validation_worker.url_cache._get_redis_client', return_value=client):
+        yield client
+    clear_memory_cache()
+
+
+def _head_response(status_code=200, content_type="image/jpeg"):
+    response = MagicMock(status_code=status_code)
+    response.headers = {"content-type": content_type}
+    return response
+
+
+class TestCachedValidation:
+    """Tests for skipping repeated HEAD requests."""
+
+    @patch('httpx.Client')
+    def test_repeat_validation_skips_network(self, mock_httpx, fake_redis):
+        """Test that a shared image is checked once for many vacancies."""
+        from services.validation_worker.tasks import _validate_image
+
+        head = mock_httpx.return_value.__enter__.return_value.head
+        head.return_value = _head_response()
+
+        for _ in range(5):
+            assert _validate_image("https://cdn.example.com/fallback.jpg") == []
+
+        assert head.call_count == 1
+
+    @patch('httpx.Client')
+    def test_result_shared_through_redis(self, mock_httpx, fake_redis):
+        """Test that another process reuses the stored result."""
+        from services.validation_worker.tasks import _validate_image
+        from services.validation_worker.url_cache import clear_memory_cache
+
+        head = mock_httpx.return_value.__enter__.return_value.head
+        head.return_value = _head_response()
+
+        _validate_image("https://cdn.example.com/a.jpg")
+        clear_memory_cache()
+        _validate_image("https://cdn.example.com/a.jpg")
+
+        assert head.call_count == 1
+
+    @patch('httpx.Client')
+    def test_failures_expire_sooner(self, mock_httpx, fake_redis):
+        """Test positive and negative TTLs."""
+        from services.validation_worker.tasks import _validate_image
+        from services.validation_worker.url_cache import NEGATIVE_TTL, POSITIVE_TTL, URL_CHECK_PREFIX, _digest
+
+        head = mock_httpx.return_value.__enter__.return_value.head
+        head.return_value = _head_response(404)
+        errors = _validate_image("https://cdn.example.com/missing.jpg")
+        head.return_value = _head_response()
+        _validate_image("https://cdn.example.com/ok.jpg")
+
+        assert errors == ["Image not accessible (HTTP 404)"]
+        assert 0 < fake_redis.ttl(f"{URL_CHECK_PREFIX}{_digest('https://cdn.example.com/missing.jpg')}") <= NEGATIVE_TTL
+        assert fake_redis.ttl(f"{URL_CHECK_PREFIX}{_digest('https://cdn.example.com/ok.jpg')}") > NEGATIVE_TTL
+        assert fake_redis.ttl(f"{URL_CHECK_PREFIX}{_digest('https://cdn.example.com/ok.jpg')}") <= POSITIVE_TTL
+
+    @patch('httpx.Client')
+    def test_works_without_redis(self, mock_httpx):
+        """Test that a missing Redis falls back to the process cache."""
+        from services.validation_worker.tasks import _validate_image
+        from services.validation_worker.url_cache import clear_memory_cache
+
+        clear_memory_cache()
+        head = mock_httpx.return_value.__enter__.return_value.head
+        head.return_value = _head_response()
+
+        with patch('services.validation_worker.url_cache._get_redis_client', side_effect=ConnectionError("down")):
+            assert _validate_image("https://cdn.example.com/b.jpg") == []
+            assert _validate_image("https://cdn.example.com/b.jpg") == []
+
+        assert head.call_count == 1
+        clear_memory_cache()
+
+
+class TestSingleFlight:
+    """Tests for deduplicating concurrent checks."""
+
+    def test_waiter_takes_holders_result(self, fake_redis):
+        """Test that a second checker waits instead of sending its own request."""
+        from services.validation_worker.url_cache import acquire_check, cached_check, release_check, store
+
+        url = "https://cdn.example.com/busy.jpg"
+        token = acquire_check(url)
+        assert token
+
+        def finish():
+            store(url, [])
+            release_check(url, token)
+
+        timer = threading.Timer(0.3, finish)
+        timer.start()
+        check = MagicMock(return_value=["should not run"])
+
+        with patch('services.validation_worker.url_cache.WAIT_POLL_SECONDS', 0.05):
+            errors = cached_check(url, check)
+        timer.join()
+
+        assert errors == []
+        check.assert_not_called()
+
+    def test_concurrent_threads_send_one_request(self, fake_redis):
+        """Test that threads validating one URL at once share a single check."""
+        from services.validation_worker.url_cache import cached_check
+
+        calls = []
+
+        def check(url):
+            calls.append(url)
+            threading.Event().wait(0.2)
+            return []
+
+        with patch('services.validation_worker.url_cache.WAIT_POLL_SECONDS', 0.05):
+            threads = [
+                threading.Thread(target=cached_check, args=("https://cdn.example.com/hot.jpg", check))
+                for _ in range(8)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        assert len(calls) == 1
+
+
+    def test_expired_holder_keeps_next_lock(self, fake_redis):
+        """Test that a holder whose lock expired does not release the next holder's lock."""
+        from services.validation_worker.url_cache import URL_CHECK_LOCK_PREFIX, _digest, acquire_check, release_check
+
+        url = "https://cdn.example.com/slow.jpg"
+        key = f"{URL_CHECK_LOCK_PREFIX}{_digest(url)}"
+        stale = acquire_check(url)
+        fake_redis.delete(key)  # lock TTL ran out during a slow check
+        current = acquire_check(url)
+
+        release_check(url, stale)
+        assert acquire_check(url) is None
+
+        release_check(url, current)
+        assert acquire_check(url)
+
+
+class TestRecordedMetadata:
+    """Tests for images with metadata from post-processing."""
+
+    def test_library_image_found_by_url(self):
+        """Test that an image without a hash is matched to its asset by URL."""
+        from services.validation_worker.tasks import _find_asset
+
+        session = MagicMock()
+        asset = MagicMock()
+        session.scalars.return_value.first.return_value = asset
+        vacancy = MagicMock(image_hash=None, image_url="https://disk.yandex.ru/i/lib.jpg")
+
+        assert _find_asset(session, vacancy) is asset
+        session.get.assert_not_called()
+
+    @patch('httpx.Client')
+    def test_asset_skips_network(self, mock_httpx):
+        """Test that recorded metadata is validated without any request."""
+        from services.validation_worker.tasks import _validate_image
+
+        asset = MagicMock(width=1280, height=960, mime="image/jpeg")
+
+        assert _validate_image("https://disk.yandex.ru/i/lib.jpg", asset) == []
+        mock_httpx.assert_not_called()
@@ -0,0 +1,174 @@
+"""
+AdsGen 2.0 - Validation Rule Engine Tests
+Tests for the rule registry, configurable severities and per-rule stats
+"""
+
+import pytest
+from unittest.mock import MagicMock, patch
+
+import fakeredis
+
+GOOD_DESCRIPTION = "<p>" + "Приглашаем в команду магазина, обучение и оформление. " * 8 + "</p>"
+
+
+@pytest.fixture
+def fake_redis():
+    """In-memory Redis for the counters."""
+    client = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+    with patch('services.shared.validation_rules._get_redis_client', return_value=client):
+        yield client
+
+
+class TestSalaryPattern:
+    """Tests for the merged salary alternation."""
+
+    @pytest.mark.parametrize("title,expected", [
+        ("Кассир 50000 руб", True),
+        ("Кассир от 3000", True),
+        ("Грузчик, ежедневные выплаты", True),
+        ("Кассир в супермаркет", False),
+    ])
+    def test_salary_in_title(self, title, expected):
+        """Test that every pattern of the list is still matched."""
+        from services.shared.content_rules import SALARY_RE
+
+        assert bool(SALARY_RE.search(title)) is expected
+
+
+class TestRunRules:
+    """Tests for running the registry."""
+
+    def test_same_result_as_field_checks(self):
+        """Test that the default rule set reports what the field checks report."""
+        from services.shared.content_rules import check_stop_words, validate_description, validate_title
+        from services.shared.validation_rules import AdContent, get_rule_config, run_rules
+
+        title, description = "Кассир | от 50000 руб", "<h3>Коротко</h3> звоните"
+        ad = AdContent(title, description, image=lambda: ["Image URL is missing"])
+
+        errors, warnings = run_rules(ad, get_rule_config({}))
+
+        desc_errors, desc_warnings = validate_description(description)
+        assert errors == [
+            *validate_title(title), *desc_errors, "Image URL is missing", *check_stop_words(title, description),
+        ]
+        assert warnings == desc_warnings
+
+    def test_severity_and_disabled_rules(self):
+        """Test that settings demote a rule to a warning or switch it off."""
+        from services.shared.validation_rules import AdContent, get_rule_config, run_rules
+
+        image = MagicMock(return_value=["Image not accessible (HTTP 404)"])
+        ad = AdContent("Кассир, ежедневные выплаты", GOOD_DESCRIPTION, image=image)
+        config = get_rule_config({"rule_title_salary": "warning", "rule_image": "off", "rule_stop_words": "bogus"})
+
+        errors, warnings = run_rules(ad, config)
+
+        assert errors == []
+        assert warnings == ["Title should not contain salary information"]
+        assert config["stop_words"] == "error"
+        image.assert_not_called()
+
+    def test_markup_scanned_once(self):
+        """Test that the description rules share one HTML pass."""
+        from services.shared.html_validator import check_html
+        from services.shared.validation_rules import AdContent, get_rule_config, run_rules
+
+        with patch('services.shared.validation_rules.check_html', wraps=check_html) as mock_check:
+            run_rules(AdContent("Кассир в магазин", GOOD_DESCRIPTION), get_rule_config({}))
+
+        assert mock_check.call_count == 1
+
+
+class TestTextErrors:
+    """Tests for the per-field text check used by generation."""
+
+    def test_follows_configured_severity(self):
+        """Test that demoted or disabled rules do not send a field back for regeneration."""
+        from services.shared.content_rules import validate_text
+        from services.shared.validation_rules import get_rule_config
+
+        description = "<h3>Кассир</h3>" + GOOD_DESCRIPTION
+
+        strict = validate_text("Кассир, ежедневные выплаты", description, get_rule_config({}))
+        relaxed = validate_text(
+            "Кассир, ежедневные выплаты", description,
+            get_rule_config({"rule_title_salary": "warning", "rule_description_markup": "off"}),
+        )
+
+        assert strict["title"] == ["Title should not contain salary information"]
+        assert strict["description"] == ["Tag <h3> is not allowed"]
+        assert relaxed == {}
+
+    def test_stop_words_attributed_to_field(self):
+        """Test that a stop phrase fails only the field containing it."""
+        from services.shared.content_rules import validate_text
+        from services.shared.validation_rules import get_rule_config
+
+        errors = validate_text("Кассир в магазин", GOOD_DESCRIPTION + "<p>Звоните!</p>", get_rule_config({}))
+
+        assert list(errors) == ["description"]
+        assert errors["description"] == ["Contains prohibited phrase: 'звоните'"]
+
+
+class TestRuleStats:
+    """Tests for per-rule counters."""
+
+    def test_counters_accumulate(self, fake_redis):
+        """Test that calls, hits and time are summed per rule across flushes."""
+        from services.shared.validation_rules import AdContent, RuleStats, get_rule_config, get_rule_stats, run_rules
+
+        config = get_rule_config({"rule_image": "off"})
+        stats = RuleStats()
+        run_rules(AdContent("Кассир в магазин", GOOD_DESCRIPTION), config, stats)
+        stats.flush()
+        run_rules(AdContent("Кассир | магазин", GOOD_DESCRIPTION), config, stats)
+        stats.flush()
+
+        by_name = {rule["name"]: rule for rule in get_rule_stats(config)}
+
+        assert (by_name["title_pipe"]["calls"], by_name["title_pipe"]["hits"]) == (2, 1)
+        assert by_name["title_pipe"]["hit_rate"] == 0.5
+        assert by_name["stop_words"]["total_seconds"] >= 0
+        assert (by_name["image"]["calls"], by_name["image"]["severity"]) == (0, "off")
+
+    def test_stats_without_redis(self):
+        """Test that a missing Redis does not break validation or the report."""
+        from services.shared.validation_rules import RuleStats, get_rule_stats
+
+        stats = RuleStats()
+        stats.record("title_pipe", 0.001, True)
+        with patch('services.shared.validation_rules._get_redis_client', side_effect=ConnectionError("down")):
+            stats.flush()
+            report = get_rule_stats({})
+
+        assert report[0]["calls"] == 0
+        assert not stats.calls
+
+
+class TestRulesVersion:
+    """Tests for the rule set fingerprint and content hash."""
+
+    def test_version_follows_configuration(self):
+        """Test that severities and the stop word list change the version."""
+        from services.shared.validation_rules import get_rule_config, rules_version
+
+        with patch('services.shared.stop_words.get_version', return_value="1"):
+            base = rules_version(get_rule_config({}))
+            same = rules_version(get_rule_config({"rule_title_pipe": "error"}))
+            demoted = rules_version(get_rule_config({"rule_title_pipe": "warning"}))
+        with patch('services.shared.stop_words.get_version', return_value="2"):
+            new_words = rules_version(get_rule_config({}))
+
+        assert base == same
+        assert len({base, demoted, new_words}) == 3
+
+    def test_content_hash(self):
+        """Test that any rule input changes the hash and field boundaries matter."""
+        from services.shared.validation_rules import content_hash
+
+        base = content_hash("Кассир", "Описание", "https://a/1.jpg", None)
+
+        assert base == content_hash("Кассир", "Описание", "https://a/1.jpg", None)
+        assert base != content_hash("Кассир", "Описание", "https://a/1.jpg", "f" * 64)
+        assert content_hash("ab", "c", None, None) != content_hash("a", "bc", None, None)
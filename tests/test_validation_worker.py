@@ -6,6 +6,20 @@ Tests for content validation functionality
 import pytest
 from unittest.mock import MagicMock, patch
 
+import fakeredis
+
+
+@pytest.fixture
+def fresh_url_cache():
+    """Empty image check cache, so HEAD mocks are actually reached."""
+    from services.validation_worker.url_cache import clear_memory_cache
+    
+    clear_memory_cache()
+    client = fakeredis.FakeRedis(server=fakeredis.FakeServer())
+    with patch('services.validation_worker.url_cache._get_redis_client', return_value=client):
+        yield client
+    clear_memory_cache()
+
 
 class TestValidateVacancyContent:
     """Tests for validate_vacancy_content task."""
@@ -35,6 +49,29 @@ class TestValidateVacancyContent:
         
         assert result["status"] == "passed"
     
+    @patch('services.validation_worker.tasks.sync_engine')
+    @patch('services.validation_worker.tasks.Session')
+    def test_markup_reported_not_rewritten(self, mock_session_class, mock_engine, mock_vacancy):
+        """Test that markup errors fail validation and the description is left as is."""
+        from services.validation_worker.tasks import validate_vacancy_content
+        
+        description = "<h3>Кассир</h3>" + "<p>" + "А" * 350 + "</p>"
+        mock_vacancy.title = "Кассир в магазин"
+        mock_vacancy.description = description
+        mock_vacancy.image_url = "https://example.com/image.jpg"
+        
+        mock_session = MagicMock()
+        mock_session_class.return_value.__enter__ = MagicMock(return_value=mock_session)
+        mock_session_class.return_value.__exit__ = MagicMock(return_value=False)
+        mock_session.get.return_value = mock_vacancy
+        
+        with patch('services.validation_worker.tasks._validate_image', return_value=[]):
+            result = validate_vacancy_content(mock_vacancy.id)
+        
+        assert result["status"] == "failed"
+        assert any("<h3>" in error for error in result["errors"])
+        assert mock_vacancy.description == description
+    
     @patch('services.validation_worker.tasks.sync_engine')
     @patch('services.validation_worker.tasks.Session')
     def test_validate_vacancy_not_found(self, mock_session_class, mock_engine):
@@ -180,6 +217,26 @@ class TestStopWords:
         assert len(errors) == 0
 
 
+class TestContentRules:
+    """Tests for the shared text rules used by textgen."""
+    
+    def test_validate_text_groups_by_field(self):
+        """Test that errors are attributed to the field that must change."""
+        from services.shared.content_rules import validate_text
+        
+        errors = validate_text("Кассир, звоните", "А" * 350)
+        
+        assert list(errors) == ["title"]
+        assert any("звоните" in error for error in errors["title"])
+    
+    def test_validate_text_passes(self):
+        """Test that valid text has no errors."""
+        from services.shared.content_rules import validate_text
+        
+        assert validate_text("Кассир в магазин", "А" * 350) == {}
+
+
+@pytest.mark.usefixtures("fresh_url_cache")
 class TestImageValidation:
     """Tests for image URL validation."""
     